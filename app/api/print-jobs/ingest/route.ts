@@ -1,5 +1,6 @@
 import { NextResponse } from "next/server"
 import { timingSafeEqual, createHmac } from "crypto"
+import type { Firestore, QueryDocumentSnapshot } from "firebase-admin/firestore"
 import { getAdminDb } from "@/lib/firebase-admin"
 import { FIREBASE_COLLECTIONS, FirebasePrintJob } from "@/lib/firebase-schema"
 import { createHash } from "crypto"
@@ -13,6 +14,8 @@ type IngestPayload = {
   timestamp?: string | number
   accountUsername?: string
   accountPassword?: string
+  // Stable id of the source event; retried posts with the same id are written once
+  eventId?: string
 }
 
 const roundMoney = (v: number) => Math.round((v + Number.EPSILON) * 100) / 100
@@ -66,6 +69,171 @@ function validateHmac(rawBody: string, timestamp: string | null, signature: stri
   }
 }
 
+// Agents may post one job or an array of jobs signed once per request
+const MAX_BATCH = 200
+// Firestore "in" queries accept at most 30 values
+const USERNAME_QUERY_CHUNK = 30
+
+type IngestResult = { ok: true } | { ok: false; status: number; error: string }
+
+function isValidPayload(p: IngestPayload | null | undefined): p is IngestPayload {
+  return !!p && typeof p === "object" && !!p.username && !!p.type && !!p.quantity
+}
+
+// One doc per source event, whoever it is billed to: an event the agent reads
+// again (e.g. after a restart lost its overlay) may resolve to another user
+function eventJobId(p: IngestPayload): string {
+  const eventId = String(p.eventId || "").replace(/[^A-Za-z0-9_-]/g, "")
+  return eventId ? `print-evt-${eventId}` : ""
+}
+
+async function findUsersByUsername(db: Firestore, usernames: string[]) {
+  const found = new Map<string, QueryDocumentSnapshot>()
+  const chunks: string[][] = []
+  for (let i = 0; i < usernames.length; i += USERNAME_QUERY_CHUNK) {
+    chunks.push(usernames.slice(i, i + USERNAME_QUERY_CHUNK))
+  }
+  const snaps = await Promise.all(
+    chunks.map((chunk) => db.collection(FIREBASE_COLLECTIONS.USERS).where("username", "in", chunk).get())
+  )
+  for (const snap of snaps) {
+    for (const doc of snap.docs) {
+      const username = String((doc.data() as any).username)
+      if (!found.has(username)) found.set(username, doc)
+    }
+  }
+  return found
+}
+
+async function ingestPayloads(db: Firestore, payloads: IngestPayload[]): Promise<IngestResult[]> {
+  const results: IngestResult[] = payloads.map((p): IngestResult =>
+    isValidPayload(p) ? { ok: true } : { ok: false, status: 400, error: "Invalid payload" }
+  )
+  const jobRef = (id: string) => db.collection(FIREBASE_COLLECTIONS.PRINT_JOBS).doc(id)
+
+  // Events already written are acknowledged before any user is resolved or charged
+  const jobIds = payloads.map((p, i) => (results[i].ok ? eventJobId(p) : ""))
+  const first = new Map<string, number>()
+  const copies: number[] = [] // the same event again in this request; gets the first one's result
+  for (const [i, id] of jobIds.entries()) {
+    if (!id) continue
+    if (first.has(id)) copies.push(i)
+    else first.set(id, i)
+  }
+  const skip = new Set<number>(copies)
+  if (first.size > 0) {
+    const keyed = Array.from(first.values())
+    const snaps = await db.getAll(...keyed.map((i) => jobRef(jobIds[i])))
+    for (const [n, snap] of snaps.entries()) if (snap.exists) skip.add(keyed[n])
+  }
+  const sameAsFirst = () => {
+    for (const i of copies) results[i] = results[first.get(jobIds[i]) as number]
+    return results
+  }
+  const validIdx = payloads.map((_, i) => i).filter((i) => results[i].ok && !skip.has(i))
+  if (validIdx.length === 0) return sameAsFirst()
+
+  // Load printing price table once per request
+  const priceSnap = await db.collection(FIREBASE_COLLECTIONS.PRICE_TABLES).doc("printing").get()
+  if (!priceSnap.exists) {
+    for (const i of validIdx) results[i] = { ok: false, status: 500, error: "Missing price table" }
+    return sameAsFirst()
+  }
+  const prices = (priceSnap.data() as any).prices || {}
+
+  // Find users by username (numeric code or string) in one pass
+  const usernames = Array.from(new Set(validIdx.map((i) => String(payloads[i].username))))
+  const users = await findUsersByUsername(db, usernames)
+
+  // Group jobs per user so each user's debt is updated in a single transaction
+  const byUser = new Map<string, { doc: QueryDocumentSnapshot; idx: number[] }>()
+  for (const i of validIdx) {
+    const doc = users.get(String(payloads[i].username))
+    if (!doc) {
+      results[i] = { ok: false, status: 404, error: "User not found" }
+      continue
+    }
+    const group = byUser.get(doc.id) || { doc, idx: [] }
+    group.idx.push(i)
+    byUser.set(doc.id, group)
+  }
+
+  const now = new Date()
+  await Promise.all(
+    Array.from(byUser.values()).map(async ({ doc: userDoc, idx }) => {
+      const user = userDoc.data() as any
+      try {
+        // Apply the same debt/credit logic as /api/print-jobs, job by job
+        await db.runTransaction(async (tx) => {
+          // Checked again here: a concurrent request may have written the event since,
+          // possibly billed to another user, so this transaction conflicts with it
+          const keyed = idx.filter((i) => jobIds[i])
+          const written = new Set<string>()
+          if (keyed.length > 0) {
+            const snaps = await tx.getAll(...keyed.map((i) => jobRef(jobIds[i])))
+            for (const snap of snaps) if (snap.exists) written.add(snap.id)
+          }
+          const userRef = db.collection(FIREBASE_COLLECTIONS.USERS).doc(userDoc.id)
+          const userSnapTx = await tx.get(userRef)
+          const prevUser = (userSnapTx.exists ? userSnapTx.data() : {}) as any
+          let printDebt = Number(prevUser.printDebt || 0)
+          const laminationDebt = Number(prevUser.laminationDebt || 0)
+          const prevTotalDebt = typeof prevUser.totalDebt === 'number' ? Number(prevUser.totalDebt) : printDebt + laminationDebt
+          let credit = Math.max(0, -prevTotalDebt)
+
+          for (const i of idx) {
+            const payload = payloads[i]
+            if (jobIds[i] && written.has(jobIds[i])) continue
+            const priceKey = mapTypeToPriceKey(payload.type)
+            const pricePerUnit = Number(prices[priceKey] || 0)
+            const totalCost = roundMoney(pricePerUnit * Number(payload.quantity))
+
+            const jobAmount = Number(totalCost || 0)
+            const consume = Math.min(credit, jobAmount)
+            const remainder = roundMoney(jobAmount - consume)
+            credit = roundMoney(credit - consume)
+            printDebt = roundMoney(printDebt + remainder)
+
+            // The agent sends the event's own time; jobs posted late keep the day they printed
+            const sent = payload.timestamp ? new Date(payload.timestamp as any) : null
+            const tsDate = sent && !Number.isNaN(sent.getTime()) ? sent : now
+            const jobId = jobIds[i] || `print-${userDoc.id}-${tsDate.getTime()}-${Math.random().toString(36).slice(2, 10)}`
+            const jobDoc: FirebasePrintJob = {
+              jobId,
+              uid: userDoc.id,
+              username: String(user.username || payload.username),
+              userDisplayName: String(user.displayName || ""),
+              type: payload.type,
+              quantity: Number(payload.quantity),
+              pricePerUnit,
+              totalCost,
+              deviceIP: payload.deviceIP || "",
+              deviceName: payload.deviceName || "",
+              timestamp: tsDate as any,
+              status: "completed",
+              createdAt: now as any,
+            }
+            if (payload.accountUsername) {
+              (jobDoc as any).printerAccountUsername = String(payload.accountUsername)
+            }
+            if (payload.accountPassword) {
+              const hash = createHash("sha256").update(String(payload.accountPassword)).digest("hex")
+              ;(jobDoc as any).printerAccountPasswordHash = hash
+            }
+            tx.set(jobRef(jobId), jobDoc)
+          }
+          const newTotalDebt = roundMoney(printDebt + laminationDebt - credit)
+          tx.update(userRef, { printDebt, totalDebt: newTotalDebt })
+        })
+      } catch (e) {
+        console.error("POST /api/print-jobs/ingest user", userDoc.id, e)
+        for (const i of idx) results[i] = { ok: false, status: 500, error: "Server error" }
+      }
+    })
+  )
+  return sameAsFirst()
+}
+
 export async function POST(req: Request) {
   try {
     const raw = await req.text()
@@ -75,89 +243,25 @@ export async function POST(req: Request) {
       return NextResponse.json({ error: "Unauthorized" }, { status: 401 })
     }
 
-    const payload = safeJsonParse<IngestPayload>(raw)
-    if (!payload || !payload.username || !payload.type || !payload.quantity) {
-      return NextResponse.json({ error: "Invalid payload" }, { status: 400 })
+    const parsed = safeJsonParse<IngestPayload | IngestPayload[]>(raw)
+    if (Array.isArray(parsed)) {
+      if (parsed.length === 0 || parsed.length > MAX_BATCH) {
+        return NextResponse.json({ error: "Invalid batch size" }, { status: 400 })
+      }
+      const results = await ingestPayloads(getAdminDb(), parsed)
+      return NextResponse.json({ ok: results.every((r) => r.ok), results })
     }
 
-    const db = getAdminDb()
-
-    // Find user by username (numeric code or string)
-    const userSnap = await db
-      .collection(FIREBASE_COLLECTIONS.USERS)
-      .where("username", "==", String(payload.username))
-      .limit(1)
-      .get()
-
-    if (userSnap.empty) {
-      return NextResponse.json({ error: "User not found" }, { status: 404 })
+    if (!isValidPayload(parsed)) {
+      return NextResponse.json({ error: "Invalid payload" }, { status: 400 })
     }
-    const userDoc = userSnap.docs[0]
-    const user = userDoc.data() as any
-
-    // Load printing price table
-    const priceSnap = await db.collection(FIREBASE_COLLECTIONS.PRICE_TABLES).doc("printing").get()
-    if (!priceSnap.exists) {
-      return NextResponse.json({ error: "Missing price table" }, { status: 500 })
+    const [result] = await ingestPayloads(getAdminDb(), [parsed])
+    if (!result.ok) {
+      return NextResponse.json({ error: result.error }, { status: result.status })
     }
-    const prices = (priceSnap.data() as any).prices || {}
-    const priceKey = mapTypeToPriceKey(payload.type)
-    const pricePerUnit = Number(prices[priceKey] || 0)
-    const totalCost = roundMoney(pricePerUnit * Number(payload.quantity))
-
-    const now = new Date()
-    const tsDate = payload.timestamp ? new Date(payload.timestamp as any) : now
-    const jobId = `print-${userDoc.id}-${tsDate.getTime()}-${Math.random().toString(36).slice(2, 10)}`
-
-    // Apply the same debt/credit logic as /api/print-jobs
-    await db.runTransaction(async (tx) => {
-      const userRef = db.collection(FIREBASE_COLLECTIONS.USERS).doc(userDoc.id)
-      const userSnapTx = await tx.get(userRef)
-      const prevUser = (userSnapTx.exists ? userSnapTx.data() : {}) as any
-      const prevPrintDebt = Number(prevUser.printDebt || 0)
-      const prevLaminationDebt = Number(prevUser.laminationDebt || 0)
-      const prevTotalDebt = typeof prevUser.totalDebt === 'number' ? Number(prevUser.totalDebt) : prevPrintDebt + prevLaminationDebt
-      const prevCredit = Math.max(0, -prevTotalDebt)
-
-      const jobAmount = Number(totalCost || 0)
-      const consume = Math.min(prevCredit, jobAmount)
-      const remainder = roundMoney(jobAmount - consume)
-      const newCredit = roundMoney(prevCredit - consume)
-      const newPrintDebt = roundMoney(prevPrintDebt + remainder)
-      const newTotalDebt = roundMoney(newPrintDebt + prevLaminationDebt - newCredit)
-
-      const jobRef = db.collection(FIREBASE_COLLECTIONS.PRINT_JOBS).doc(jobId)
-      const jobDoc: FirebasePrintJob = {
-        jobId,
-        uid: userDoc.id,
-        username: String(user.username || payload.username),
-        userDisplayName: String(user.displayName || ""),
-        type: payload.type,
-        quantity: Number(payload.quantity),
-        pricePerUnit,
-        totalCost,
-        deviceIP: payload.deviceIP || "",
-        deviceName: payload.deviceName || "",
-        timestamp: tsDate as any,
-        status: "completed",
-        createdAt: now as any,
-      }
-      if (payload.accountUsername) {
-        (jobDoc as any).printerAccountUsername = String(payload.accountUsername)
-      }
-      if (payload.accountPassword) {
-        const hash = createHash("sha256").update(String(payload.accountPassword)).digest("hex")
-        ;(jobDoc as any).printerAccountPasswordHash = hash
-      }
-      tx.set(jobRef, jobDoc)
-      tx.update(userRef, { printDebt: newPrintDebt, totalDebt: newTotalDebt })
-    })
-
     return NextResponse.json({ ok: true })
   } catch (e) {
     console.error("POST /api/print-jobs/ingest", e)
     return NextResponse.json({ error: "Server error" }, { status: 500 })
   }
 }
-
-
@@ -11,23 +11,47 @@ Security:
 - Uses HMAC-SHA256 with timestamp to prevent tampering and replay (5 min window)
 - No long-running elevated privileges required
 
+Backfill (jobs printed while the agent was down, see backfill.py):
+    agent.py backfill --since 2024-05-01T08:00 [--until ...]   # from the event log
+    agent.py backfill --file export.xml                          # rendered XML or .evtx export
+
 Configuration sources (precedence):
 1) Environment variables
 2) JSON config file next to the executable: agent.config.json (or AGENT_CONFIG_PATH)
+
+printerMap, usernameMap and ipToDeviceName are reloaded when the file
+changes (checked every pollSeconds, see hot_config); the other settings are
+read once at startup.
 """
 
 import os
 import json
+import argparse
+import multiprocessing
 import time
 import hmac
 import hashlib
 import subprocess
 import threading
-import queue
-from typing import Optional, Dict, Any
+from types import MappingProxyType
+from typing import Optional, Dict, Any, List, Callable, Mapping, Tuple
 import sys
-from http.server import BaseHTTPRequestHandler, HTTPServer
-import socketserver
+from datetime import datetime, timezone
+
+from backfill import default_workers, in_range, map_chunks, read_chunks, read_file
+from correlation_index import CorrelationIndex
+from dedup_index import DedupIndex, event_key
+from event_source import EventCursor, EventSource, ReplaySource, WevtutilSource
+from event_xml import EventRecord, event_time, parse_events
+from hot_config import ConfigError, HotConfig, file_stamp
+from http_pool import HttpPool
+from ingest_batcher import IngestBatcher
+from local_http import LocalHandler, bulk_reply, overlay_items, serve_local
+from metrics import CONTENT_TYPE, REGISTRY
+from outbox import Outbox, is_permanent
+from pipeline import Pipeline, Stage
+from printer_resolver import PowerShellResolver, ResolverCache
+from ps_worker import POWERSHELL_ARGV, ShellPool
 
 def _base_dir() -> str:
     if getattr(sys, "frozen", False):  # PyInstaller executable
@@ -36,9 +60,11 @@ def _base_dir() -> str:
 
 BASE_DIR = _base_dir()
 DEFAULT_CONFIG_PATH = os.path.join(BASE_DIR, "agent.config.json")
+CONFIG_PATH = os.environ.get("AGENT_CONFIG_PATH", DEFAULT_CONFIG_PATH)
+CONFIG_STAMP = file_stamp(CONFIG_PATH)
 
 def _load_config_file() -> Dict[str, Any]:
-    path = os.environ.get("AGENT_CONFIG_PATH", DEFAULT_CONFIG_PATH)
+    path = CONFIG_PATH
     try:
         if os.path.exists(path):
             # Use utf-8-sig to tolerate BOMs from various editors/PowerShell
@@ -61,82 +87,172 @@ INGEST_URL = _cfg("printIngestUrl", "PRINT_INGEST_URL", "http://localhost:3000/a
 HMAC_SECRET = _cfg("hmacSecret", "PRINT_INGEST_HMAC_SECRET", "")
 LOCAL_NOTIFY_PORT = int(_cfg("localNotifyPort", "LOCAL_NOTIFY_PORT", 57981) or 57981)
 LOCAL_NOTIFY_TOKEN = _cfg("localNotifyToken", "LOCAL_NOTIFY_TOKEN", "")
-
-# Map printer names to default print type (can be customized via env)
-# Example: PRINTER_MAP='{"Canon Color":"A4Color","Canon B/W":"A4BW"}'
-PRINTER_MAP: Dict[str, str] = {}
+NOTIFY_BACKLOG = int(_cfg("localNotifyBacklog", "LOCAL_NOTIFY_BACKLOG", 1024) or 1024)
+NOTIFY_IDLE_SECONDS = float(_cfg("localNotifyIdleSeconds", "LOCAL_NOTIFY_IDLE_SECONDS", 30) or 30)
+PENDING_TTL = int(_cfg("pendingTtlSeconds", "PENDING_TTL_SECONDS", 300) or 300)
+# Overlays a job may take: posted up to matchWindowSeconds before its event, or matchLateSeconds after
+MATCH_WINDOW = float(_cfg("matchWindowSeconds", "AGENT_MATCH_WINDOW_SECONDS", PENDING_TTL) or PENDING_TTL)
+MATCH_LATE = float(_cfg("matchLateSeconds", "AGENT_MATCH_LATE_SECONDS", 10))
+INGEST_CONNECTIONS = int(_cfg("ingestConnections", "INGEST_CONNECTIONS", 4) or 4)
+INGEST_BATCH_SIZE = int(_cfg("ingestBatchSize", "INGEST_BATCH_SIZE", 20) or 1)
+INGEST_BATCH_DELAY_MS = int(_cfg("ingestBatchDelayMs", "INGEST_BATCH_DELAY_MS", 250) or 0)
+# Durable outbox for jobs not yet accepted by the backend ("" disables it)
+OUTBOX_PATH = _cfg("outboxPath", "AGENT_OUTBOX_PATH", os.path.join(BASE_DIR, "agent.outbox.db"))
+OUTBOX_MAX_BACKOFF = float(_cfg("outboxMaxBackoffSeconds", "AGENT_OUTBOX_MAX_BACKOFF_SECONDS", 300) or 300)
+
+# Consumer pipeline: parse -> enrich (resolve + overlay) -> deliver, bounded queues between stages.
+# Events in the queues are not yet durable: the saved cursor stays behind them until the deliver stage acks.
+PARSE_WORKERS = int(_cfg("parseWorkers", "AGENT_PARSE_WORKERS", 1) or 1)
+ENRICH_WORKERS = int(_cfg("enrichWorkers", "AGENT_ENRICH_WORKERS", 1) or 1)
+DELIVER_WORKERS = int(_cfg("deliverWorkers", "AGENT_DELIVER_WORKERS", INGEST_CONNECTIONS) or INGEST_CONNECTIONS)
+STAGE_QUEUE_SIZE = int(_cfg("stageQueueSize", "AGENT_STAGE_QUEUE_SIZE", 100) or 100)
+
+# Event log reading: only records newer than the persisted EventRecordID cursor
+CURSOR_PATH = _cfg("cursorPath", "AGENT_CURSOR_PATH", os.path.join(BASE_DIR, "agent.cursor.json"))
+PAGE_SIZE = int(_cfg("eventPageSize", "AGENT_EVENT_PAGE_SIZE", 200) or 200)
+POLL_SECONDS = float(_cfg("pollSeconds", "AGENT_POLL_SECONDS", 3) or 3)
+REPLAY_FILE = _cfg("eventReplayFile", "AGENT_REPLAY_FILE", "")
+
+# Recently sent events, bounded by count and age and kept across restarts
+DEDUP_PATH = _cfg("dedupPath", "AGENT_DEDUP_PATH", os.path.join(BASE_DIR, "agent.dedup.bin"))
+DEDUP_CAPACITY = int(_cfg("dedupCapacity", "AGENT_DEDUP_CAPACITY", 200000) or 200000)
+DEDUP_WINDOW = float(_cfg("dedupWindowSeconds", "AGENT_DEDUP_WINDOW_SECONDS", 7 * 86400) or 7 * 86400)
+
+# agent.py backfill: parse processes, jobs per ingest request, and the dedup ring it may grow to
+BACKFILL_WORKERS = int(_cfg("backfillWorkers", "AGENT_BACKFILL_WORKERS", default_workers()))
+BACKFILL_BATCH_SIZE = int(_cfg("backfillBatchSize", "AGENT_BACKFILL_BATCH_SIZE", 500) or 500)
+BACKFILL_DEDUP_CAPACITY = int(_cfg("backfillDedupCapacity", "AGENT_BACKFILL_DEDUP_CAPACITY", 1000000) or 0)
+
+PRINT_TYPES = frozenset({
+    "A4BW", "A4Color", "A3BW", "A3Color", "RizochartoA3", "RizochartoA4", "ChartoniA3", "ChartoniA4", "Autokollito",
+})
+
+# Built-in fallback for ipToDeviceName (no config required)
+BUILTIN_IP_TO_NAME = {
+    "192.168.3.41": "Canon B/W",
+    "192.168.3.42": "Canon Color",
+    "192.168.3.43": "Brother",
+    "192.168.6.41": "Κυδωνιών",
+}
+BUILTIN_DEVICE_NAME = "Canon Color"
+
+class AgentTables:
+    """The config's lookup tables, compiled by _compile_tables(); never modified once published.
+
+    printer_types: printer/device name (lower-cased) -> print type, valid types only
+    usernames: Windows username (lower-cased) -> app username or code
+    ip_to_name: printer IP -> device name, default_device_name when unknown
+    """
+    __slots__ = ("printer_types", "usernames", "ip_to_name", "default_device_name")
+
+    def __init__(self, printer_types: Mapping[str, str], usernames: Mapping[str, str],
+                 ip_to_name: Mapping[str, str], default_device_name: str):
+        self.printer_types = printer_types
+        self.usernames = usernames
+        self.ip_to_name = ip_to_name
+        self.default_device_name = default_device_name
+
+def _map_setting(config: Dict[str, Any], key: str, env: str) -> Optional[Dict[str, Any]]:
+    """A name map from the env variable (JSON) or the config file; None if neither sets one."""
+    raw = os.environ.get(env)
+    if raw:
+        # The environment cannot change while the agent runs: report it, but never fail a reload on it
+        try:
+            value = json.loads(raw)
+        except ValueError as e:
+            print(f"{env} ignored: {e}")
+            value = None
+        if isinstance(value, dict):
+            return value
+        if value is not None:
+            print(f"{env} ignored: expected a JSON object")
+    value = config.get(key)
+    if value is not None and not isinstance(value, dict):
+        raise ConfigError(f"{key}: expected an object")
+    return value
+
+def _compile_tables(config: Dict[str, Any]) -> AgentTables:
+    """Check the name maps of `config` and build their lookup tables; raises ConfigError."""
+    # Example: PRINTER_MAP='{"Canon Color":"A4Color","Canon B/W":"A4BW"}'
+    printer_types = {}
+    for name, ptype in (_map_setting(config, "printerMap", "PRINTER_MAP") or {}).items():
+        if isinstance(ptype, str) and ptype in PRINT_TYPES:
+            printer_types[str(name).lower()] = ptype
+        else:
+            print(f"printerMap: {ptype!r} for {name!r} is not a print type, ignored")
+    # Optional mapping from Windows usernames to app usernames/codes
+    # Example: USERNAME_MAP='{"john":"401","mary":"402"}'
+    usernames = {str(k).lower(): str(v) for k, v in (_map_setting(config, "usernameMap", "USERNAME_MAP") or {}).items()}
+    # Optional mapping from IP -> deviceName with default fallbackName
+    # Example: ipToDeviceName '{"192.168.3.41":"Canon B/W","192.168.3.42":"Canon Color","default":"Canon Color"}'
+    raw_map = _map_setting(config, "ipToDeviceName", "IP_TO_NAME") or {}
+    ip_to_name = {str(k): str(v) for k, v in raw_map.items() if k != "default"}
+    default_device_name = str(raw_map.get("default", BUILTIN_DEVICE_NAME))
+    if not ip_to_name:
+        ip_to_name, default_device_name = dict(BUILTIN_IP_TO_NAME), BUILTIN_DEVICE_NAME
+    return AgentTables(MappingProxyType(printer_types), MappingProxyType(usernames), MappingProxyType(ip_to_name),
+                       default_device_name)
+
+# Swapped as a whole when agent.config.json changes; each event takes TABLES.current once
+TABLES: HotConfig[AgentTables] = HotConfig(CONFIG_PATH, _compile_tables, POLL_SECONDS, CONFIG_STAMP)
 try:
-    env_map = os.environ.get("PRINTER_MAP")
-    if env_map:
-        PRINTER_MAP = json.loads(env_map)
-    else:
-        PRINTER_MAP = _CONFIG.get("printerMap", {}) or {}
-except Exception:
-    PRINTER_MAP = {}
+    TABLES.load(_CONFIG)
+except ConfigError as e:
+    print(f"config load error: {e}")
+    TABLES.load({})
 
-# Optional mapping from Windows usernames to app usernames/codes
-# Example: USERNAME_MAP='{"john":"401","mary":"402"}'
-USERNAME_MAP: Dict[str, str] = {}
-try:
-    env_umap = os.environ.get("USERNAME_MAP")
-    if env_umap:
-        USERNAME_MAP = json.loads(env_umap)
-    else:
-        USERNAME_MAP = _CONFIG.get("usernameMap", {}) or {}
-    USERNAME_MAP = {str(k).lower(): str(v) for k, v in USERNAME_MAP.items()}
-except Exception:
-    USERNAME_MAP = {}
-
-# Optional mapping from IP -> deviceName with default fallbackName
-# Example: ipToDeviceName '{"192.168.3.41":"Canon B/W","192.168.3.42":"Canon Color","default":"Canon Color"}'
-IP_TO_NAME: Dict[str, str] = {}
-DEFAULT_DEVICE_NAME = "Canon Color"
-try:
-    raw_map = _CONFIG.get("ipToDeviceName")
-    env_ip_map = os.environ.get("IP_TO_NAME")
-    if env_ip_map:
-        raw_map = json.loads(env_ip_map)
-    if isinstance(raw_map, dict):
-        IP_TO_NAME = {str(k): str(v) for k, v in raw_map.items() if k != "default"}
-        DEFAULT_DEVICE_NAME = str(raw_map.get("default", DEFAULT_DEVICE_NAME))
-except Exception:
-    IP_TO_NAME = {}
-
-# Built-in fallback mapping (no config required)
-if not IP_TO_NAME:
-    IP_TO_NAME = {
-        "192.168.3.41": "Canon B/W",
-        "192.168.3.42": "Canon Color",
-        "192.168.3.43": "Brother",
-        "192.168.6.41": "Κυδωνιών",
-    }
-    DEFAULT_DEVICE_NAME = "Canon Color"
+# Persistent PowerShell sessions for _ps; psWorkers=0 spawns one process per call
+PS_WORKERS = int(_cfg("psWorkers", "PS_WORKERS", 2) or 0)
+PS_TIMEOUT = float(_cfg("psTimeoutSeconds", "PS_TIMEOUT_SECONDS", 10) or 10)
+PS_POOL: Optional[ShellPool] = ShellPool(POWERSHELL_ARGV, PS_WORKERS, PS_TIMEOUT) if PS_WORKERS > 0 else None
 
 def _ps(cmd: str) -> str:
+    if PS_POOL is not None:
+        return (PS_POOL.run(cmd) or "").strip()
     try:
         out = subprocess.check_output(["powershell", "-NoProfile", "-Command", cmd], stderr=subprocess.STDOUT)
         return out.decode("utf-8", errors="ignore").strip()
     except Exception as e:
         return ""
 
+RESOLVER_TTL = float(_cfg("resolverTtlSeconds", "RESOLVER_TTL_SECONDS", 600) or 600)
+RESOLVER_NEGATIVE_TTL = float(_cfg("resolverNegativeTtlSeconds", "RESOLVER_NEGATIVE_TTL_SECONDS", 60) or 60)
+RESOLVER_REFRESH = float(_cfg("resolverRefreshSeconds", "RESOLVER_REFRESH_SECONDS", 300) or 300)
+
+# Printer name -> IP, filled by a bulk enumeration instead of PowerShell per event
+RESOLVER = ResolverCache(
+    PowerShellResolver(_ps),
+    ttl=RESOLVER_TTL,
+    negative_ttl=RESOLVER_NEGATIVE_TTL,
+    refresh_interval=RESOLVER_REFRESH,
+)
+
+# Served as Prometheus text at GET /metrics on the local notify port
+EVENTS_READ = REGISTRY.counter("print_agent_events_read_total", "Events read from the log past the cursor")
+EVENTS_DUPLICATE = REGISTRY.counter("print_agent_events_duplicate_total", "Events skipped by the dedup index")
+EVENTS_PARSED = REGISTRY.counter("print_agent_events_parsed_total", "Events parsed into a print job")
+EVENTS_DROPPED = REGISTRY.counter("print_agent_events_dropped_total", "Events not turned into a job", ("reason",))
+EVENTS_DROPPED.labels("unparsed")
+INGEST_JOBS = REGISTRY.counter("print_agent_ingest_jobs_total",
+                               "Jobs posted, by outcome (failed jobs are retried when the outbox is on)", ("result",))
+INGEST_REQUESTS = REGISTRY.counter("print_agent_ingest_requests_total", "Ingest HTTP requests by status class", ("status",))
+OVERLAYS = REGISTRY.counter("print_agent_overlays_total",
+                            "Credential overlays received on /notify, matched to a job or expired unused; "
+                            "jobs without one (unmatched)", ("result",))
+PARSE_SECONDS = REGISTRY.histogram("print_agent_parse_seconds", "Time to extract job fields from an event")
+RESOLVE_SECONDS = REGISTRY.histogram("print_agent_resolve_seconds", "Printer name to IP resolution time")
+POST_SECONDS = REGISTRY.histogram("print_agent_ingest_post_seconds", "Ingest HTTP request time (one job or a batch)")
+STAGE_QUEUE_DEPTH = REGISTRY.gauge("print_agent_stage_queue_depth", "Items waiting for a pipeline stage", ("stage",))
+OUTBOX_BACKLOG = REGISTRY.gauge("print_agent_outbox_backlog", "Jobs in the outbox not yet accepted")
+PENDING_OVERLAYS = REGISTRY.gauge("print_agent_pending_overlays", "Overlays waiting for their event")
+DEDUP_ENTRIES = REGISTRY.gauge("print_agent_dedup_entries", "Keys held by the dedup index")
+EVENT_CURSOR = REGISTRY.gauge("print_agent_event_cursor", "Highest EventRecordID read")
+EVENTS_IN_FLIGHT = REGISTRY.gauge("print_agent_events_in_flight",
+                                  "Events read but not yet committed to the outbox; read again after a crash")
+
 def _resolve_printer_ip(printer_name: str) -> Optional[str]:
-    if not printer_name:
-        return None
-    # 1) Try PowerShell Get-Printer -> PortName
-    port = _ps(f"(Get-Printer -Name '{printer_name.replace("'", "''")}' -ErrorAction SilentlyContinue).PortName")
-    if port:
-        # If the port string already looks like an IP
-        if all(c.isdigit() or c == '.' for c in port) and port.count('.') == 3:
-            return port
-        # 2) Resolve via Get-PrinterPort
-        ip = _ps(f"(Get-PrinterPort -Name '{port.replace("'", "''")}' -ErrorAction SilentlyContinue).PrinterHostAddress")
-        if ip:
-            return ip
-        # 3) CIM fallback
-        ip = _ps(f"(Get-CimInstance -ClassName Win32_TCPIPPrinterPort -Filter \"Name='{port.replace("'", "''")}'\").HostAddress")
-        if ip:
-            return ip
-    return None
+    with RESOLVE_SECONDS.time():
+        return RESOLVER.resolve(printer_name)
 
 def _now_unix() -> int:
     return int(time.time())
@@ -145,69 +261,90 @@ def _sign(body: str, ts: int) -> str:
     mac = hmac.new(HMAC_SECRET.encode("utf-8"), f"{ts}.{body}".encode("utf-8"), hashlib.sha256)
     return mac.hexdigest()
 
-def _post(payload: Dict[str, Any]) -> None:
-    import urllib.request
-    import urllib.error
-    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+# Keep-alive connections to the ingest endpoint (no TCP/TLS setup per post)
+HTTP = HttpPool(max_connections=INGEST_CONNECTIONS, timeout=5)
+
+def _post_body(body: bytes) -> Tuple[int, str]:
+    """POST a signed JSON body to the ingest endpoint; returns (status, text), status 0 on network errors."""
     ts = _now_unix()
     sig = _sign(body.decode("utf-8"), ts)
-    req = urllib.request.Request(
-        INGEST_URL,
-        data=body,
-        headers={
-            "Content-Type": "application/json",
-            "x-timestamp": str(ts),
-            "x-signature": sig,
-        },
-        method="POST",
-    )
+    headers = {
+        "Content-Type": "application/json",
+        "x-timestamp": str(ts),
+        "x-signature": sig,
+    }
     try:
-        with urllib.request.urlopen(req, timeout=5) as resp:
-            if resp.status >= 300:
-                print(f"ingest failed: {resp.status}")
-    except urllib.error.HTTPError as e:
-        try:
-            msg = e.read().decode("utf-8", errors="ignore")
-        except Exception:
-            msg = str(e)
-        print(f"ingest failed: {e.code} {msg[:200]}")
+        with POST_SECONDS.time():
+            status, data = HTTP.post(INGEST_URL, body, headers)
     except Exception as e:
+        INGEST_REQUESTS.labels("error").inc()
         print(f"ingest error: {e}")
-
-def _parse_event_xml(xml_text: str) -> Optional[Dict[str, Any]]:
-    # Minimal XML parsing via string search to avoid heavy deps
-    # We look for common fields in Microsoft-Windows-PrintService/Operational 307 event
-    def _tag(name: str) -> Optional[str]:
-        start_tag = f"<{name}>"
-        end_tag = f"</{name}>"
-        start = xml_text.find(start_tag)
-        if start == -1:
-            return None
-        start += len(start_tag)
-        end = xml_text.find(end_tag, start)
-        if end == -1:
-            return None
-        return xml_text[start:end]
-
-    # The Event XML has multiple Data elements with Name attributes; we fallback to simple substring checks
-    # Extract username
-    username = None
-    for key in ["param3", "User"]:
-        v = _tag(key)
-        if v:
-            username = v
-            break
-    # Extract printer name
-    printer = None
-    for key in ["param2", "PrinterName", "param4"]:
-        v = _tag(key)
-        if v:
-            printer = v
-            break
-    # Extract total pages
+        return 0, ""
+    INGEST_REQUESTS.labels(f"{status // 100}xx").inc()
+    text = data.decode("utf-8", errors="ignore")
+    if status >= 300:
+        print(f"ingest failed: {status} {text[:200]}")
+    return status, text
+
+def _count_jobs(statuses: List[int]) -> List[int]:
+    for status in statuses:
+        if 200 <= status < 300:
+            INGEST_JOBS.labels("accepted").inc()
+        elif is_permanent(status):
+            INGEST_JOBS.labels("rejected").inc()
+        else:
+            INGEST_JOBS.labels("failed").inc()
+    return statuses
+
+def _post(payload: Dict[str, Any]) -> int:
+    status, _ = _post_body(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    return _count_jobs([status])[0]
+
+def _post_batch(payloads: List[Dict[str, Any]]) -> List[int]:
+    """Post jobs as one signed array; returns an HTTP status per job.
+
+    A server without batch support rejects the array with 400; the jobs are
+    then posted one by one. A job missing from the response's results
+    counts as a network error (0), so the outbox retries it.
+    """
+    status, text = _post_body(json.dumps(payloads, separators=(",", ":")).encode("utf-8"))
+    if status == 400 and len(payloads) > 1:
+        print(f"ingest batch rejected, posting {len(payloads)} jobs one by one")
+        return [_post(payload) for payload in payloads]
+    if status < 200 or status >= 300:
+        return _count_jobs([status] * len(payloads))
+    try:
+        results = json.loads(text).get("results") or []
+    except Exception:
+        results = []
+    statuses = []
+    for i, payload in enumerate(payloads):
+        if i >= len(results) or not isinstance(results[i], dict):
+            statuses.append(0)
+            print(f"ingest response has no result for job {i} ({payload.get('username')}), will retry")
+            continue
+        result = results[i]
+        if result.get("ok"):
+            statuses.append(status)
+        else:
+            statuses.append(int(result.get("status") or 500))
+            print(f"ingest failed: {result.get('status')} {result.get('error')} ({payload.get('username')})")
+    return _count_jobs(statuses)
+
+# Field names in preference order. event_xml lower-cases them, so <Data Name="param3">
+# in EventData and <Param3> under UserData both match "param3".
+_USER_FIELDS = ("param3", "user")
+_PRINTER_FIELDS = ("param2", "printername", "param4")
+_PAGES_FIELDS = ("totalpages", "pagesprinted", "param7", "param6")
+
+def _parse_event_xml(rec: EventRecord) -> Optional[Dict[str, Any]]:
+    # The record was tokenised once by event_xml; here we only pick fields
+    fields = rec.fields
+    username = rec.first(_USER_FIELDS)
+    printer = rec.first(_PRINTER_FIELDS)
     pages = None
-    for key in ["TotalPages", "PagesPrinted", "param7", "param6"]:
-        v = _tag(key)
+    for key in _PAGES_FIELDS:
+        v = fields.get(key)
         if v and v.isdigit():
             pages = int(v)
             break
@@ -219,183 +356,413 @@ def _parse_event_xml(xml_text: str) -> Optional[Dict[str, Any]]:
         username = username.split("\\")[-1]
     return {"username": username.strip(), "printer": printer or "", "pages": pages}
 
-def _map_to_type(printer_name: str) -> str:
-    t = PRINTER_MAP.get(printer_name)
-    if t in {
-        "A4BW","A4Color","A3BW","A3Color","RizochartoA3","RizochartoA4","ChartoniA3","ChartoniA4","Autokollito"
-    }:
-        return t  # trusted mapping from env
-    # Fallback heuristics
+def _map_to_type(printer_name: str, tables: AgentTables) -> str:
     name = (printer_name or "").lower()
+    t = tables.printer_types.get(name)
+    if t is not None:
+        return t  # trusted mapping from config
+    # Fallback heuristics
     if "color" in name:
         return "A4Color"
     return "A4BW"
 
-def _consume_events(event_queue: "queue.Queue[str]") -> None:
-    pending: Dict[str, Dict[str, Any]] = {}
-    def put_pending(key: str, data: Dict[str, Any]):
-        pending[key] = { **data, "_ts": _now_unix() }
-    def get_pending(key: str) -> Optional[Dict[str, Any]]:
-        prune_before = _now_unix() - 300
-        # prune
-        for k in list(pending.keys()):
-            if pending[k].get("_ts", 0) < prune_before:
-                pending.pop(k, None)
-        return pending.pop(key, None)
-
-    # Local notify server
-    class Handler(BaseHTTPRequestHandler):
+# Overlays posted to /notify, several per printer, waiting for the matching event-log job
+PENDING = CorrelationIndex(ttl=PENDING_TTL, window=MATCH_WINDOW, late=MATCH_LATE,
+                           on_expire=lambda data: OVERLAYS.labels("expired").inc())
+PENDING_OVERLAYS.set_function(PENDING.__len__)
+
+def _notify_info(data: Dict[str, Any]) -> Dict[str, Any]:
+    # expected: accountUsername, accountPassword, type, quantity, deviceName or deviceIP
+    info = {
+        'accountUsername': str(data.get('accountUsername') or ''),
+        'accountPassword': str(data.get('accountPassword') or ''),
+        'type': str(data.get('type') or ''),
+        'quantity': int(data.get('quantity') or 0),
+        'deviceName': str(data.get('deviceName') or ''),
+        'deviceIP': str(data.get('deviceIP') or ''),
+    }
+    # page/colour counts from the proxy's job analyser, if it saw the job
+    if isinstance(data.get('analysis'), dict):
+        info['analysis'] = data['analysis']
+    # the printer a pooled proxy listener actually sent the job to
+    if data.get('targetIP'):
+        info['targetIP'] = str(data['targetIP'])
+        info['targetName'] = str(data.get('targetName') or '')
+    return info
+
+def _expected_pages(info: Dict[str, Any]) -> int:
+    """Pages the overlay's job should report: the proxy's count if it saw the job, else the app's quantity."""
+    try:
+        return int((info.get('analysis') or {}).get('pages') or info.get('quantity') or 0)
+    except (TypeError, ValueError):
+        return 0
+
+def _serve_notify() -> threading.Thread:
+    # Local notify server: overlays on POST /notify (one object or an array), Prometheus text on GET /metrics.
+    # Concurrent and keep-alive (local_http), so the proxy's notifications don't queue behind each other.
+    class Handler(LocalHandler):
+        def do_GET(self):  # type: ignore
+            if self.path != "/metrics":
+                self.reply(404)
+                return
+            self.reply(200, REGISTRY.render().encode("utf-8"), CONTENT_TYPE)
+
         def do_POST(self):  # type: ignore
             try:
+                raw = self.read_body()
                 if self.path != "/notify":
-                    self.send_response(404)
-                    self.end_headers()
+                    self.reply(404)
                     return
-                length = int(self.headers.get('Content-Length','0'))
-                raw = self.rfile.read(length).decode('utf-8', errors='ignore') if length > 0 else '{}'
-                data = json.loads(raw)
-                token = self.headers.get('x-agent-token') or data.get('token') or ''
-                if LOCAL_NOTIFY_TOKEN and token != LOCAL_NOTIFY_TOKEN:
-                    self.send_response(401)
-                    self.end_headers()
+                items, token, bulk = overlay_items(json.loads(raw or b'{}'))
+                header = self.headers.get('x-agent-token')
+                if LOCAL_NOTIFY_TOKEN and any((header or item.get('token') or token) != LOCAL_NOTIFY_TOKEN
+                                              for item in items):
+                    self.reply(401)
                     return
-                # expected: accountUsername, accountPassword, type, quantity, deviceName or deviceIP
-                device_name = str(data.get('deviceName') or '')
-                device_ip = str(data.get('deviceIP') or '')
-                info = {
-                    'accountUsername': str(data.get('accountUsername') or ''),
-                    'accountPassword': str(data.get('accountPassword') or ''),
-                    'type': str(data.get('type') or ''),
-                    'quantity': int(data.get('quantity') or 0),
-                    'deviceName': device_name,
-                    'deviceIP': device_ip,
-                }
-                if device_ip:
-                    put_pending(f"ip:{device_ip}", info)
-                if device_name:
-                    put_pending(f"name:{device_name.lower()}", info)
-                self.send_response(200)
-                self.end_headers()
-            except Exception as e:
+                infos = [_notify_info(item) for item in items]
+            except Exception:
                 try:
-                    self.send_response(400)
-                    self.end_headers()
+                    self.reply(400)
                 except Exception:
                     pass
-        def log_message(self, format, *args):  # silence default logging
-            return
-
-    def serve_local():
-        with socketserver.TCPServer(("127.0.0.1", LOCAL_NOTIFY_PORT), Handler) as httpd:
-            httpd.serve_forever()
-
-    threading.Thread(target=serve_local, daemon=True).start()
-    while True:
-        xml = event_queue.get()
-        if xml is None:
-            break
-        info = _parse_event_xml(xml)
-        if not info:
+                return
+            for info in infos:
+                keys = [f"ip:{info['deviceIP']}" if info['deviceIP'] else '',
+                        f"name:{info['deviceName'].lower()}" if info['deviceName'] else '']
+                PENDING.add(keys, info, pages=_expected_pages(info))
+            OVERLAYS.labels("received").inc(len(infos))
+            self.reply(200, bulk_reply(len(infos)) if bulk else b'')
+
+    return serve_local(LOCAL_NOTIFY_PORT, Handler, NOTIFY_BACKLOG, NOTIFY_IDLE_SECONDS)
+
+def _normalize_event(rec: EventRecord) -> Optional[Dict[str, Any]]:
+    """Parse stage: event -> job fields, username mapped; None if not a print job."""
+    with PARSE_SECONDS.time():
+        info = _parse_event_xml(rec)
+    if not info:
+        EVENTS_DROPPED.labels("unparsed").inc()
+        return None
+    EVENTS_PARSED.inc()
+    uname = str(info["username"]).strip()
+    info["username"] = TABLES.current.usernames.get(uname.lower(), uname)
+    # Stable per event, so a retried post cannot bill the job twice
+    info["eventId"] = f"{event_key(rec.record_id, rec.xml):016x}"
+    info["time"] = event_time(rec.time_created)
+    return info
+
+def _iso_utc(t: float) -> str:
+    # Like JavaScript's toISOString, which is what the backend stores
+    return datetime.fromtimestamp(t, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+def _enrich_job(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Enrich stage: resolve the printer, apply a pending overlay, build the ingest payload."""
+    tables = TABLES.current
+    mapped = info["username"]
+    pname = str(info.get("printer") or "")
+    ip = _resolve_printer_ip(pname)
+    device_name = tables.ip_to_name.get(ip or "", None) or pname or tables.default_device_name
+    # Try to overlay pending details from local notify: the best of those waiting for this printer
+    keys = [f"ip:{ip}" if ip else "", f"name:{device_name.lower()}" if device_name else ""]
+    overlay = PENDING.match(keys, pages=int(info["pages"]), at=info.get("time"))
+    if not overlay:
+        OVERLAYS.labels("unmatched").inc()  # billed to the Windows user, as without the proxy
+    if overlay and overlay.get('targetIP'):
+        # Bill the pool member that printed it, not the proxy queue the job was sent to
+        ip = overlay['targetIP']
+        device_name = overlay.get('targetName') or tables.ip_to_name.get(ip, None) or device_name
+
+    ptype = _map_to_type(device_name, tables)
+    qty = int(info["pages"])
+    acc_user = ""
+    acc_pass = ""
+    if overlay:
+        OVERLAYS.labels("matched").inc()
+        # Counted from the job bytes: better than TotalPages and the per-printer type
+        analysis = overlay.get('analysis') or {}
+        try:
+            if int(analysis.get('quantity') or 0) > 0:
+                qty = int(analysis['quantity'])
+                ptype = str(analysis.get('type') or ptype)
+        except Exception:
+            pass
+        ptype = str(overlay.get('type') or ptype)
+        try:
+            qv = int(overlay.get('quantity') or qty)
+            if qv > 0: qty = qv
+        except Exception:
+            pass
+        acc_user = str(overlay.get('accountUsername') or "")
+        acc_pass = str(overlay.get('accountPassword') or "")
+    lookup_username = acc_user if acc_user else mapped
+    payload = {
+        "username": lookup_username,
+        "type": ptype,
+        "quantity": qty,
+        "deviceName": device_name,
+        "deviceIP": ip or "",
+        "eventId": info["eventId"],
+    }
+    # When it printed, not when it was posted: backfills and outbox retries post late
+    if info.get("time") is not None:
+        payload["timestamp"] = _iso_utc(info["time"])
+    if acc_user:
+        payload["accountUsername"] = acc_user
+    if acc_pass:
+        payload["accountPassword"] = acc_pass
+    return payload
+
+def _start_pipeline(deliver: Callable[..., Any] = _post, acks: bool = False) -> Pipeline:
+    """parse -> enrich -> deliver, each with its own workers and bounded queue.
+
+    A slow ingest backend fills the deliver queue, then enrich, then parse,
+    and finally blocks _poll_events; nothing is dropped on the way. With
+    acks, deliver is called as deliver(payload, done) and calls done() once
+    the job is stored (Outbox.put) or posted (IngestBatcher.add).
+    """
+    pipeline = Pipeline([
+        Stage("parse", _normalize_event, PARSE_WORKERS, STAGE_QUEUE_SIZE),
+        Stage("enrich", _enrich_job, ENRICH_WORKERS, STAGE_QUEUE_SIZE),
+        Stage("deliver", deliver, DELIVER_WORKERS, STAGE_QUEUE_SIZE, acks=acks),
+    ])
+    for stage in pipeline.stages:
+        STAGE_QUEUE_DEPTH.labels(stage.name).set_function(stage.depth)
+    return pipeline.start()
+
+# Event ID 307 in Microsoft-Windows-PrintService/Operational indicates a printed document
+PRINTED_EVENT_ID = 307
+
+def _event_source() -> EventSource:
+    # A replay file drives the pipeline without the Windows event log (e.g. on Linux)
+    if REPLAY_FILE:
+        return ReplaySource(REPLAY_FILE)
+    return WevtutilSource(event_id=PRINTED_EVENT_ID)
+
+def _committed(cursor: EventCursor, dedup: DedupIndex, record_id: int, key: int) -> Callable[[], None]:
+    def done() -> None:
+        dedup.release(key)
+        cursor.done(record_id)
+    return done
+
+def _poll_events(source: EventSource, cursor: EventCursor, pipeline: Pipeline, dedup: DedupIndex) -> int:
+    """Queue every event newer than the cursor; returns how many were queued.
+
+    The cursor and the dedup file are saved only up to the events the
+    pipeline has finished with, i.e. committed to the outbox when there is
+    one. Events still queued are read again after a crash; the backend
+    drops the ones it already has by eventId.
+    """
+    count = 0
+    try:
+        for rec in source.read_new(cursor.value, PAGE_SIZE):
+            EVENTS_READ.inc()
+            # Stable identity, so duplicates are also suppressed across restarts
+            key = event_key(rec.record_id, rec.xml)
+            if dedup.add(key, held=True):
+                # Block rather than drop: the reader only moves past queued events
+                cursor.begin(rec.record_id)
+                pipeline.put(rec, done=_committed(cursor, dedup, rec.record_id, key))
+                count += 1
+            else:
+                EVENTS_DUPLICATE.inc()
+            cursor.value = max(cursor.value, rec.record_id)
+    finally:
+        cursor.save()
+        dedup.save()
+    return count
+
+def _backfill_chunk(text: str, since: Optional[float], until: Optional[float]) -> Tuple[int, List[Dict[str, Any]]]:
+    """Backfill worker: (events in range, parsed jobs) of one chunk of exported events."""
+    read = 0
+    jobs = []
+    for rec in parse_events(text):
+        if rec.event_id != PRINTED_EVENT_ID or not in_range(rec.time_created, since, until):
             continue
-        uname = str(info["username"]).strip()
-        mapped = USERNAME_MAP.get(uname.lower(), uname)
-        pname = str(info.get("printer") or "")
-        ip = _resolve_printer_ip(pname)
-        device_name = IP_TO_NAME.get(ip or "", None) or pname or DEFAULT_DEVICE_NAME
-        # Try to overlay pending details from local notify
-        overlay = get_pending(f"ip:{ip}") if ip else None
-        if (not overlay) and device_name:
-            overlay = get_pending(f"name:{device_name.lower()}")
-
-        ptype = _map_to_type(device_name)
-        qty = int(info["pages"])
-        acc_user = ""
-        acc_pass = ""
-        if overlay:
-            ptype = str(overlay.get('type') or ptype)
-            try:
-                qv = int(overlay.get('quantity') or qty)
-                if qv > 0: qty = qv
-            except Exception:
-                pass
-            acc_user = str(overlay.get('accountUsername') or "")
-            acc_pass = str(overlay.get('accountPassword') or "")
-        lookup_username = acc_user if acc_user else mapped
-        payload = {
-            "username": lookup_username,
-            "type": ptype,
-            "quantity": qty,
-            "deviceName": device_name,
-            "deviceIP": ip or "",
-        }
-        if acc_user:
-            payload["accountUsername"] = acc_user
-        if acc_pass:
-            payload["accountPassword"] = acc_pass
-        _post(payload)
+        read += 1
+        info = _normalize_event(rec)
+        if info is not None:
+            jobs.append(info)
+    return read, jobs
+
+def _cli_time(value: str) -> float:
+    # ISO 8601; without an offset it is local time, like the times the Event Viewer shows
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not an ISO time: {value!r}")
+
+def _peak_rss_mb() -> Dict[str, Optional[float]]:
+    try:
+        import resource  # not on Windows
+    except ImportError:
+        return {"peak_rss_mb": None, "worker_peak_rss_mb": None}
+    # Linux reports KiB
+    return {"peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "worker_peak_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)}
+
+def backfill(argv: List[str]) -> int:
+    """Re-read historical print events and deliver the jobs not sent before.
+
+    Events are parsed on a process pool, skipped if the dedup index has
+    them, enriched like live events and delivered in large batches through
+    the outbox. Stop the agent service first: it shares the dedup file and
+    the outbox. Prints a JSON summary with events/s and peak memory.
+    """
+    ap = argparse.ArgumentParser(prog="agent.py backfill", description=backfill.__doc__.split("\n")[0])
+    ap.add_argument("--file", help="rendered XML (wevtutil qe ... /f:RenderedXml) or an .evtx export; "
+                                   "default: eventReplayFile, else the live event log")
+    ap.add_argument("--since", type=_cli_time, help="first event time, ISO 8601 (local time without an offset)")
+    ap.add_argument("--until", type=_cli_time, help="events before this time, ISO 8601")
+    ap.add_argument("--workers", type=int, default=BACKFILL_WORKERS, help="parse processes, 0 parses inline")
+    ap.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE, help="jobs per ingest request")
+    args = ap.parse_args(argv)
+    if not HMAC_SECRET:
+        print("Missing hmacSecret (env PRINT_INGEST_HMAC_SECRET or agent.config.json)")
+        return 2
+    path = args.file or REPLAY_FILE
+    if path and path.lower().endswith(".evtx"):
+        pieces = WevtutilSource(PRINTED_EVENT_ID, path, log_file=True).export(args.since, args.until)
+    elif path:
+        pieces = read_file(path)
+    elif args.since is None:
+        ap.error("give --file, or --since for a range of the event log")
+    else:
+        pieces = WevtutilSource(PRINTED_EVENT_ID).export(args.since, args.until)
+
+    # One enumeration up front; the printers are resolved as they are now, not as they were then
+    RESOLVER.refresh()
+    dedup = DedupIndex(max(DEDUP_CAPACITY, BACKFILL_DEDUP_CAPACITY), DEDUP_WINDOW, DEDUP_PATH)
+    outbox: Optional[Outbox] = None
+    batch: List[Dict[str, Any]] = []
+    held: List[int] = []  # dedup keys of the jobs in `batch`
+    counts = {"events": 0, "jobs": 0, "duplicates": 0, "unparsed": 0, "delivered": 0, "failed": 0}
+
+    def flush() -> None:
+        statuses = _post_batch(batch)
+        for key, status in zip(held, statuses):
+            if 200 <= status < 300:
+                counts["delivered"] += 1
+                dedup.release(key)
+            elif is_permanent(status):
+                counts["failed"] += 1
+                dedup.release(key)
+            else:
+                # Not delivered: a rerun of the backfill must send it again
+                counts["failed"] += 1
+                dedup.discard(key)
+        batch.clear()
+        held.clear()
+
+    if OUTBOX_PATH:
+        outbox = Outbox(OUTBOX_PATH, _post_batch, batch_size=args.batch_size, max_backoff=OUTBOX_MAX_BACKOFF)
+    started = time.perf_counter()
+    reported = started
+    status = 0
+    try:
+        for read, infos in map_chunks(_backfill_chunk, read_chunks(pieces), args.workers, args.since, args.until):
+            counts["events"] += read
+            counts["unparsed"] += read - len(infos)
+            for info in infos:
+                key = int(info["eventId"], 16)
+                if not dedup.add(key, held=True):
+                    counts["duplicates"] += 1
+                    continue
+                counts["jobs"] += 1
+                payload = _enrich_job(info)
+                if outbox is not None:
+                    # Blocks while the outbox is full, so memory stays bounded
+                    outbox.put(payload, lambda key=key: dedup.release(key))
+                else:
+                    held.append(key)
+                    batch.append(payload)
+                    if len(batch) >= args.batch_size:
+                        flush()
+            dedup.save()
+            if time.perf_counter() - reported >= 10:
+                reported = time.perf_counter()
+                print(f"backfill: {counts['events']} events, {counts['jobs']} new jobs", flush=True)
+        if batch:
+            flush()
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"backfill read error: {e}")
+        status = 1
+    finally:
+        read_s = time.perf_counter() - started
+        dedup.save(force=True)
+        if outbox is not None:
+            # Wait while the backlog drains; whatever is left stays on disk for the agent
+            last = (-1, time.time())
+            while outbox.backlog():
+                progress = outbox.sent + outbox.dead
+                if progress != last[0]:
+                    last = (progress, time.time())
+                elif time.time() - last[1] > 60:
+                    print(f"backfill: backend not accepting jobs, {outbox.backlog()} left in the outbox")
+                    break
+                time.sleep(0.2)
+            counts["delivered"] = outbox.sent
+            counts["failed"] = outbox.dead
+            outbox.close()
+            dedup.save(force=True)  # the keys released as the last jobs were committed
+    # events/s while reading; seconds includes waiting for the outbox to drain
+    summary: Dict[str, Any] = dict(counts, seconds=round(time.perf_counter() - started, 2),
+                                   events_per_s=round(counts["events"] / read_s) if read_s else None,
+                                   workers=args.workers)
+    summary.update(_peak_rss_mb())
+    print(json.dumps(summary))
+    return status
 
 def main() -> None:
     if not HMAC_SECRET:
         print("Missing hmacSecret (env PRINT_INGEST_HMAC_SECRET or agent.config.json)")
         return
 
-    # We use wevtutil to subscribe to Microsoft-Windows-PrintService/Operational EventLog
-    # Event ID 307 indicates a printed document
-    query = (
-        "<QueryList>"
-        "  <Query Id=\"0\" Path=\"Microsoft-Windows-PrintService/Operational\">"
-        "    <Select Path=\"Microsoft-Windows-PrintService/Operational\">*" 
-        "[System[(EventID=307)]]" 
-        "</Select>"
-        "  </Query>"
-        "</QueryList>"
-    )
-
-    # Start a background reader thread to parse events
-    q: "queue.Queue[str]" = queue.Queue(maxsize=100)
-    t = threading.Thread(target=_consume_events, args=(q,), daemon=True)
-    t.start()
-
-    # Use wevtutil qe for polling in a loop to keep the agent simple and robust
-    # Alternatively, one could use PowerShell Get-WinEvent -FilterXPath with -MaxEvents 1 and -Wait
-    seen: set[str] = set()
+    source = _event_source()
+    cursor = EventCursor(CURSOR_PATH)
+    if not cursor.loaded:
+        try:
+            cursor.value = source.initial_cursor()
+        except Exception as e:
+            print(f"event cursor init error: {e}")
+            cursor.value = 0
+        cursor.save()
+
+    # Warm the printer -> IP table and keep it fresh in the background
+    RESOLVER.start()
+
+    # Jobs go to the durable outbox (drained in signed batches by its own sender).
+    # Without an outbox they are posted inline, batched unless ingestBatchSize is 1.
+    deliver: Callable[..., Any] = _post
+    acks = False
+    if OUTBOX_PATH:
+        outbox = Outbox(OUTBOX_PATH, _post_batch, batch_size=INGEST_BATCH_SIZE,
+                        max_backoff=OUTBOX_MAX_BACKOFF)
+        OUTBOX_BACKLOG.set_function(outbox.backlog)
+        deliver, acks = outbox.put, True
+    elif INGEST_BATCH_SIZE > 1:
+        deliver = IngestBatcher(_post_batch, INGEST_BATCH_SIZE, INGEST_BATCH_DELAY_MS / 1000.0).add
+        acks = True
+
+    _serve_notify()
+    pipeline = _start_pipeline(deliver, acks)
+
+    dedup = DedupIndex(DEDUP_CAPACITY, DEDUP_WINDOW, DEDUP_PATH)
+    DEDUP_ENTRIES.set_function(dedup.__len__)
+    EVENT_CURSOR.set_function(lambda: cursor.value)
+    EVENTS_IN_FLIGHT.set_function(cursor.in_flight)
     while True:
+        TABLES.check()
         try:
-            # Fetch the most recent 5 events
-            cmd = [
-                "wevtutil",
-                "qe",
-                "Microsoft-Windows-PrintService/Operational",
-                "/f:RenderedXml",
-                "/c:5",
-                "/q:" + query,
-            ]
-            out = subprocess.check_output(cmd, stderr=subprocess.STDOUT, shell=False)
-            text = out.decode("utf-8", errors="ignore")
-            # Split on closing Event tag
-            for chunk in text.split("</Event>"):
-                if "<Event" not in chunk:
-                    continue
-                xml = chunk + "</Event>"
-                # Create a simple hash to dedupe in this session
-                key = str(hash(xml))
-                if key in seen:
-                    continue
-                seen.add(key)
-                if q.full():
-                    # Drop oldest by getting and ignoring
-                    try:
-                        q.get_nowait()
-                    except Exception:
-                        pass
-                q.put(xml)
+            _poll_events(source, cursor, pipeline, dedup)
         except subprocess.CalledProcessError as e:
             print(f"wevtutil error: {e}")
         except Exception as e:
             print(f"agent loop error: {e}")
-        time.sleep(3)
+        time.sleep(POLL_SECONDS)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # backfill's parse workers in the PyInstaller build
+    if sys.argv[1:2] == ["backfill"]:
+        sys.exit(backfill(sys.argv[2:]))
     main()
 
 
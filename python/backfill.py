@@ -0,0 +1,99 @@
+"""
+Bulk re-reading of historical PrintService events for `agent.py backfill`.
+
+The live agent only reads past its cursor, so jobs printed while it was
+down, or before a fresh install, are never billed. A backfill re-reads an
+exported XML file or a time range of the log instead. Such an export can
+hold millions of events, so it is never loaded whole:
+
+- read_chunks() cuts the text stream into chunks of about `chunk_chars`
+  characters, each ending at an </Event>, so no event is split;
+- map_chunks() parses the chunks on a pool of worker processes, with at
+  most two chunks per worker in flight, and yields the results in input
+  order. Memory stays a few chunks deep however long the export is.
+
+Workers receive a chunk's text and send back only the compact result (the
+parsed job fields and the dedup key), not the event XML.
+"""
+
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Deque, Iterable, Iterator, List, Optional
+
+from event_xml import event_time
+
+# spawn, not fork: the agent may already run threads (outbox, resolver) when the pool starts
+_CTX = multiprocessing.get_context("spawn")
+
+_END = "</Event>"
+
+
+def read_file(path: str, read_chars: int = 1 << 20) -> Iterator[str]:
+    """Stream a rendered-XML export in pieces of `read_chars` characters."""
+    with open(path, "r", encoding="utf-8-sig", errors="ignore") as f:
+        yield from iter(lambda: f.read(read_chars), "")
+
+
+def read_chunks(pieces: Iterable[str], chunk_chars: int = 4 << 20) -> Iterator[str]:
+    """Re-cut a stream of text pieces into chunks that each end after an </Event>.
+
+    A single event longer than chunk_chars makes its chunk longer; the text
+    after the last </Event> comes out as a final chunk of its own.
+    """
+    held: List[str] = []
+    size = 0
+    for piece in pieces:
+        held.append(piece)
+        size += len(piece)
+        if size < chunk_chars:
+            continue
+        text = "".join(held)
+        cut = text.rfind(_END)
+        if cut < 0:
+            held, size = [text], len(text)
+            continue
+        cut += len(_END)
+        yield text[:cut]
+        rest = text[cut:]
+        held, size = ([rest], len(rest)) if rest else ([], 0)
+    if size:
+        yield "".join(held)
+
+
+def in_range(time_created: str, since: Optional[float], until: Optional[float]) -> bool:
+    """The event's TimeCreated is in [since, until); events without one are kept."""
+    if since is None and until is None:
+        return True
+    t = event_time(time_created)
+    if t is None:
+        return True
+    return (since is None or t >= since) and (until is None or t < until)
+
+
+def default_workers() -> int:
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def map_chunks(func: Callable[..., Any], chunks: Iterable[str], workers: int, *args: Any) -> Iterator[Any]:
+    """func(chunk, *args) for every chunk, in order, on `workers` processes (0 parses inline).
+
+    func must be a module-level function so the workers can import it.
+    """
+    if workers <= 0:
+        for chunk in chunks:
+            yield func(chunk, *args)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_CTX) as pool:
+        in_flight: Deque[Future] = deque()
+        try:
+            for chunk in chunks:
+                in_flight.append(pool.submit(func, chunk, *args))
+                if len(in_flight) >= 2 * workers:
+                    yield in_flight.popleft().result()
+            while in_flight:
+                yield in_flight.popleft().result()
+        finally:
+            for future in in_flight:
+                future.cancel()
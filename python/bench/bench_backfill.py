@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Backfill of a large event export: throughput, peak memory, and dedup on a rerun.
+
+    python bench/bench_backfill.py --events 1000000 --workers 0 --workers 4
+
+Writes a corpus of N events (bench/corpus.py, about 1 KB each) and delivers
+it to a FakeIngestServer through a fresh outbox. The server runs in its own
+process, logging eventIds to a file, so that this process stays small:
+Linux carries ru_maxrss across exec, and the children would otherwise
+report the bench's own peak as theirs.
+
+- replay: the only way before `agent.py backfill`: the export as the agent's
+  eventReplayFile with the cursor reset to 0. ReplaySource reads and parses
+  the whole file into memory, then the events are posted in ingestBatchSize
+  batches;
+- backfill: `agent.py backfill --file` in a child process with `--workers`
+  parse processes (0 parses inline), then once more with the same dedup
+  file, which must deliver nothing.
+
+events_per_s covers reading, parsing, dedup, enrichment and the hand-off to
+the outbox; seconds adds the wait until the backend has accepted every job.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+SECRET = "bench"
+
+
+def _env(tmp: str, url: str) -> dict:
+    env = dict(os.environ, PRINT_INGEST_HMAC_SECRET=SECRET, PRINT_INGEST_URL=url, PS_WORKERS="0",
+               AGENT_OUTBOX_PATH=os.path.join(tmp, "outbox.db"), AGENT_DEDUP_PATH=os.path.join(tmp, "dedup.bin"))
+    env.pop("AGENT_REPLAY_FILE", None)
+    return env
+
+
+def replay(path: str) -> None:
+    """Child: the events through ReplaySource and the live parse/enrich path."""
+    import agent
+    from dedup_index import DedupIndex, event_key
+    from event_source import ReplaySource
+
+    dedup = DedupIndex(agent.DEDUP_CAPACITY, agent.DEDUP_WINDOW, None)
+    batch = []
+    events = delivered = 0
+    started = time.perf_counter()
+    for rec in ReplaySource(path).read_new(0, agent.PAGE_SIZE):
+        events += 1
+        if not dedup.add(event_key(rec.record_id, rec.xml)):
+            continue
+        info = agent._normalize_event(rec)
+        if info is None:
+            continue
+        batch.append(agent._enrich_job(info))
+        if len(batch) >= agent.INGEST_BATCH_SIZE:
+            delivered += sum(1 for s in agent._post_batch(batch) if 200 <= s < 300)
+            batch = []
+    if batch:
+        delivered += sum(1 for s in agent._post_batch(batch) if 200 <= s < 300)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"events": events, "delivered": delivered, "seconds": round(elapsed, 2),
+                      "events_per_s": round(events / elapsed),
+                      "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}))
+
+
+def _child(cmd: list, env: dict) -> dict:
+    out = subprocess.run(cmd, env=env, stdout=subprocess.PIPE, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _received(log: str) -> int:
+    with open(log, "rb") as f:
+        return sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+
+
+def run(mode: str, path: str, tmp: str, url: str, log: str, workers: int = 0, rerun: bool = False) -> dict:
+    env = _env(tmp, url)
+    if not rerun:
+        for name in ("outbox.db", "outbox.db-wal", "outbox.db-shm", "dedup.bin"):
+            if os.path.exists(os.path.join(tmp, name)):
+                os.remove(os.path.join(tmp, name))
+    before = _received(log)
+    if mode == "replay":
+        result = _child([sys.executable, __file__, "--replay", path], env)
+    else:
+        agent_py = os.path.join(os.path.dirname(HERE), "agent.py")
+        result = _child([sys.executable, agent_py, "backfill", "--file", path, "--workers", str(workers)], env)
+    row = {"mode": mode + (" (rerun)" if rerun else ""), "workers": workers if mode == "backfill" else None}
+    row.update(result)
+    row["received"] = _received(log) - before
+    return row
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=1_000_000)
+    ap.add_argument("--workers", type=int, action="append", help="parse processes (repeatable); default 0 and 2")
+    ap.add_argument("--no-replay", action="store_true", help="skip the replay row (it holds the whole export)")
+    ap.add_argument("--replay", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.replay:
+        replay(args.replay)
+        return
+    from corpus import write
+    from fakes import free_port
+
+    tmp = tempfile.mkdtemp(prefix="backfill-bench-")
+    path = os.path.join(tmp, "events.xml")
+    size = write(path, args.events)
+    print(json.dumps({"events": args.events, "export_mb": round(size / 2 ** 20, 1)}))
+    port = free_port()
+    log = os.path.join(tmp, "received.txt")
+    open(log, "w").close()
+    server = subprocess.Popen([sys.executable, os.path.join(HERE, "fakes.py"), "ingest", "--port", str(port),
+                               "--secret", SECRET, "--log", log])
+    url = f"http://127.0.0.1:{port}/api/print-jobs/ingest"
+    try:
+        time.sleep(1)
+        if not args.no_replay:
+            print(json.dumps(run("replay", path, tmp, url, log)))
+        workers = args.workers or [0, 2]
+        for n in workers:
+            print(json.dumps(run("backfill", path, tmp, url, log, n)))
+        print(json.dumps(run("backfill", path, tmp, url, log, workers[-1], rerun=True)))
+    finally:
+        server.kill()
+        server.wait()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
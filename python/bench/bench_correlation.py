@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Overlay-to-job matching accuracy: one overlay per key vs CorrelationIndex.
+
+Simulates a print room on a virtual clock. Users submit jobs to a handful
+of printers at random. Most submissions post an overlay (the billing
+account) under the printer's IP and/or name. Each printer prints its jobs
+in order, and the completion event reaches the agent a poll interval
+later. Some jobs are printed without an overlay, and some overlays belong
+to jobs that were cancelled. Page counts occasionally differ between the
+overlay and the event. Every event is then matched the way the agent does:
+
+- store: the old OverlayStore, one overlay per ip:/name: key, overwritten by the next;
+- index: CorrelationIndex, several per printer, matched by time window and pages.
+
+A job is correct when it gets its own overlay, or none if it had none.
+The last rows time lookups against n pending overlays:
+
+    python bench/bench_correlation.py --jobs 5000 --printers 8
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from correlation_index import CorrelationIndex
+from legacy_overlays import OverlayStore
+
+
+class Clock:
+    now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def simulate(jobs: int, printers: int, rate: float, seed: int, no_overlay: float, cancelled: float,
+             page_noise: float):
+    """Time-ordered ("add"|"match", t, ...) operations and the true overlay of every job."""
+    rng = random.Random(seed)
+    ops = []
+    truth = {}
+    free_at = [0.0] * printers
+    t = 0.0
+    overlay_id = 0
+    for job in range(jobs):
+        t += rng.expovariate(rate)
+        p = rng.randrange(printers)
+        pages = rng.choice((1, 1, 1, 2, 2, 3, 4, 5, 8, 10, 12, 20))
+        keys = [f"ip:10.0.0.{p + 1}", f"name:printer {p}"]
+        # the app may know only one of them
+        keys = rng.choice((keys, keys, keys, keys[:1], keys[1:]))
+        has_overlay = rng.random() >= no_overlay
+        if has_overlay:
+            overlay_id += 1
+            ops.append(("add", t, keys, {"id": overlay_id}, pages))
+        truth[job] = overlay_id if has_overlay else None
+        if has_overlay and rng.random() < cancelled:
+            continue  # the user cancelled: the overlay never gets its job
+        start = max(t + rng.uniform(0.2, 2.0), free_at[p])  # spooling, then the printer's own queue
+        free_at[p] = done = start + 3 + pages * rng.uniform(0.5, 1.5)
+        event_pages = pages if rng.random() >= page_noise else pages + rng.choice((-1, 1, pages))
+        ops.append(("match", done + rng.uniform(0, 3), job, p, max(1, event_pages), done))
+    ops.sort(key=lambda op: op[1])
+    return ops, truth
+
+
+def replay(kind: str, ops: list, truth: dict, ttl: float) -> dict:
+    clock = Clock()
+    index = CorrelationIndex(ttl=ttl, clock=clock)
+    store = OverlayStore(ttl=ttl, clock=clock)
+    result = {}
+    lookup_s = 0.0
+    for op in ops:
+        clock.now = op[1]
+        if op[0] == "add":
+            _, _, keys, data, pages = op
+            if kind == "index":
+                index.add(keys, data, pages=pages)
+            else:
+                for key in keys:
+                    store.put(key, data)
+            continue
+        _, _, job, p, pages, done = op
+        keys = [f"ip:10.0.0.{p + 1}", f"name:printer {p}"]
+        started = time.perf_counter()
+        if kind == "index":
+            overlay = index.match(keys, pages=pages, at=done)
+        else:
+            overlay = store.pop(keys[0]) or store.pop(keys[1])
+        lookup_s += time.perf_counter() - started
+        result[job] = overlay["id"] if overlay else None
+    matched = [j for j in result]
+    with_overlay = [j for j in matched if truth[j] is not None]
+    return {
+        "matcher": kind,
+        "jobs": len(matched),
+        "accuracy": round(sum(result[j] == truth[j] for j in matched) / max(1, len(matched)), 4),
+        "own_overlay": sum(result[j] == truth[j] for j in with_overlay),
+        "with_overlay": len(with_overlay),
+        "wrong_account": sum(result[j] is not None and result[j] != truth[j] for j in matched),
+        "missed": sum(result[j] is None and truth[j] is not None for j in matched),
+        "false_match": sum(result[j] is not None and truth[j] is None for j in matched),
+        "lookups_per_s": round(len(matched) / lookup_s) if lookup_s else None,
+    }
+
+
+def lookup_rate(pending: int, printers: int, seed: int, lookups: int = 20000) -> dict:
+    """match()+add() pairs per second with `pending` overlays waiting, spread over the printers."""
+    rng = random.Random(seed)
+    clock = Clock()
+    index = CorrelationIndex(ttl=10 ** 9, window=10 ** 9, clock=clock)
+    for i in range(pending):
+        clock.now = i * 0.01
+        p = rng.randrange(printers)
+        index.add([f"ip:10.0.0.{p}", f"name:printer {p}"], {"id": i}, pages=rng.randint(1, 20))
+    started = time.perf_counter()
+    for i in range(lookups):
+        clock.now += 0.01
+        p = rng.randrange(printers)
+        keys = [f"ip:10.0.0.{p}", f"name:printer {p}"]
+        index.match(keys, pages=rng.randint(1, 20))
+        index.add(keys, {"id": -i}, pages=rng.randint(1, 20))
+    elapsed = time.perf_counter() - started
+    return {"pending": pending, "ops": lookups, "lookups_per_s": round(lookups / elapsed)}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jobs", type=int, default=5000)
+    ap.add_argument("--printers", type=int, default=8)
+    ap.add_argument("--rate", type=float, default=0.5, help="job submissions per second, all printers")
+    ap.add_argument("--no-overlay", type=float, default=0.1, help="share of jobs printed without an overlay")
+    ap.add_argument("--cancelled", type=float, default=0.03, help="share of overlays whose job never prints")
+    ap.add_argument("--page-noise", type=float, default=0.05, help="share of events with a different page count")
+    ap.add_argument("--ttl", type=float, default=300)
+    ap.add_argument("--seed", type=int, default=11)
+    args = ap.parse_args()
+    ops, truth = simulate(args.jobs, args.printers, args.rate, args.seed, args.no_overlay, args.cancelled,
+                          args.page_noise)
+    for kind in ("store", "index"):
+        print(json.dumps(replay(kind, ops, truth, args.ttl)))
+    for pending in (1000, 10000, 100000):
+        print(json.dumps(lookup_rate(pending, args.printers, args.seed)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Memory and lookup cost of the dedup index vs the old unbounded set.
+
+    python bench/bench_dedup.py --events 10000000
+
+"set" is the pre-index behaviour (str(hash(xml)) in a set that never shrinks);
+"index" is DedupIndex with the agent's default capacity. Each runs in its own
+interpreter so peak RSS is per mode; lookups are timed on precomputed keys.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEMPLATE = ("<Event><System><EventID>307</EventID><EventRecordID>{0}</EventRecordID></System>"
+            "<UserData><param3>user{1}</param3><TotalPages>{2}</TotalPages></UserData></Event>")
+
+
+def _rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def run(mode: str, events: int, capacity: int) -> dict:
+    from dedup_index import DedupIndex, event_key
+    base = _rss_mb()
+    out = {"mode": mode, "events": events}
+    started = time.perf_counter()
+    if mode == "set":
+        seen = set()
+        for i in range(events):
+            key = str(hash(TEMPLATE.format(i, i % 997, i % 7)))
+            if key not in seen:
+                seen.add(key)
+        out["entries"] = len(seen)
+        out["insert_per_s"] = round(events / (time.perf_counter() - started))
+        out["rss_growth_mb"] = round(_rss_mb() - base, 1)
+        keys = [str(hash(TEMPLATE.format(i, i % 997, i % 7))) for i in range(events - 1_000_000, events)]
+        t = time.perf_counter()
+        hits = sum(1 for k in keys if k in seen)
+        out["lookup_per_s"] = round(1_000_000 / (time.perf_counter() - t))
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "dedup.bin")
+        idx = DedupIndex(capacity=capacity, path=path)
+        for i in range(events):
+            idx.add(event_key(i, TEMPLATE.format(i, i % 997, i % 7)))
+        out["entries"] = len(idx)
+        out["insert_per_s"] = round(events / (time.perf_counter() - started))
+        out["rss_growth_mb"] = round(_rss_mb() - base, 1)
+        keys = [event_key(i, TEMPLATE.format(i, i % 997, i % 7)) for i in range(events - 1_000_000, events)]
+        t = time.perf_counter()
+        hits = sum(1 for k in keys if k in idx)
+        out["lookup_per_s"] = round(len(keys) / (time.perf_counter() - t))
+        t = time.perf_counter()
+        idx.save(force=True)
+        out["save_ms"] = round((time.perf_counter() - t) * 1000, 1)
+        out["file_mb"] = round(os.path.getsize(path) / 1e6, 2)
+        t = time.perf_counter()
+        reloaded = DedupIndex(capacity=capacity, path=path)
+        out["load_ms"] = round((time.perf_counter() - t) * 1000, 1)
+        out["reloaded_entries"] = len(reloaded)
+    out["lookup_hits_of_last_1M"] = hits
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=10_000_000)
+    ap.add_argument("--capacity", type=int, default=200_000)
+    ap.add_argument("--mode", choices=["set", "index"])
+    args = ap.parse_args()
+    if args.mode:
+        print(json.dumps(run(args.mode, args.events, args.capacity)))
+        return
+    for mode in ("set", "index"):
+        out = subprocess.check_output([sys.executable, __file__, "--mode", mode,
+                                       "--events", str(args.events), "--capacity", str(args.capacity)])
+        print(out.decode().strip())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Event XML parsing: split + per-tag str.find vs the single-pass event_xml.
+
+    python bench/bench_event_xml.py --events 100000
+
+"split+find" is the original agent (text.split("</Event>"), no record ids);
+"split_events+find" is the previous tree (regex event split plus an
+EventRecordID search, then the per-tag parser). Two synthetic corpora of rendered 307 events: "userdata" (<param3>-style
+children, which the old parser understands) and "eventdata" (real
+<Data Name="param3"> elements, which it does not). Reports events/s and how
+many events each parser extracted a user and page count from.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("PRINT_INGEST_HMAC_SECRET", "bench")
+os.environ.setdefault("PS_WORKERS", "0")
+
+def _corpus(style: str, events: int) -> str:
+    from corpus import corpus
+    return corpus(events, style=style)
+
+
+def legacy_parse(xml_text: str):
+    """The pre-event_xml agent parser, verbatim apart from the signature."""
+    def _tag(name):
+        start_tag = f"<{name}>"
+        end_tag = f"</{name}>"
+        start = xml_text.find(start_tag)
+        if start == -1:
+            return None
+        start += len(start_tag)
+        end = xml_text.find(end_tag, start)
+        if end == -1:
+            return None
+        return xml_text[start:end]
+
+    username = None
+    for key in ["param3", "User"]:
+        v = _tag(key)
+        if v:
+            username = v
+            break
+    printer = None
+    for key in ["param2", "PrinterName", "param4"]:
+        v = _tag(key)
+        if v:
+            printer = v
+            break
+    pages = None
+    for key in ["TotalPages", "PagesPrinted", "param7", "param6"]:
+        v = _tag(key)
+        if v and v.isdigit():
+            pages = int(v)
+            break
+    if not username or not pages:
+        return None
+    if "\\" in username:
+        username = username.split("\\")[-1]
+    return {"username": username.strip(), "printer": printer or "", "pages": pages}
+
+
+def run_legacy(text: str) -> int:
+    parsed = 0
+    for chunk in text.split("</Event>"):
+        if "<Event" not in chunk:
+            continue
+        xml = chunk + "</Event>"
+        parsed += legacy_parse(xml) is not None
+    return parsed
+
+
+_EVENT_RE = re.compile(r"<Event[\s>].*?</Event>", re.S)
+_RECORD_ID_RE = re.compile(r"<EventRecordID>(\d+)</EventRecordID>")
+
+
+def run_split_events(text: str) -> int:
+    parsed = 0
+    for m in _EVENT_RE.finditer(text):
+        xml = m.group(0)
+        rid = _RECORD_ID_RE.search(xml)
+        parsed += rid is not None and legacy_parse(xml) is not None
+    return parsed
+
+
+def run_single_pass(text: str) -> int:
+    from agent import _parse_event_xml
+    from event_xml import parse_events
+    return sum(_parse_event_xml(rec) is not None for rec in parse_events(text))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=100_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    import agent  # noqa: F401  (import cost outside the timings)
+    for name in ("userdata", "eventdata"):
+        text = _corpus(name, args.events)
+        for impl, fn in (("split+find", run_legacy), ("split_events+find", run_split_events),
+                         ("event_xml", run_single_pass)):
+            best = float("inf")
+            for _ in range(args.repeat):
+                t = time.perf_counter()
+                parsed = fn(text)
+                best = min(best, time.perf_counter() - t)
+            print(json.dumps({"corpus": name, "impl": impl, "events": args.events, "parsed": parsed,
+                              "seconds": round(best, 3), "events_per_s": round(args.events / best),
+                              "mb_per_s": round(len(text) / best / 1e6, 1)}))
+
+
+if __name__ == "__main__":
+    main()
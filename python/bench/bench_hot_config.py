@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""Config reloads under load, listeners bound and closed live, and lookup cost.
+
+    python bench/bench_hot_config.py --seconds 10 --reload-every 0.25
+
+reload: a proxy child reads its config from a file that the bench rewrites
+every --reload-every seconds while --clients threads send jobs to
+one listener. Each version renames the device, switches the printer's
+injector between pjl and none, and adds or removes a second listener. Every
+fifth edit is invalid JSON, which must be reported and ignored. Reported:
+
+- dropped: jobs sent minus jobs that reached the FakePrinter, which must be 0;
+- bind_ms / unbind_ms: from the file write until the added listener accepts,
+  or the removed one refuses, connections;
+- inflight_complete: a job started on the second listener, finished after
+  that listener was removed from the config, arrives whole.
+
+lookup: in-process, the per-connection resolution of listener, profile,
+injector and limits, as the raw config dict lookups the proxy did before
+(copied below) and as the compiled ProxyConfig, for a config with
+--listeners listeners and printer profiles.
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+
+def serve() -> None:
+    import print_proxy
+    print_proxy.ThreadedTCPServer.request_queue_size = 1024
+    print_proxy.main()
+
+
+def _wait_port(port: int, timeout: float = 10) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return True
+        except OSError:
+            time.sleep(0.005)
+    return False
+
+
+def _wait_closed(port: int, timeout: float = 10) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+        except OSError:
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def _write(path: str, text: str) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _config(version: int, engine: str, port: int, extra_port: int, http_port: int, printer_port: int,
+            with_extra: bool) -> dict:
+    listeners = {str(port): {"deviceName": f"bench v{version}", "targetIP": "127.0.0.1", "targetPort": printer_port}}
+    if with_extra:
+        listeners[str(extra_port)] = {"deviceName": "bench extra", "targetIP": "127.0.0.1", "targetPort": printer_port}
+    return {
+        "listeners": listeners,
+        "printerProfiles": {"127.0.0.1": {"injector": "pjl" if version % 2 else "none"}},
+        "localHttpPort": http_port,
+        "agentNotifyPort": 1,
+        "analyzeJobs": False,
+        "engine": engine,
+        "configReloadSeconds": 0.05,
+    }
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def reload_run(engine: str, seconds: float, reload_every: float, clients: int, job_kb: int) -> dict:
+    from fakes import FakePrinter, free_port, send_job
+    printer = FakePrinter()
+    port, extra_port, http_port = free_port(), free_port(), free_port()
+    tmp = tempfile.mkdtemp(prefix="hot-config-bench-")
+    path = os.path.join(tmp, "print_proxy.config.json")
+    _write(path, json.dumps(_config(0, engine, port, extra_port, http_port, printer.port, False)))
+    env = dict(os.environ, PRINT_PROXY_CONFIG=path)
+    proc = subprocess.Popen([sys.executable, __file__, "--serve"], env=env, stdout=subprocess.DEVNULL)
+    sent = [0] * clients
+    failed = [0] * clients
+    stop = threading.Event()
+
+    def client(i: int) -> None:
+        while not stop.is_set():
+            try:
+                send_job(port, job_kb * 1024, wait_close=True)
+                sent[i] += 1
+            except OSError:
+                failed[i] += 1
+
+    try:
+        _wait_port(port)
+        _wait_port(http_port)
+        baseline = len(printer.jobs)  # the readiness probe
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+        for t in threads:
+            t.start()
+        bind_ms, unbind_ms = [], []
+        reloads = bad_edits = 0
+        inflight_complete = None
+        deadline = time.time() + seconds
+        version = 0
+        while time.time() < deadline:
+            time.sleep(reload_every)
+            version += 1
+            if version % 5 == 0:
+                _write(path, '{"listeners": {')  # invalid: must be ignored
+                bad_edits += 1
+                continue
+            with_extra = version % 2 == 1
+            if not with_extra and inflight_complete is None:
+                # A job in flight on the listener about to be removed
+                conn = socket.create_connection(("127.0.0.1", extra_port))
+                conn.sendall(b"\x1B*b" + b"\x55" * 65533)
+            else:
+                conn = None
+            written = time.perf_counter()
+            _write(path, json.dumps(_config(version, engine, port, extra_port, http_port, printer.port, with_extra)))
+            reloads += 1
+            if with_extra:
+                if _wait_port(extra_port):
+                    bind_ms.append((time.perf_counter() - written) * 1000)
+            elif _wait_closed(extra_port):
+                unbind_ms.append((time.perf_counter() - written) * 1000)
+            if conn is not None:
+                before = len(printer.jobs)
+                conn.sendall(b"\x55" * 65536)
+                conn.shutdown(socket.SHUT_WR)
+                while conn.recv(4096):
+                    pass
+                conn.close()
+                # the connection's own version injects pjl around it, so at least this many
+                expected = 2 * 65536
+                t_end = time.time() + 10
+                while time.time() < t_end and not any(n >= expected for n in printer.jobs[before:]):
+                    time.sleep(0.005)
+                inflight_complete = any(n >= expected for n in printer.jobs[before:])
+                baseline += 1  # not one of the clients' jobs
+        stop.set()
+        for t in threads:
+            t.join()
+        total = sum(sent)
+        printer.wait_jobs(baseline + total, timeout=30)
+        received = len(printer.jobs) - baseline
+        return {
+            "mode": "reload",
+            "engine": engine,
+            "seconds": seconds,
+            "reloads": reloads,
+            "bad_edits": bad_edits,
+            "jobs_sent": total,
+            "jobs_at_printer": received,
+            "dropped": total - received,
+            "client_errors": sum(failed),
+            "jobs_per_s": round(total / seconds, 1),
+            "bind_ms_p50": round(_percentile(bind_ms, 0.5), 1),
+            "bind_ms_max": round(max(bind_ms, default=0), 1),
+            "unbind_ms_p50": round(_percentile(unbind_ms, 0.5), 1),
+            "unbind_ms_max": round(max(unbind_ms, default=0), 1),
+            "inflight_complete": inflight_complete,
+        }
+    finally:
+        stop.set()
+        proc.terminate()
+        proc.wait()
+        printer.close()
+
+
+# The per-connection lookups print_proxy did on the raw dict before proxy_config
+def _dict_lookup(config: dict, port: int, injectors: dict, framers: dict) -> tuple:
+    def cfg(key, default=None):
+        v = config.get(key)
+        return default if v is None else v
+    listeners = cfg("listeners", {}) or {}
+    listener = listeners.get(str(port), {})
+    device_ip = str(listener.get("targetIP") or cfg("defaultTargetIP", ""))
+    device_port = int(listener.get("targetPort") or cfg("defaultTargetPort", 9100) or 9100)
+    idle = float(cfg("clientIdleSeconds", 30))
+    split = bool(cfg("splitJobs", True))
+    chunk = int(cfg("chunkBytes", 64 * 1024) or 64 * 1024)
+    profiles = cfg("printerProfiles", {}) or {}
+    profile = profiles.get(device_ip, profiles.get("default", {}))
+    injector_name = str(profile.get("injector") or "none")
+    max_bytes = int(cfg("maxJobBytes", 50 * 1024 * 1024))
+    framer = framers["none"] if injector_name not in injectors else framers.get(injector_name)
+    stream = cfg("streamJobs", True)
+    wait = float(cfg("spoolWaitSeconds", 60))
+    threshold = int(cfg("spoolThresholdBytes", 8 * 1024 * 1024) or 0)
+    analyze = cfg("analyzeJobs", True)
+    port_notify = int(cfg("agentNotifyPort", 57981) or 57981)
+    token = str(cfg("agentNotifyToken", "") or "")
+    url = f"http://127.0.0.1:{port_notify}/notify"
+    return listener, device_ip, device_port, idle, split, chunk, framer, max_bytes, stream, wait, threshold, \
+        analyze, url, token
+
+
+def _compiled_lookup(conf, port: int) -> tuple:
+    listener = conf.listener(port)
+    target = conf.target(listener.target_ip)
+    return listener, target, conf.client_idle, conf.split_jobs, conf.chunk_bytes, target.framer, conf.max_job_bytes, \
+        conf.stream_jobs, conf.spool_wait, conf.spool_threshold, conf.analyze_jobs, conf.notify_url, conf.notify_token
+
+
+def lookup_run(listeners: int, rounds: int) -> dict:
+    import print_proxy
+    config = {
+        "listeners": {str(9000 + i): {"deviceName": f"printer {i}", "targetIP": f"10.0.0.{i % 250}",
+                                      "targetPort": 9100} for i in range(listeners)},
+        "printerProfiles": {f"10.0.0.{i % 250}": {"injector": "pjl"} for i in range(listeners)},
+        "maxJobBytes": 50 * 1024 * 1024,
+    }
+    ports = [9000 + (i * 7919) % listeners for i in range(rounds)]
+    started = time.perf_counter()
+    for p in ports:
+        _dict_lookup(config, p, print_proxy.INJECTORS, print_proxy.FRAMERS)
+    dict_ns = (time.perf_counter() - started) / rounds * 1e9
+    started = time.perf_counter()
+    conf = print_proxy.compile_config(config, print_proxy.INJECTORS, print_proxy.FRAMERS, print_proxy.STRATEGIES)
+    compile_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    for p in ports:
+        _compiled_lookup(conf, p)
+    compiled_ns = (time.perf_counter() - started) / rounds * 1e9
+    return {"mode": "lookup", "listeners": listeners, "dict_ns": round(dict_ns), "compiled_ns": round(compiled_ns),
+            "speedup": round(dict_ns / compiled_ns, 1), "compile_ms": round(compile_ms, 2)}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--reload-every", type=float, default=0.25)
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--job-kb", type=int, default=64)
+    ap.add_argument("--engine", choices=["threaded", "asyncio"], action="append")
+    ap.add_argument("--listeners", type=int, default=50)
+    ap.add_argument("--rounds", type=int, default=200000)
+    ap.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.serve:
+        serve()
+        return
+    print(json.dumps(lookup_run(args.listeners, args.rounds)))
+    for engine in args.engine or ["threaded", "asyncio"]:
+        print(json.dumps(reload_run(engine, args.seconds, args.reload_every, args.clients, args.job_kb)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Per-post latency and connections opened: urllib per request vs HttpPool.
+
+Posts signed single-job payloads to a local stand-in ingest server over HTTP
+and, when the openssl CLI is available, HTTPS with a throwaway certificate:
+
+    python bench/bench_http_pool.py --jobs 1000
+"""
+
+import argparse
+import json
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+os.environ.setdefault("PRINT_INGEST_HMAC_SECRET", "bench-secret")
+os.environ.setdefault("PS_WORKERS", "0")
+
+import agent
+from fakes import FakeIngestServer
+from http_pool import HttpPool
+
+
+def _self_signed() -> str:
+    d = tempfile.mkdtemp()
+    pem = os.path.join(d, "cert.pem")
+    subprocess.check_call(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                           "-subj", "/CN=127.0.0.1", "-keyout", pem, "-out", pem],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return pem
+
+
+def _urllib_post(url: str, body: bytes, headers: dict, ctx) -> int:
+    req = urllib.request.Request(url, data=body, headers=headers, method="POST")
+    with urllib.request.urlopen(req, timeout=5, context=ctx) as resp:
+        resp.read()
+        return resp.status
+
+
+def run(mode: str, jobs: int, certfile) -> dict:
+    server = FakeIngestServer(agent.HMAC_SECRET, certfile=certfile)
+    ctx = None
+    if certfile:
+        ctx = ssl.create_default_context(cafile=certfile)
+        ctx.check_hostname = False
+    pool = HttpPool(max_connections=4, context=ctx)
+    latencies = []
+    for i in range(jobs):
+        body = json.dumps({"username": "401", "type": "A4BW", "quantity": 1 + i % 3}).encode()
+        ts = agent._now_unix()
+        headers = {"Content-Type": "application/json", "x-timestamp": str(ts), "x-signature": agent._sign(body.decode(), ts)}
+        t = time.perf_counter()
+        if mode == "urllib":
+            status = _urllib_post(server.url, body, headers, ctx)
+        else:
+            status, _ = pool.post(server.url, body, headers)
+        latencies.append(time.perf_counter() - t)
+        assert status == 200, status
+    pool.close()
+    server.close()
+    latencies.sort()
+    return {
+        "transport": "https" if certfile else "http",
+        "mode": mode,
+        "jobs": jobs,
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 3),
+        "connections_per_1000": round(server.connections * 1000 / jobs, 1),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jobs", type=int, default=1000)
+    args = ap.parse_args()
+    certs = [None] + ([_self_signed()] if shutil.which("openssl") else [])
+    for certfile in certs:
+        for mode in ("urllib", "pool"):
+            print(json.dumps(run(mode, args.jobs, certfile)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Ingest throughput: one signed POST per job vs batched posts.
+
+Runs the agent's real _post/_post_batch against a local HMAC-verifying stand-in
+whose per-request delay models the backend's user query + price read +
+transaction:
+
+    python bench/bench_ingest_batch.py --jobs 2000 --request-ms 5
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+os.environ.setdefault("PRINT_INGEST_HMAC_SECRET", "bench-secret")
+os.environ.setdefault("PS_WORKERS", "0")
+
+import agent
+from fakes import FakeIngestServer
+from ingest_batcher import IngestBatcher
+
+
+def _job(i: int) -> dict:
+    return {"username": str(400 + i % 50), "type": "A4BW", "quantity": 1 + i % 5,
+            "deviceName": "Canon B/W", "deviceIP": "192.168.3.41"}
+
+
+def run(mode: str, jobs: int, batch: int, request_ms: float) -> dict:
+    server = FakeIngestServer(agent.HMAC_SECRET, request_delay=request_ms / 1000.0, job_delay=0.0002)
+    agent.INGEST_URL = server.url
+    started = time.perf_counter()
+    if mode == "single":
+        for i in range(jobs):
+            agent._post(_job(i))
+    else:
+        batcher = IngestBatcher(agent._post_batch, batch, 0.25)
+        for i in range(jobs):
+            batcher.add(_job(i))
+        batcher.close(timeout=300)
+    elapsed = time.perf_counter() - started
+    server.close()
+    return {
+        "mode": mode,
+        "jobs": len(server.jobs),
+        "requests": server.requests,
+        "wall_s": round(elapsed, 3),
+        "jobs_per_s": round(len(server.jobs) / elapsed, 1),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jobs", type=int, default=2000)
+    ap.add_argument("--batch", type=int, default=50)
+    ap.add_argument("--request-ms", type=float, default=5.0)
+    args = ap.parse_args()
+    for mode in ("single", "batch"):
+        print(json.dumps(run(mode, args.jobs, args.batch, args.request_ms)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""JobAnalyzer throughput (MB/s) and accuracy on generated PCL/PS/PDF jobs.
+
+Jobs are fed in proxy-sized chunks; every analysis is checked against the
+page count, copies, colour, duplex and paper the generator used.
+
+    python bench/bench_job_analyzer.py --jobs 300 --chunk-kb 64
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from job_analyzer import JobAnalyzer
+from print_jobs import mix
+
+_CHECKED = ("language", "pages", "copies", "duplex", "color", "paper", "type")
+
+
+def run(jobs: int, chunk: int, kb_per_page: int) -> list:
+    corpus = list(mix(jobs, kb_per_page=kb_per_page))
+    per_lang = defaultdict(lambda: {"bytes": 0, "seconds": 0.0, "jobs": 0, "wrong": 0})
+    mismatches = []
+    for job, expected in corpus:
+        view = memoryview(job)
+        started = time.perf_counter()
+        analyzer = JobAnalyzer()
+        for off in range(0, len(job), chunk):
+            analyzer.feed(view[off:off + chunk])
+        got = analyzer.result()
+        elapsed = time.perf_counter() - started
+        row = per_lang[expected["language"]]
+        row["bytes"] += len(job)
+        row["seconds"] += elapsed
+        row["jobs"] += 1
+        wrong = {k: (got[k], expected[k]) for k in _CHECKED if got[k] != expected[k]}
+        if wrong:
+            row["wrong"] += 1
+            mismatches.append(wrong)
+    out = []
+    total_b = total_s = 0.0
+    for lang, row in sorted(per_lang.items()):
+        total_b += row["bytes"]
+        total_s += row["seconds"]
+        out.append({"language": lang, "jobs": row["jobs"], "mb": round(row["bytes"] / 1e6, 1),
+                    "mb_per_s": round(row["bytes"] / 1e6 / row["seconds"], 1), "wrong": row["wrong"]})
+    out.append({"language": "all", "jobs": len(corpus), "mb": round(total_b / 1e6, 1),
+                "mb_per_s": round(total_b / 1e6 / total_s, 1), "wrong": len(mismatches)})
+    for wrong in mismatches[:5]:
+        print("mismatch", wrong, file=sys.stderr)
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jobs", type=int, default=300)
+    ap.add_argument("--chunk-kb", type=int, default=64)
+    ap.add_argument("--kb-per-page", type=int, default=64)
+    args = ap.parse_args()
+    for row in run(args.jobs, args.chunk_kb * 1024, args.kb_per_page):
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Many small jobs back to back on one RAW connection.
+
+One client connection carries a batch of small PJL-bracketed PCL jobs, as a
+driver or print server that keeps its connection open between documents
+does. With splitJobs the proxy must deliver each as its own job. The
+FakePrinter sees one connection per job, each with its own tag, and the
+page counter must match the pages sent. With splitJobs off the whole
+batch arrives as one job, which is the old behaviour:
+
+    python bench/bench_job_split.py --jobs 1000
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+# (engine, scheduleJobs, splitJobs)
+MODES = (("threaded", False, False), ("threaded", False, True), ("threaded", True, True),
+         ("asyncio", False, True), ("asyncio", True, True))
+_PAGES_RE = r'^print_proxy_pages_total\{listener="\d+",type="[^"]*"\} (\S+)$'
+
+
+def serve(config: dict) -> None:
+    import print_proxy
+    print_proxy.CONFIG.clear()
+    print_proxy.CONFIG.update(config)
+    print_proxy.main()
+
+
+def _wait_port(port: int) -> None:
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+
+
+def batch(jobs: int, raster_kb: int, seed: int):
+    """(bytes of all jobs, pages)."""
+    from print_jobs import pcl_job, pjl_wrap
+    rng = random.Random(seed)
+    out, pages = [], 0
+    for i in range(jobs):
+        n = rng.randint(1, 3)
+        job = pjl_wrap(pcl_job(n, raster_kb=raster_kb, rng=rng), "PCL")
+        out.append(job.replace(b'NAME="bench"', b'NAME="bench-job=%d"' % i, 1))
+        pages += n
+    return b"".join(out), pages
+
+
+def run(engine: str, schedule: bool, split: bool, jobs: int, raster_kb: int, seed: int) -> dict:
+    from fakes import FakePrinter, free_port
+    printer = FakePrinter()
+    port, http_port = free_port(), free_port()
+    config = {
+        "listeners": {str(port): {"deviceName": "bench split", "targetIP": "127.0.0.1", "targetPort": printer.port}},
+        "localHttpPort": http_port,
+        "agentNotifyPort": 1,
+        "engine": engine,
+        "scheduleJobs": schedule,
+        "splitJobs": split,
+    }
+    data, pages = batch(jobs, raster_kb, seed)
+    expected = jobs if split else 1
+    proc = subprocess.Popen([sys.executable, __file__, "--serve", json.dumps(config)])
+    try:
+        _wait_port(port)
+        _wait_port(http_port)
+        baseline = len(printer.jobs)  # the readiness probe
+        started = time.perf_counter()
+        with socket.create_connection(("127.0.0.1", port)) as s:
+            s.sendall(data)
+            s.shutdown(socket.SHUT_WR)
+            while s.recv(4096):
+                pass
+        deadline = time.time() + 60
+        while len(printer.jobs) - baseline < expected and time.time() < deadline:
+            time.sleep(0.005)
+        elapsed = time.perf_counter() - started
+        text = urllib.request.urlopen(f"http://127.0.0.1:{http_port}/metrics", timeout=10).read().decode()
+        return {
+            "engine": engine,
+            "schedule": schedule,
+            "split": split,
+            "jobs_sent": jobs,
+            "mb": round(len(data) / 1e6, 2),
+            "jobs_at_printer": len(printer.jobs) - baseline,
+            "tagged_jobs": len(printer.finished),
+            "bytes_at_printer": sum(printer.jobs[baseline:]),
+            "bytes_sent": len(data),
+            "pages_sent": pages,
+            "pages_counted": int(sum(float(v) for v in re.findall(_PAGES_RE, text, re.M))),
+            "wall_s": round(elapsed, 3),
+            "jobs_per_s": round(jobs / elapsed, 1),
+        }
+    finally:
+        proc.terminate()
+        proc.wait()
+        printer.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jobs", type=int, default=1000)
+    ap.add_argument("--raster-kb", type=int, default=4, help="raster data per page")
+    ap.add_argument("--seed", type=int, default=3)
+    ap.add_argument("--serve", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.serve:
+        serve(json.loads(args.serve))
+        return
+    for engine, schedule, split in MODES:
+        print(json.dumps(run(engine, schedule, split, args.jobs, args.raster_kb, args.seed)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""Request throughput and tail latency of the local control servers.
+
+The proxy's /set and the agent's /notify are run in a child process. Then
+N concurrent clients (asyncio, one connection each) post overlays at them:
+
+- legacy: the old server, a single-threaded socketserver.TCPServer that
+  answers HTTP/1.0 and closes. Each request needs a new connection.
+- keep-alive: local_http's threaded HTTP/1.1 server. Each client keeps
+  its connection open.
+- bulk: the same server, with `--batch` overlays per request as a JSON array.
+
+Afterwards the server's own received counter must equal the overlays sent:
+
+    python bench/bench_local_http.py --clients 500 --requests 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+SERVERS = {"proxy": ("/set", "print_proxy"), "agent": ("/notify", "print_agent")}
+MODES = ("legacy", "keep-alive", "bulk")
+
+
+def _legacy_serve(port: int, handler: type, backlog: int = 0, idle_seconds: float = 0) -> threading.Thread:
+    """The servers as they were: one request at a time, connection closed after it."""
+    handler.protocol_version = "HTTP/1.0"
+    server = socketserver.TCPServer(("127.0.0.1", port), handler)
+    server.idle_seconds = None
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    return t
+
+
+def serve(spec: dict) -> None:
+    if spec["server"] == "proxy":
+        import print_proxy
+        print_proxy.CONFIG.clear()
+        print_proxy.CONFIG.update({"localHttpPort": spec["port"]})
+        if spec["legacy"]:
+            print_proxy.serve_local = _legacy_serve
+        print_proxy.start_http_server()
+    else:
+        os.environ["LOCAL_NOTIFY_PORT"] = str(spec["port"])
+        os.environ.setdefault("PS_WORKERS", "0")
+        import agent
+        if spec["legacy"]:
+            agent.serve_local = _legacy_serve
+        agent._serve_notify()
+    threading.Event().wait()
+
+
+def _wait_port(port: int) -> None:
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+
+
+def _request(path: str, body: bytes, keep_alive: bool) -> bytes:
+    return (f"POST {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+            ).encode("ascii") + body
+
+
+async def _exchange(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, request: bytes) -> int:
+    writer.write(request)
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    m = re.search(rb"(?i)\r\ncontent-length: *(\d+)", head)
+    if m and int(m.group(1)):
+        await reader.readexactly(int(m.group(1)))
+    return status
+
+
+async def _client(port: int, path: str, index: int, requests: int, batch: int, keep_alive: bool,
+                  latencies: list, errors: list) -> None:
+    conn = None
+    for i in range(requests):
+        records = [{"deviceName": f"bench {index}-{i}-{k}", "accountUsername": f"u{index}"} for k in range(batch)]
+        body = json.dumps(records if batch > 1 else records[0]).encode()
+        started = time.perf_counter()
+        try:
+            if conn is None:
+                conn = await asyncio.open_connection("127.0.0.1", port)
+            status = await asyncio.wait_for(_exchange(*conn, _request(path, body, keep_alive)), 30)
+            if status != 200:
+                errors.append(status)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            errors.append(type(e).__name__)
+            conn = None
+            continue
+        latencies.append(time.perf_counter() - started)
+        if not keep_alive:
+            conn[1].close()
+            conn = None
+    if conn is not None:
+        conn[1].close()
+
+
+async def _load(port: int, path: str, clients: int, requests: int, batch: int, keep_alive: bool):
+    latencies: list = []
+    errors: list = []
+    await asyncio.gather(*(_client(port, path, c, requests, batch, keep_alive, latencies, errors)
+                           for c in range(clients)))
+    return latencies, errors
+
+
+def _pct(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(p / 100 * len(values)))] * 1000, 1)
+
+
+def run(server: str, mode: str, clients: int, requests: int, batch: int) -> dict:
+    from fakes import free_port
+    path, prefix = SERVERS[server]
+    port = free_port()
+    spec = {"server": server, "port": port, "legacy": mode == "legacy"}
+    proc = subprocess.Popen([sys.executable, __file__, "--serve", json.dumps(spec)])
+    try:
+        _wait_port(port)
+        per_request = batch if mode == "bulk" else 1
+        started = time.perf_counter()
+        latencies, errors = asyncio.run(_load(port, path, clients, requests, per_request, mode != "legacy"))
+        elapsed = time.perf_counter() - started
+        text = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=10).read().decode()
+        m = re.search(rf'^{prefix}_overlays_total\{{result="received"\}} (\S+)$', text, re.M)
+        return {
+            "server": server,
+            "mode": mode,
+            "clients": clients,
+            "requests": len(latencies),
+            "errors": len(errors),
+            "overlays_sent": len(latencies) * per_request,
+            "overlays_received": int(float(m.group(1))) if m else 0,
+            "wall_s": round(elapsed, 2),
+            "requests_per_s": round(len(latencies) / elapsed, 1),
+            "overlays_per_s": round(len(latencies) * per_request / elapsed, 1),
+            "p50_ms": _pct(latencies, 50),
+            "p99_ms": _pct(latencies, 99),
+            "max_ms": _pct(latencies, 100),
+        }
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=500)
+    ap.add_argument("--requests", type=int, default=20, help="requests per client")
+    ap.add_argument("--batch", type=int, default=50, help="overlays per request in bulk mode")
+    ap.add_argument("--server", choices=sorted(SERVERS), action="append")
+    ap.add_argument("--mode", choices=MODES, action="append")
+    ap.add_argument("--serve", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.serve:
+        serve(json.loads(args.serve))
+        return
+    for server in args.server or sorted(SERVERS, reverse=True):
+        for mode in args.mode or MODES:
+            print(json.dumps(run(server, mode, args.clients, args.requests, args.batch)))
+
+
+if __name__ == "__main__":
+    main()
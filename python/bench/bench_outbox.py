@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Outbox durability: kill and restart the ingest server under sustained load.
+
+Jobs are produced at a steady rate into the agent's Outbox, which drains them
+with the real _post_batch. Midway the stand-in server is SIGKILLed and brought
+back on the same port; at the end every eventId must have been accepted:
+
+    python bench/bench_outbox.py --jobs 5000 --rate 1000
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+os.environ.setdefault("PRINT_INGEST_HMAC_SECRET", "bench-secret")
+os.environ.setdefault("PS_WORKERS", "0")
+
+import agent
+from outbox import Outbox
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(port: int, log: str) -> subprocess.Popen:
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, "fakes.py"), "ingest", "--port", str(port),
+                             "--secret", agent.HMAC_SECRET, "--log", log])
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            break
+        except OSError:
+            time.sleep(0.02)
+    return proc
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jobs", type=int, default=5000)
+    ap.add_argument("--rate", type=float, default=1000.0, help="jobs per second")
+    ap.add_argument("--down-at", type=float, default=1.5, help="seconds into the run")
+    ap.add_argument("--down-for", type=float, default=2.0)
+    args = ap.parse_args()
+
+    work = tempfile.mkdtemp()
+    log = os.path.join(work, "accepted.txt")
+    port = _free_port()
+    agent.INGEST_URL = f"http://127.0.0.1:{port}/api/print-jobs/ingest"
+    server = _start_server(port, log)
+    box = Outbox(os.path.join(work, "outbox.db"), agent._post_batch, batch_size=50,
+                 base_backoff=0.1, max_backoff=1.0)
+
+    def chaos():
+        nonlocal server
+        time.sleep(args.down_at)
+        server.send_signal(signal.SIGKILL)
+        server.wait()
+        time.sleep(args.down_for)
+        server = _start_server(port, log)
+
+    killer = threading.Thread(target=chaos)
+    killer.start()
+    started = time.perf_counter()
+    for i in range(args.jobs):
+        box.put({"username": "401", "type": "A4BW", "quantity": 1, "eventId": f"{i:016x}"})
+        sleep = started + (i + 1) / args.rate - time.perf_counter()
+        if sleep > 0:
+            time.sleep(sleep)
+    produced_s = time.perf_counter() - started
+    killer.join()
+    deadline = time.time() + 120
+    while box.backlog() and time.time() < deadline:
+        time.sleep(0.05)
+    drained_s = time.perf_counter() - started
+    box.close()
+    server.kill()
+    server.wait()
+
+    with open(log, encoding="utf-8") as f:
+        accepted = [line.strip() for line in f if line.strip()]
+    unique = set(accepted)
+    expected = {f"{i:016x}" for i in range(args.jobs)}
+    print(json.dumps({
+        "jobs": args.jobs,
+        "produce_s": round(produced_s, 2),
+        "drained_s": round(drained_s, 2),
+        "server_down_s": args.down_for,
+        "accepted_unique": len(unique & expected),
+        "lost": len(expected - unique),
+        "duplicates_at_server": len(accepted) - len(unique),
+        "dead": box.dead,
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Pending-overlay lookups at 100k entries: prune-by-scan dict vs OverlayStore.
+
+    python bench/bench_overlay_store.py --entries 100000
+
+Also runs writer/reader threads against both to show the legacy dict breaking
+under concurrent /set + lookup traffic.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from legacy_overlays import OverlayStore
+
+
+class LegacyPending:
+    """The per-component dict both agent.py and print_proxy.py used before."""
+
+    def __init__(self, ttl: int = 300):
+        self.ttl = ttl
+        self.pending = {}
+
+    def put(self, key, data):
+        self.pending[key] = {**data, "_ts": int(time.time())}
+
+    def pop(self, key):
+        prune_before = int(time.time()) - self.ttl
+        for k in list(self.pending.keys()):
+            if int(self.pending[k].get("_ts", 0)) < prune_before:
+                self.pending.pop(k, None)
+        return self.pending.pop(key, None)
+
+
+def _info(i: int) -> dict:
+    return {"accountUsername": f"u{i}", "accountPassword": "", "type": "A4BW", "quantity": 1,
+            "deviceName": f"dev{i % 50}", "deviceIP": f"10.0.{i // 250 % 256}.{i % 250}"}
+
+
+def measure(store, entries: int, lookups: int) -> dict:
+    t = time.perf_counter()
+    for i in range(entries):
+        store.put(f"ip:key{i}", _info(i))
+    put_s = time.perf_counter() - t
+    t = time.perf_counter()
+    hits = 0
+    for i in range(lookups):
+        hits += store.pop(f"ip:key{i * 7 % entries}") is not None
+        store.pop("ip:missing")
+    lookup_s = time.perf_counter() - t
+    return {"puts_per_s": round(entries / put_s), "lookups_per_s": round(2 * lookups / lookup_s), "hits": hits}
+
+
+def stress(store, seconds: float = 1.0) -> dict:
+    errors = []
+    stop = time.time() + seconds
+    ops = [0]
+
+    def writer(n):
+        i = 0
+        while time.time() < stop:
+            try:
+                store.put(f"ip:w{n}-{i % 5000}", _info(i))
+            except Exception as e:
+                errors.append(repr(e))
+                return
+            i += 1
+            ops[0] += 1
+
+    def reader(n):
+        i = 0
+        while time.time() < stop:
+            try:
+                store.pop(f"ip:w{n}-{i % 5000}")
+            except Exception as e:
+                errors.append(repr(e))
+                return
+            i += 1
+            ops[0] += 1
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    threads += [threading.Thread(target=reader, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {"ops": ops[0], "errors": len(errors), "first_error": errors[0] if errors else None}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--entries", type=int, default=100_000)
+    ap.add_argument("--lookups", type=int, default=200)
+    args = ap.parse_args()
+    legacy = measure(LegacyPending(), args.entries, args.lookups)
+    store = measure(OverlayStore(ttl=300), args.entries, args.lookups * 100)
+    print(json.dumps({"impl": "legacy-dict", "entries": args.entries, **legacy}))
+    print(json.dumps({"impl": "OverlayStore", "entries": args.entries, **store}))
+    print(json.dumps({"impl": "legacy-dict", "stress": stress(LegacyPending())}))
+    print(json.dumps({"impl": "OverlayStore", "stress": stress(OverlayStore(ttl=300))}))
+
+
+if __name__ == "__main__":
+    main()
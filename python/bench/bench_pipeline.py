@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Agent consumer throughput against a slow ingest API: serial vs staged pipeline.
+
+    python bench/bench_pipeline.py --events 400 --request-ms 50
+
+"serial" is the old consumer (parse, resolve, overlay and post one event at a
+time on one thread); "staged" is agent._start_pipeline with N deliver workers
+posting directly (no batching or outbox, so every job pays the delay). The
+reader blocks instead of dropping when the stages are full; max_depth shows
+the deepest each stage queue got.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+os.environ["PRINT_INGEST_HMAC_SECRET"] = "bench"
+os.environ["PS_WORKERS"] = "0"
+os.environ["LOCAL_NOTIFY_PORT"] = "0"
+
+
+def run(mode: str, events: int, request_ms: float, workers: int) -> dict:
+    import agent
+    from corpus import printer_ip, printer_names, write
+    from dedup_index import DedupIndex
+    from event_source import EventCursor, ReplaySource
+    from fakes import FakeIngestServer, FakeResolver
+    from pipeline import Pipeline, Stage
+    from printer_resolver import ResolverCache
+
+    tmp = tempfile.mkdtemp(prefix="pipeline-bench-")
+    replay = os.path.join(tmp, "events.xml")
+    write(replay, events)
+    server = FakeIngestServer("bench", request_delay=request_ms / 1000.0)
+    agent.INGEST_URL = server.url
+    agent.HTTP = agent.HttpPool(max_connections=max(4, workers), timeout=5)
+    agent.RESOLVER = ResolverCache(FakeResolver({n: printer_ip(i) for i, n in enumerate(printer_names(20))}))
+    agent.RESOLVER.refresh()
+
+    if mode == "serial":
+        def serial(rec):
+            info = agent._normalize_event(rec)
+            if info is not None:
+                agent._post(agent._enrich_job(info))
+        pipeline = Pipeline([Stage("serial", serial, 1, 100)]).start()
+    else:
+        agent.DELIVER_WORKERS = workers
+        pipeline = agent._start_pipeline(agent._post)
+
+    max_depth = {s.name: 0 for s in pipeline.stages}
+    stop = threading.Event()
+
+    def sample():
+        while not stop.is_set():
+            for name, depth in pipeline.depths().items():
+                max_depth[name] = max(max_depth[name], depth)
+            time.sleep(0.005)
+
+    threading.Thread(target=sample, daemon=True).start()
+    cursor = EventCursor(os.path.join(tmp, "cursor.json"))
+    cursor.value = 0
+    started = time.perf_counter()
+    queued = agent._poll_events(ReplaySource(replay), cursor, pipeline, DedupIndex(events * 2, 3600, None))
+    read_s = time.perf_counter() - started
+    pipeline.close(timeout=600)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    server.close()
+    return {"mode": mode, "deliver_workers": 1 if mode == "serial" else workers, "events": events,
+            "queued": queued, "delivered": len(server.jobs), "reader_blocked_s": round(read_s, 2),
+            "wall_s": round(elapsed, 2), "events_per_s": round(len(server.jobs) / elapsed, 1),
+            "max_depth": max_depth}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=400)
+    ap.add_argument("--request-ms", type=float, default=50.0)
+    ap.add_argument("--workers", type=int, action="append", help="deliver workers (repeatable)")
+    args = ap.parse_args()
+    print(json.dumps(run("serial", args.events, args.request_ms, 1)))
+    for workers in args.workers or [4, 16]:
+        print(json.dumps(run("staged", args.events, args.request_ms, workers)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Drain time of a burst of jobs sent to one listener backed by three printers.
+
+Three exclusive FakePrinters with a fixed read rate sit behind one proxy
+listener. The baseline listener has a single targetIP; the others name all
+three as a pool with each balance strategy, and the last one runs with one
+printer switched off to show health checks taking it out. A burst of jobs of
+mixed sizes is sent at once. The drain time is measured from the first send
+until the last job has been read by a printer:
+
+    python bench/bench_printer_pool.py --jobs 120 --read-mbps 20
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+USERS = ("alice", "bob", "carol", "dave", "erin")
+_SET_LOCK = threading.Lock()  # the credential server handles one request at a time
+MODES = ("single", "least-bytes", "round-robin", "sticky-user", "least-bytes-1-down")
+
+
+def serve(config: dict) -> None:
+    import print_proxy
+    print_proxy.CONFIG.clear()
+    print_proxy.CONFIG.update(config)
+    print_proxy.ThreadedTCPServer.request_queue_size = 1024
+    print_proxy.main()
+
+
+def _wait_port(port: int) -> None:
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+
+
+def _set_overlay(http_port: int, user: str) -> None:
+    body = json.dumps({"deviceName": "bench pool", "accountUsername": user}).encode()
+    req = urllib.request.Request(f"http://127.0.0.1:{http_port}/set", data=body,
+                                 headers={"Content-Type": "application/json"})
+    with _SET_LOCK:
+        urllib.request.urlopen(req, timeout=5).read()
+
+
+def run(mode: str, jobs: int, min_kb: int, max_kb: int, concurrency: int, read_mbps: float, seed: int) -> dict:
+    from fakes import FakePrinter, free_port, send_job
+    printers = [FakePrinter(exclusive=True, read_rate=read_mbps * 1e6) for _ in range(3)]
+    port, http_port = free_port(), free_port()
+    listener = {"deviceName": "bench pool"}
+    if mode == "single":
+        listener.update(targetIP="127.0.0.1", targetPort=printers[0].port)
+    else:
+        listener.update(targets=[f"127.0.0.1:{p.port}" for p in printers],
+                        balance=mode.replace("-1-down", ""))
+    config = {
+        "listeners": {str(port): listener},
+        "localHttpPort": http_port,
+        "agentNotifyPort": 1,
+        "analyzeJobs": False,
+        "retryInitialSeconds": 0.05,
+        "retryMaxSeconds": 0.5,
+        "upstreamConfirmSeconds": 5,
+        "healthCheckSeconds": 0.2,
+        "healthCheckTimeoutSeconds": 0.2,
+    }
+    down = mode.endswith("-1-down")
+    if down:
+        printers[2].close()
+    proc = subprocess.Popen([sys.executable, __file__, "--serve", json.dumps(config)])
+    try:
+        _wait_port(port)
+        time.sleep(1.0)  # readiness probe drained, dead printer failed its checks
+        rng = random.Random(seed)
+        sizes = [rng.randint(min_kb, max_kb) * 1024 for _ in range(jobs)]
+        users = [rng.choice(USERS) for _ in range(jobs)]
+
+        def one(i: int) -> None:
+            if mode == "sticky-user":
+                _set_overlay(http_port, users[i])
+            send_job(port, sizes[i], tag=i, wait_close=True)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, range(jobs)))
+        last, last_change = -1, time.time()
+        while time.time() - last_change < 5:
+            done = sum(1 for p in printers for t in p.finished if t < jobs)
+            if done >= jobs:
+                break
+            if done != last:
+                last, last_change = done, time.time()
+            time.sleep(0.02)
+        ends = [at for p in printers for t, at in p.finished.items() if t < jobs]
+        per_printer = [sum(sizes[t] for t in p.finished if t < jobs) for p in printers]
+        return {
+            "mode": mode,
+            "jobs": jobs,
+            "mb": round(sum(sizes) / 1e6, 1),
+            "delivered": len(ends),
+            "drain_s": round(max(ends) - started, 2) if ends else None,
+            "jobs_per_printer": [sum(1 for t in p.finished if t < jobs) for p in printers],
+            "mb_per_printer": [round(b / 1e6, 1) for b in per_printer],
+        }
+    finally:
+        proc.kill()
+        proc.wait()
+        for i, printer in enumerate(printers):
+            if not (down and i == 2):
+                printer.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jobs", type=int, default=120)
+    ap.add_argument("--min-kb", type=int, default=64)
+    ap.add_argument("--max-kb", type=int, default=2048)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--read-mbps", type=float, default=20.0, help="printer read rate, MB/s")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--mode", choices=MODES, action="append", help="run only these modes")
+    ap.add_argument("--serve", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.serve:
+        serve(json.loads(args.serve))
+        return
+    for mode in args.mode or MODES:
+        print(json.dumps(run(mode, args.jobs, args.min_kb, args.max_kb, args.concurrency,
+                             args.read_mbps, args.seed)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Direct forwarding vs per-printer queues against one-connection-at-a-time printers.
+
+Two exclusive FakePrinters (a second connection is reset while one is being
+served) sit behind four proxy listeners; concurrent tagged jobs are sent to
+all listeners at once. For each mode the number of jobs that actually reached
+a printer is counted, and with queues the per-printer queue wait and forward
+time are read from the proxy's /metrics:
+
+    python bench/bench_printer_queue.py --jobs 200 --concurrency 32
+"""
+
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+_SERIES_RE = re.compile(r'^print_proxy_(queue_wait|printer_forward)_seconds_(sum|count)\{printer="([^"]+)"\} (\S+)$', re.M)
+
+
+def serve(config: dict) -> None:
+    import print_proxy
+    print_proxy.CONFIG.clear()
+    print_proxy.CONFIG.update(config)
+    print_proxy.ThreadedTCPServer.request_queue_size = 1024
+    print_proxy.main()
+
+
+def _wait_port(port: int) -> None:
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+
+
+def run(schedule: bool, jobs: int, job_kb: int, concurrency: int, read_mbps: float) -> dict:
+    from fakes import FakePrinter, free_port, send_job
+    printers = [FakePrinter(exclusive=True, read_rate=read_mbps * 1e6) for _ in range(2)]
+    ports = [free_port() for _ in range(4)]
+    http_port = free_port()
+    config = {
+        "listeners": {str(p): {"deviceName": f"bench {p}", "targetIP": "127.0.0.1",
+                               "targetPort": printers[i % 2].port} for i, p in enumerate(ports)},
+        "localHttpPort": http_port,
+        "agentNotifyPort": 1,
+        "analyzeJobs": False,
+        "scheduleJobs": schedule,
+        "retryInitialSeconds": 0.05,
+        "retryMaxSeconds": 0.5,
+        "upstreamConfirmSeconds": 5,
+    }
+    proc = subprocess.Popen([sys.executable, __file__, "--serve", json.dumps(config)])
+    try:
+        for p in ports:
+            _wait_port(p)
+        time.sleep(0.3)  # let the readiness probes drain through the printers
+        for printer in printers:
+            printer.refused = 0
+        size = job_kb * 1024
+
+        def one(i: int) -> None:
+            send_job(ports[i % len(ports)], size, tag=i, wait_close=True)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, range(jobs)))
+        # stop once every tag arrived or nothing has arrived for a while
+        last, last_change = -1, time.time()
+        while time.time() - last_change < 5:
+            done = sum(1 for p in printers for t in p.finished if t < jobs)
+            if done >= jobs:
+                break
+            if done != last:
+                last, last_change = done, time.time()
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        delivered = len({t for p in printers for t in p.finished if t < jobs})
+        row = {
+            "mode": "queued" if schedule else "direct",
+            "jobs": jobs,
+            "delivered": delivered,
+            "lost": jobs - delivered,
+            "printer_resets": sum(p.refused for p in printers),
+            "wall_s": round(elapsed, 2),
+        }
+        if schedule:
+            text = urllib.request.urlopen(f"http://127.0.0.1:{http_port}/metrics", timeout=5).read().decode()
+            series: dict = {}
+            for name, kind, printer, value in _SERIES_RE.findall(text):
+                series.setdefault((name, printer), {})[kind] = float(value)
+            for (name, printer), v in sorted(series.items()):
+                if v.get("count"):
+                    row[f"{name}_avg_ms[{printer.split(':')[1]}]"] = round(v["sum"] / v["count"] * 1000, 1)
+        return row
+    finally:
+        proc.kill()
+        proc.wait()
+        for printer in printers:
+            printer.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jobs", type=int, default=200)
+    ap.add_argument("--job-kb", type=int, default=256)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--read-mbps", type=float, default=50.0, help="printer read rate, MB/s")
+    ap.add_argument("--serve", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.serve:
+        serve(json.loads(args.serve))
+        return
+    for schedule in (False, True):
+        print(json.dumps(run(schedule, args.jobs, args.job_kb, args.concurrency, args.read_mbps)))
+
+
+if __name__ == "__main__":
+    main()
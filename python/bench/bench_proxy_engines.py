@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Threaded vs asyncio proxy engine under many concurrent connections.
+
+The proxy runs in a child process (so its thread count and VmHWM can be read
+from /proc) with three listeners forwarding to a local fake printer:
+
+    python bench/bench_proxy_engines.py --connections 1000 --job-kb 64
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+
+def serve(engine: str, printer_port: int, ports: list) -> None:
+    import print_proxy
+    print_proxy.CONFIG.clear()
+    print_proxy.CONFIG.update({
+        "engine": engine,
+        "listeners": {str(p): {"deviceName": f"bench {p}", "targetIP": "127.0.0.1", "targetPort": printer_port} for p in ports},
+        "listenBacklog": 1024,
+        "maxConnectionsPerListener": 512,
+        "agentNotifyPort": 1,
+    })
+    print_proxy.ThreadedTCPServer.request_queue_size = 1024
+    print_proxy.start_http_server = lambda: None  # credential HTTP port is not under test
+    print_proxy.main()
+
+
+async def _client(port: int, payload: bytes, latencies: list) -> None:
+    started = time.perf_counter()
+    _, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(payload)
+    await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+    latencies.append(time.perf_counter() - started)
+
+
+def run(engine: str, connections: int, job_bytes: int) -> dict:
+    from fakes import FakePrinter, free_port, proc_status
+    printer = FakePrinter()
+    ports = [free_port() for _ in range(3)]
+    proc = subprocess.Popen([sys.executable, __file__, "--serve", engine, str(printer.port)] + [str(p) for p in ports])
+    try:
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", ports[-1]), timeout=0.2).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+        printer.wait_jobs(1, timeout=5)
+        warm = len(printer.jobs)
+
+        peak_threads = 0
+        stop = threading.Event()
+
+        def sample():
+            nonlocal peak_threads
+            while not stop.is_set():
+                peak_threads = max(peak_threads, proc_status(proc.pid).get("Threads", 0))
+                time.sleep(0.01)
+
+        threading.Thread(target=sample, daemon=True).start()
+        payload = b"\xAA" * job_bytes
+        latencies: list = []
+
+        async def burst():
+            await asyncio.gather(*(_client(ports[i % 3], payload, latencies) for i in range(connections)))
+
+        started = time.perf_counter()
+        asyncio.run(burst())
+        ok = printer.wait_jobs(warm + connections, timeout=120)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        status = proc_status(proc.pid)
+        latencies.sort()
+        return {
+            "engine": engine,
+            "connections": connections,
+            "complete": ok,
+            "wall_s": round(elapsed, 3),
+            "jobs_per_s": round(connections / elapsed, 1),
+            "client_p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+            "client_p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+            "peak_threads": peak_threads,
+            "peak_rss_mb": round(status.get("VmHWM", 0) / 1024, 1),
+        }
+    finally:
+        proc.kill()
+        proc.wait()
+        printer.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--connections", type=int, default=1000)
+    ap.add_argument("--job-kb", type=int, default=64)
+    ap.add_argument("--engine", choices=["threaded", "asyncio"], action="append")
+    ap.add_argument("--serve", nargs="+", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.serve:
+        serve(args.serve[0], int(args.serve[1]), [int(p) for p in args.serve[2:]])
+        return
+    for engine in args.engine or ["threaded", "asyncio"]:
+        print(json.dumps(run(engine, args.connections, args.job_kb * 1024)))
+
+
+if __name__ == "__main__":
+    main()
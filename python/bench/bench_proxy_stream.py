@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Time-to-first-byte and peak RSS for one large RAW job through print_proxy.
+
+Each mode runs in its own interpreter so ru_maxrss is not shared. stream
+and spool forward directly; queued goes through the per-printer queues
+(scheduleJobs), which stream a job for an idle printer straight through:
+
+    python bench/bench_proxy_stream.py --size-mb 500
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_mode(mode: str, size: int) -> dict:
+    import print_proxy
+    from fakes import FakePrinter, send_job
+
+    printer = FakePrinter()
+    print_proxy.CONFIG.clear()
+    print_proxy.CONFIG.update({
+        "listeners": {},
+        "defaultTargetIP": "127.0.0.1",
+        "defaultTargetPort": printer.port,
+        "maxJobBytes": size * 2,
+        "streamJobs": mode != "spool",
+        "scheduleJobs": mode == "queued",
+    })
+    srv = print_proxy.start_raw_listener(0)
+    port = srv.server_address[1]
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = send_job(port, size)
+    printer.wait_jobs(1, timeout=600)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    srv.shutdown()
+    printer.close()
+    return {
+        "mode": mode,
+        "bytes": printer.jobs[0] if printer.jobs else 0,
+        "ttfb_s": round((printer.first_byte_at or 0) - started, 4),
+        "total_s": round((printer.done_at or 0) - started, 3),
+        "peak_rss_mb": round(rss / 1024, 1),
+        "rss_growth_mb": round((rss - base_rss) / 1024, 1),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size-mb", type=int, default=500)
+    ap.add_argument("--mode", choices=["stream", "spool", "queued"])
+    args = ap.parse_args()
+    size = args.size_mb * 1024 * 1024
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, size)))
+        return
+    for mode in ("stream", "spool", "queued"):
+        out = subprocess.check_output([sys.executable, __file__, "--size-mb", str(args.size_mb), "--mode", mode])
+        print(out.decode().strip())
+
+
+if __name__ == "__main__":
+    main()
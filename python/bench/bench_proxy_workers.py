@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""print_proxy throughput with 1..N worker processes sharing the listeners.
+
+The proxy runs as a child process ("workers": N) with four listeners, each
+streaming to its own FakePrinter, and job analysis on (the CPU-bound part).
+Client processes send generated PCL, PostScript and PDF jobs as fast as the
+proxy takes them. Before the burst one overlay per listener is posted to /set on
+the supervisor; the aggregated /metrics afterwards must show every one of
+them applied by whichever worker got the job:
+
+    python bench/bench_proxy_workers.py --workers 1 2 4 --jobs 400
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+_APPLIED_RE = r'^print_proxy_overlays_total\{result="applied"(?:,worker="\d+")?\} (\S+)$'
+
+
+def serve(config: dict) -> None:
+    import print_proxy
+    print_proxy.CONFIG.clear()
+    print_proxy.CONFIG.update(config)
+    print_proxy.main()
+
+
+def _wait_port(port: int) -> None:
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+
+
+def _client(args) -> int:
+    ports, jobs, seed, kb_per_page = args
+    from print_jobs import mix
+    sent = 0
+    for i, (job, _) in enumerate(mix(jobs, seed=seed, kb_per_page=kb_per_page)):
+        with socket.create_connection(("127.0.0.1", ports[i % len(ports)])) as s:
+            s.sendall(job)
+            s.shutdown(socket.SHUT_WR)
+            while s.recv(4096):
+                pass
+        sent += len(job)
+    return sent
+
+
+def run(workers: int, jobs: int, clients: int, kb_per_page: int) -> dict:
+    import re
+    from fakes import FakePrinter, free_port
+    printers = [FakePrinter() for _ in range(4)]
+    ports = [free_port() for _ in printers]
+    http_port = free_port()
+    config = {
+        "listeners": {str(p): {"deviceName": f"bench {p}", "targetIP": "127.0.0.1", "targetPort": printer.port}
+                      for p, printer in zip(ports, printers)},
+        "localHttpPort": http_port,
+        "agentNotifyPort": 1,
+        "workers": workers,
+        "scheduleJobs": False,
+        "listenBacklog": 1024,
+    }
+    proc = subprocess.Popen([sys.executable, __file__, "--serve", json.dumps(config)])
+    try:
+        for p in ports:
+            _wait_port(p)
+        _wait_port(http_port)
+        time.sleep(0.5)
+        for p in ports:
+            body = json.dumps({"deviceName": f"bench {p}", "accountUsername": "bench"}).encode()
+            urllib.request.urlopen(urllib.request.Request(f"http://127.0.0.1:{http_port}/set", data=body),
+                                   timeout=5).read()
+        baseline = sum(len(p.jobs) for p in printers)
+        per_client = max(1, jobs // clients)
+        started = time.perf_counter()
+        with multiprocessing.Pool(clients) as pool:
+            sent = sum(pool.map(_client, [(ports, per_client, seed, kb_per_page) for seed in range(clients)]))
+        total = per_client * clients + baseline
+        deadline = time.time() + 60
+        while sum(len(p.jobs) for p in printers) < total and time.time() < deadline:
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        text = urllib.request.urlopen(f"http://127.0.0.1:{http_port}/metrics", timeout=10).read().decode()
+        applied = sum(float(v) for v in re.findall(_APPLIED_RE, text, re.M))
+        return {
+            "workers": workers,
+            "jobs": per_client * clients,
+            "mb": round(sent / 1e6, 1),
+            "wall_s": round(elapsed, 2),
+            "mb_per_s": round(sent / 1e6 / elapsed, 1),
+            "jobs_per_s": round(per_client * clients / elapsed, 1),
+            "overlays_applied": int(applied),
+            "overlays_posted": len(ports),
+        }
+    finally:
+        proc.terminate()
+        proc.wait()
+        for printer in printers:
+            printer.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, nargs="+", default=None, help="default: 1, 2, 4 ... up to the core count")
+    ap.add_argument("--jobs", type=int, default=400)
+    ap.add_argument("--clients", type=int, default=max(2, os.cpu_count() or 1))
+    ap.add_argument("--kb-per-page", type=int, default=64)
+    ap.add_argument("--serve", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.serve:
+        serve(json.loads(args.serve))
+        return
+    counts = args.workers
+    if not counts:
+        cores = os.cpu_count() or 1
+        counts = sorted({1, cores} | {n for n in (2, 4, 8, 16, 32) if n <= cores})
+    base = None
+    for n in counts:
+        row = run(n, args.jobs, args.clients, args.kb_per_page)
+        base = base or row["mb_per_s"]
+        row["speedup"] = round(row["mb_per_s"] / base, 2)
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
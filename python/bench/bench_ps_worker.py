@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Latency of the persistent shell pool vs one subprocess per command.
+
+PowerShell is not available on Linux, so bash (or a Python interpreter, whose
+startup cost is closer to powershell.exe) stands in as the worker:
+
+    python bench/bench_ps_worker.py --calls 200 --worker python
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ps_worker import BASH_ARGV, ShellPool
+
+# Python stand-in speaking the same line protocol; commands are Python expressions
+PYTHON_LOOP = (
+    "import base64,sys\n"
+    "for line in sys.stdin:\n"
+    "    rid, _, b64 = line.strip().partition(' ')\n"
+    "    try:\n"
+    "        out = str(eval(base64.b64decode(b64).decode()))\n"
+    "    except Exception as e:\n"
+    "        out = ''\n"
+    "    sys.stdout.write(rid + ' ' + base64.b64encode(out.encode()).decode() + '\\n')\n"
+    "    sys.stdout.flush()\n"
+)
+
+WORKERS = {
+    "bash": (BASH_ARGV, "echo 192.168.3.41", lambda cmd: ["bash", "-c", cmd]),
+    "python": ([sys.executable, "-c", PYTHON_LOOP], "'192.168.3.41'",
+               lambda cmd: [sys.executable, "-c", f"print({cmd})"]),
+}
+
+
+def _summary(samples: list) -> dict:
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 3),
+        "p99_ms": round(samples[max(0, int(len(samples) * 0.99) - 1)] * 1000, 3),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=200)
+    ap.add_argument("--worker", choices=sorted(WORKERS), default="bash")
+    ap.add_argument("--pool", type=int, default=2)
+    ap.add_argument("--threads", type=int, default=4)
+    args = ap.parse_args()
+    argv, cmd, per_call = WORKERS[args.worker]
+
+    spawn = []
+    for _ in range(args.calls):
+        t = time.perf_counter()
+        subprocess.check_output(per_call(cmd))
+        spawn.append(time.perf_counter() - t)
+
+    pool = ShellPool(argv, args.pool)
+    pool.run(cmd)  # start the interpreters outside the timed loop
+    pooled = []
+    for _ in range(args.calls):
+        t = time.perf_counter()
+        assert (pool.run(cmd) or "").strip() == "192.168.3.41"
+        pooled.append(time.perf_counter() - t)
+
+    # Concurrent callers sharing the pool
+    lock = threading.Lock()
+    concurrent = []
+
+    def caller(n: int) -> None:
+        for _ in range(n):
+            t = time.perf_counter()
+            pool.run(cmd)
+            with lock:
+                concurrent.append(time.perf_counter() - t)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=caller, args=(args.calls // args.threads,)) for _ in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+    pool.close()
+
+    print(json.dumps({
+        "worker": args.worker,
+        "calls": args.calls,
+        "subprocess_per_call": _summary(spawn),
+        "pool_sequential": _summary(pooled),
+        "pool_concurrent": {**_summary(concurrent), "threads": args.threads, "calls_per_s": round(len(concurrent) / wall, 1)},
+        "restarts": pool.restarts,
+    }))
+
+
+if __name__ == "__main__":
+    main()
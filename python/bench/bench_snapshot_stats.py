@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""snapshot_stats.py on a large synthetic snapshot: wall time, peak memory, incremental runs.
+
+    python bench/bench_snapshot_stats.py --items 10000000 --baseline-items 1000000
+
+Writes a printJobs-all.json of --items jobs in the shape /api/snapshots/rebuild
+produces (compact, newest first; about 290 bytes a job) and runs each step in
+a child process, so that peak_rss_mb is the child's own:
+
+- load: what the dashboard does today, json.load of the whole file and sums
+  per user, device, type and day (in Europe/Athens) in dicts. It holds every item at once, so it
+  runs on a separate file of --baseline-items jobs (0 skips it);
+- full: `snapshot_stats.py --full`, every item streamed and counted;
+- incremental: --append new jobs added at the end of the file the way
+  /api/snapshots/update does, then `snapshot_stats.py` without --full. It
+  must add exactly those jobs and skip the chunks before them undecoded;
+- unchanged: the same again with nothing new, which must add 0.
+
+stats_kb and delta_kb are the sizes of the files a client downloads instead
+of the snapshot.
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import snapshot_stats  # noqa: E402
+
+TYPES = (("A4BW", 0.05), ("A4Color", 0.15), ("A3BW", 0.10), ("A3Color", 0.30), ("RizochartoA3", 0.50),
+         ("ChartoniA4", 0.20), ("Autokollito", 0.40))
+DEVICES = (("192.168.1.101", "Canon Color"), ("192.168.1.102", "Canon B/W"), ("192.168.1.103", "Brother"),
+           ("192.168.1.104", "Κυδωνιών"))
+END_MS = 1756328400000  # the newest job, 2025-08-27T21:00:00Z
+STEP_MS = 7000  # 10M jobs span about two years
+
+
+def _iso(ms: int) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(ms // 1000)) + ".%03dZ" % (ms % 1000)
+
+
+def _job(i: int, ms: int, users: int) -> str:
+    uid = i * 7919 % users
+    # Each user prints mostly on one device and in a few types
+    kind, price = TYPES[(uid + i % 3) % len(TYPES)]
+    ip, device = DEVICES[(uid + (i % 10 == 0)) % len(DEVICES)]
+    quantity = 1 + i % 20
+    # Like JSON.stringify: compact, non-ASCII kept as is
+    return (f'{{"jobId":"print-user-{uid}-{i}","uid":"user-{uid}","username":"{uid}",'
+            f'"userDisplayName":"Χρήστης {uid}","type":"{kind}","quantity":{quantity},"pricePerUnit":{price},'
+            f'"totalCost":{round(quantity * price, 2)},"deviceIP":"{ip}","deviceName":"{device}",'
+            f'"timestamp":"{_iso(ms)}","status":"completed"}}')
+
+
+def write_snapshot(path: str, items: int, users: int) -> int:
+    """A newest-first printJobs snapshot of `items` jobs; returns its size."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f'{{"lastUpdated":{END_MS},"items":[')
+        batch = []
+        for i in range(items):
+            batch.append(_job(i, END_MS - i * STEP_MS, users))
+            if len(batch) == 10000:
+                f.write(("," if i >= 10000 else "") + ",".join(batch))
+                batch = []
+        if batch:
+            f.write(("," if items > len(batch) else "") + ",".join(batch))
+        f.write("]}")
+    return os.path.getsize(path)
+
+
+def append_jobs(path: str, count: int, first: int, users: int) -> None:
+    """Add `count` jobs newer than any in the file at its end, as /api/snapshots/update does."""
+    jobs = ",".join(_job(first + k, END_MS + (k + 1) * STEP_MS, users) for k in range(count))
+    with open(path, "r+b") as f:
+        f.seek(-2, os.SEEK_END)
+        if f.read(2) != b"]}":
+            raise ValueError(f"{path}: does not end with ]}}")
+        f.seek(-2, os.SEEK_END)
+        f.truncate()
+        f.write(("," + jobs + "]}").encode("utf-8"))
+
+
+def load(path: str) -> None:
+    """Child: the whole snapshot through json.load, summed in dicts."""
+    started = time.perf_counter()
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)["items"]
+    calendar = snapshot_stats.Calendar(snapshot_stats.parse_timezone(snapshot_stats.DEFAULT_TIMEZONE))
+    sums = {dim: defaultdict(lambda: [0, 0, 0.0]) for dim in ("user", "device", "type", "day")}
+    for it in items:
+        quantity = int(it.get("quantity") or 0)
+        cost = float(it.get("totalCost") or 0)
+        for dim, key in (("user", it.get("uid")), ("device", it.get("deviceName")), ("type", it.get("type")),
+                         ("day", calendar.day(it.get("timestamp") or ""))):
+            s = sums[dim][key]
+            s[0] += 1
+            s[1] += quantity
+            s[2] += cost
+    print(json.dumps({"items_decoded": len(items), "seconds": round(time.perf_counter() - started, 2),
+                      "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}))
+
+
+def _child(cmd: list) -> dict:
+    started = time.perf_counter()
+    out = subprocess.run(cmd, stdout=subprocess.PIPE, text=True, check=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result["wall_s"] = round(time.perf_counter() - started, 2)
+    return result
+
+
+def _stats(snapshot_dir: str, full: bool, chunk_mb: float) -> dict:
+    cmd = [sys.executable, os.path.join(os.path.dirname(HERE), "snapshot_stats.py"), snapshot_dir,
+           "--collection", "printJobs", "--chunk-mb", str(chunk_mb)]
+    return _child(cmd + (["--full"] if full else []))
+
+
+def _row(step: str, result: dict, snapshot_dir: str = "", **extra) -> dict:
+    row = {"step": step}
+    for key in ("items_decoded", "items_added", "items", "chunks", "chunks_skipped", "cells", "seconds", "wall_s",
+                "peak_rss_mb"):
+        if key in result:
+            row[key] = result[key]
+    if snapshot_dir:
+        for name in ("stats", "delta"):
+            row[f"{name}_kb"] = round(os.path.getsize(os.path.join(snapshot_dir, f"printJobs-all.{name}.json")) / 1024, 1)
+    row.update(extra)
+    return row
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=10_000_000)
+    ap.add_argument("--baseline-items", type=int, default=1_000_000, help="jobs for the json.load row; 0 skips it")
+    ap.add_argument("--append", type=int, default=10_000)
+    ap.add_argument("--users", type=int, default=300)
+    ap.add_argument("--chunk-mb", type=float, default=4.0)
+    ap.add_argument("--load", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.load:
+        load(args.load)
+        return
+
+    tmp = tempfile.mkdtemp(prefix="snapshot-stats-bench-")
+    path = os.path.join(tmp, "printJobs-all.json")
+    try:
+        if args.baseline_items:
+            base_dir = os.path.join(tmp, "baseline")
+            os.mkdir(base_dir)
+            base_path = os.path.join(base_dir, "printJobs-all.json")
+            size = write_snapshot(base_path, args.baseline_items, args.users)
+            print(json.dumps(_row("load", _child([sys.executable, __file__, "--load", base_path]),
+                                  snapshot_mb=round(size / 2 ** 20, 1))))
+            print(json.dumps(_row("full", _stats(base_dir, True, args.chunk_mb), base_dir,
+                                  snapshot_mb=round(size / 2 ** 20, 1))))
+            os.remove(base_path)
+        started = time.perf_counter()
+        size = write_snapshot(path, args.items, args.users)
+        print(json.dumps({"items": args.items, "snapshot_mb": round(size / 2 ** 20, 1),
+                          "write_s": round(time.perf_counter() - started, 1)}))
+        print(json.dumps(_row("full", _stats(tmp, True, args.chunk_mb), tmp)))
+        append_jobs(path, args.append, args.items, args.users)
+        result = _stats(tmp, False, args.chunk_mb)
+        print(json.dumps(_row("incremental", result, tmp, appended=args.append,
+                              exact=result["items_added"] == args.append)))
+        result = _stats(tmp, False, args.chunk_mb)
+        print(json.dumps(_row("unchanged", result, tmp, exact=result["items_added"] == 0)))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Proxy CPU seconds per GB and peak RSS, per forwarding path.
+
+The threaded proxy runs in a child process with a "pjl" profile; jobs are
+sent from this process to a local fake printer through it, and the child's
+utime+stime (/proc/<pid>/stat) and VmHWM are read afterwards. `--src` points
+the child at another checkout (e.g. a `git worktree` of an older commit) to
+get before/after numbers from the same script:
+
+    python bench/bench_zero_copy.py --gb 2
+    python bench/bench_zero_copy.py --gb 2 --src /tmp/before/python
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+MB = 1024 * 1024
+
+# name -> (proxy config overrides, job size in MB)
+MODES = {
+    "stream": ({"streamJobs": True}, 64),
+    "spool_memory": ({"streamJobs": False, "spoolThresholdBytes": 256 * MB}, 32),
+    "spool_disk": ({"streamJobs": False, "spoolThresholdBytes": 1 * MB}, 256),
+    # pjl registered without a framer: the whole-job injector path
+    "inject_memory": ({"injector": "pjl_job", "spoolThresholdBytes": 256 * MB}, 32),
+    "inject_disk": ({"injector": "pjl_job", "spoolThresholdBytes": 1 * MB}, 256),
+}
+
+
+def serve(src: str, printer_port: int, port: int, overrides: dict) -> None:
+    sys.path.insert(0, src)
+    import print_proxy
+    print_proxy.CONFIG.clear()
+    print_proxy.CONFIG.update({
+        "listeners": {str(port): {"deviceName": "bench", "targetIP": "127.0.0.1", "targetPort": printer_port}},
+        "printerProfiles": {"default": {}},
+        "maxJobBytes": 1024 * MB,
+        "scheduleJobs": False,
+        "agentNotifyPort": 1,
+    })
+    injector = overrides.pop("injector", "pjl")
+    print_proxy.INJECTORS["pjl_job"] = print_proxy.INJECTORS["pjl"]
+    print_proxy.CONFIG["printerProfiles"]["default"]["injector"] = injector
+    print_proxy.CONFIG.update(overrides)
+    print_proxy.start_http_server = lambda: None
+    print_proxy.main()
+
+
+def cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def run(mode: str, gb: float, src: str) -> dict:
+    from fakes import FakePrinter, free_port, proc_status
+    overrides, job_mb = MODES[mode]
+    printer = FakePrinter(recv_size=1024 * 1024)
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, __file__, "--serve", src, str(printer.port), str(port), json.dumps(overrides)])
+    try:
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+        printer.wait_jobs(1, timeout=5)
+        warm = len(printer.jobs)
+
+        jobs = max(1, int(gb * 1024 / job_mb))
+        chunk = b"\xAA" * MB
+        cpu_before = cpu_seconds(proc.pid)
+        started = time.perf_counter()
+        for _ in range(jobs):
+            with socket.create_connection(("127.0.0.1", port)) as s:
+                for _ in range(job_mb):
+                    s.sendall(chunk)
+        ok = printer.wait_jobs(warm + jobs, timeout=600)
+        elapsed = time.perf_counter() - started
+        cpu = cpu_seconds(proc.pid) - cpu_before
+        forwarded_gb = jobs * job_mb / 1024
+        return {
+            "mode": mode,
+            "job_mb": job_mb,
+            "jobs": jobs,
+            "complete": ok,
+            "cpu_s_per_gb": round(cpu / forwarded_gb, 3),
+            "mb_per_s": round(jobs * job_mb / elapsed, 1),
+            "peak_rss_mb": round(proc_status(proc.pid).get("VmHWM", 0) / 1024, 1),
+        }
+    finally:
+        proc.kill()
+        proc.wait()
+        printer.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--gb", type=float, default=2.0, help="data forwarded per mode")
+    ap.add_argument("--mode", choices=sorted(MODES), action="append")
+    ap.add_argument("--src", default=os.path.dirname(HERE), help="directory holding print_proxy.py")
+    ap.add_argument("--serve", nargs=4, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.serve:
+        src, printer_port, port, overrides = args.serve
+        serve(src, int(printer_port), int(port), json.loads(overrides))
+        return
+    for mode in args.mode or list(MODES):
+        print(json.dumps(run(mode, args.gb, os.path.abspath(args.src))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Synthetic PrintService 307 event corpora, rendered like `wevtutil qe /f:RenderedXml`.
+
+    python bench/corpus.py events.xml --events 100000 --style eventdata
+
+"userdata" puts the job fields in <UserData> children (<param3>...), "eventdata"
+in <Data Name="param3"> elements. Either way param2 is the printer, param3 the
+DOMAIN\\user and param7 the page count, which is what the agent reads. The
+output doubles as an agent replay file (eventReplayFile / AGENT_REPLAY_FILE).
+"""
+
+import argparse
+import random
+from typing import Iterator, List, Optional
+
+SYSTEM = ("<System><Provider Name='Microsoft-Windows-PrintService' Guid='{{747EF6FD-E535-4D16-B510-42C90F6873A1}}'/>"
+          "<EventID>307</EventID><Version>0</Version><Level>4</Level><Task>26</Task><Opcode>11</Opcode>"
+          "<Keywords>0x4000000000000040</Keywords><TimeCreated SystemTime='2024-05-01T{1}.000000000Z'/>"
+          "<EventRecordID>{0}</EventRecordID><Correlation/><Execution ProcessID='3420' ThreadID='{0}'/>"
+          "<Channel>Microsoft-Windows-PrintService/Operational</Channel><Computer>PRINTSRV01.corp.local</Computer>"
+          "<Security UserID='S-1-5-21-1004336348-1177238915-682003330-{2}'/></System>")
+USERDATA = ("<Event xmlns='http://schemas.microsoft.com/win/2004/08/events/event'>" + SYSTEM +
+            "<UserData><DocumentPrinted xmlns='http://manifests.microsoft.com/win/2005/08/windows/printing/spooler/core/events'>"
+            "<param1>{0}</param1><param2>{3}</param2><param3>CORP\\{4}</param3><param4>\\\\WS{2}</param4>"
+            "<param5>IP_{5}</param5><param6>{6}</param6><param7>{7}</param7><param8>1</param8>"
+            "</DocumentPrinted></UserData></Event>\r\n")
+EVENTDATA = ("<Event xmlns='http://schemas.microsoft.com/win/2004/08/events/event'>" + SYSTEM +
+             "<EventData><Data Name='param1'>{0}</Data><Data Name='param2'>{3}</Data>"
+             "<Data Name='param3'>CORP\\{4}</Data><Data Name='param4'>\\\\WS{2}</Data>"
+             "<Data Name='param5'>IP_{5}</Data><Data Name='param6'>{6}</Data>"
+             "<Data Name='param7'>{7}</Data><Data Name='param8'>1</Data></EventData></Event>\r\n")
+STYLES = {"userdata": USERDATA, "eventdata": EVENTDATA}
+
+
+def printer_names(count: int) -> List[str]:
+    return [f"Printer {i}" for i in range(count)]
+
+
+def printer_ip(index: int) -> str:
+    return f"10.0.{index // 250}.{index % 250 + 1}"
+
+
+def render(record_id: int, user: str, printer_index: int, pages: int, style: str = "userdata") -> str:
+    secs = record_id % 86400
+    clock = f"{secs // 3600:02d}:{secs // 60 % 60:02d}:{secs % 60:02d}"
+    return STYLES[style].format(record_id, clock, record_id % 997, f"Printer {printer_index}", user,
+                                printer_ip(printer_index), 4096 + record_id % 5000, pages)
+
+
+def generate(events: int, start: int = 1, users: int = 200, printers: int = 20,
+             style: str = "userdata", seed: Optional[int] = 0) -> Iterator[str]:
+    """Yield `events` rendered events with consecutive EventRecordIDs from `start`."""
+    rnd = random.Random(seed)
+    for rid in range(start, start + events):
+        yield render(rid, f"user{rnd.randrange(users)}", rnd.randrange(printers), 1 + rnd.randrange(30), style)
+
+
+def corpus(events: int, **kwargs) -> str:
+    return "".join(generate(events, **kwargs))
+
+
+def write(path: str, events: int, **kwargs) -> int:
+    """Write a corpus file; returns its size in bytes."""
+    size = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for xml in generate(events, **kwargs):
+            size += f.write(xml)
+    return size
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("path")
+    ap.add_argument("--events", type=int, default=100_000)
+    ap.add_argument("--start", type=int, default=1)
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--printers", type=int, default=20)
+    ap.add_argument("--style", choices=sorted(STYLES), default="userdata")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    size = write(args.path, args.events, start=args.start, users=args.users,
+                 printers=args.printers, style=args.style, seed=args.seed)
+    print(f"wrote {args.events} events ({size / 1e6:.1f} MB) to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
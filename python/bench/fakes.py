@@ -0,0 +1,291 @@
+"""Local stand-ins used by the benchmark scripts (Linux friendly, stdlib only)."""
+
+import os
+import re
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from printer_resolver import PrinterResolver
+
+_TAG_RE = re.compile(rb"bench-job=(\d+)")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def proc_status(pid: int) -> Dict[str, int]:
+    """Threads and VmHWM (peak RSS, kB) of a process, from /proc."""
+    out = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                k, _, v = line.partition(":")
+                if k in ("Threads", "VmHWM"):
+                    out[k] = int(v.split()[0])
+    except OSError:
+        pass
+    return out
+
+
+class FakePrinter:
+    """RAW 9100 sink that discards what it receives and records timings.
+
+    `first_byte_at` and `done_at` are time.perf_counter() values for the most
+    recent job; `jobs` holds the byte count of every finished connection and
+    `finished` the done time of every job sent with a `send_job(tag=...)`.
+    `read_rate` (bytes/s per connection) throttles reads to model a printer
+    that consumes data slower than the network delivers it. An `exclusive`
+    printer serves one connection at a time and resets any other that
+    arrives meanwhile (counted in `refused`), like a busy JetDirect port.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, read_rate: Optional[float] = None,
+                 recv_size: int = 256 * 1024, exclusive: bool = False):
+        printer = self
+        if read_rate:
+            recv_size = max(1024, min(recv_size, int(read_rate / 100)))  # ~10 ms of data per read
+
+        class _Handler(socketserver.BaseRequestHandler):
+            def handle(self):  # type: ignore
+                if exclusive:
+                    with printer._lock:
+                        busy = printer._active > 0
+                        printer._active += 0 if busy else 1
+                    if busy:
+                        printer.refused += 1
+                        self.request.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+                        return
+                try:
+                    self._receive()
+                finally:
+                    if exclusive:
+                        with printer._lock:
+                            printer._active -= 1
+
+            def _receive(self) -> None:
+                total = 0
+                head = b""
+                started = time.perf_counter()
+                while True:
+                    data = self.request.recv(recv_size)
+                    if not data:
+                        break
+                    if total == 0:
+                        printer.first_byte_at = started = time.perf_counter()
+                    if len(head) < 1024:
+                        head += data[:1024]
+                    total += len(data)
+                    if read_rate:
+                        ahead = total / read_rate - (time.perf_counter() - started)
+                        if ahead > 0:
+                            time.sleep(ahead)
+                tag = _TAG_RE.search(head)
+                with printer._lock:
+                    printer.jobs.append(total)
+                    printer.done_at = time.perf_counter()
+                    if tag:
+                        printer.finished[int(tag.group(1))] = printer.done_at
+                    printer._done.set()
+
+        class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+            request_queue_size = 1024
+
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._active = 0
+        self.refused = 0
+        self.jobs: List[int] = []
+        self.finished: Dict[int, float] = {}
+        self.first_byte_at: Optional[float] = None
+        self.done_at: Optional[float] = None
+        self.server = _Server((host, port), _Handler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def wait_jobs(self, count: int, timeout: float = 60.0) -> bool:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._lock:
+                if len(self.jobs) >= count:
+                    return True
+                self._done.clear()
+            self._done.wait(0.05)
+        return False
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def send_job(port: int, total_bytes: int, chunk: int = 64 * 1024, host: str = "127.0.0.1",
+             wait_close: bool = False, tag: Optional[int] = None) -> float:
+    """Send `total_bytes` of filler to a RAW port; returns perf_counter() at first send.
+
+    With `wait_close` the call also waits for the proxy to close the
+    connection, i.e. until it has finished forwarding the job upstream. A
+    `tag` is written into the job header so FakePrinter.finished can match it.
+    """
+    block = b"\x1B*b" + b"\xAA" * (chunk - 3)
+    if tag is not None:
+        label = b"@PJL COMMENT bench-job=%d\r\n" % tag
+        block = label + block[len(label):]
+    view = memoryview(block)
+    with socket.create_connection((host, port)) as s:
+        started = time.perf_counter()
+        left = total_bytes
+        while left > 0:
+            n = min(left, chunk)
+            s.sendall(view[:n])
+            left -= n
+        if wait_close:
+            s.shutdown(socket.SHUT_WR)
+            while s.recv(4096):
+                pass
+    return started
+
+
+class FakeResolver(PrinterResolver):
+    """PrinterResolver over a fixed name -> IP table, with PowerShell-like latency.
+
+    `enumerate_delay` / `lookup_delay` model the cost of Get-Printer and a
+    single-printer query; the counters show how often the cache fell through.
+    """
+
+    def __init__(self, table: Dict[str, Optional[str]], enumerate_delay: float = 0.0,
+                 lookup_delay: float = 0.0):
+        self.table = dict(table)
+        self.enumerate_delay = enumerate_delay
+        self.lookup_delay = lookup_delay
+        self.enumerations = 0
+        self.lookups = 0
+
+    def enumerate(self) -> Dict[str, Optional[str]]:
+        self.enumerations += 1
+        time.sleep(self.enumerate_delay)
+        return dict(self.table)
+
+    def lookup(self, printer_name: str) -> Optional[str]:
+        self.lookups += 1
+        time.sleep(self.lookup_delay)
+        return self.table.get(printer_name)
+
+
+class FakeIngestServer:
+    """Stand-in for /api/print-jobs/ingest that verifies the agent's HMAC.
+
+    Accepts a single job or an array. `request_delay` models the per-request
+    backend work (user query, price table, transaction) and `job_delay` the
+    per-job share of it. With `certfile` (cert + key PEM) it serves HTTPS.
+
+    Run standalone (e.g. to kill and restart it) with:
+        python bench/fakes.py ingest --port 8123 --secret s --log ids.txt
+    """
+
+    def __init__(self, secret: str, request_delay: float = 0.0, job_delay: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0, certfile: Optional[str] = None,
+                 log_path: Optional[str] = None):
+        import hashlib
+        import hmac
+        import json
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        ingest = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # headers and body are separate writes
+
+            def setup(self):  # one call per accepted connection
+                with ingest._lock:
+                    ingest.connections += 1
+                super().setup()
+
+            def do_POST(self):  # type: ignore
+                raw = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+                ts = self.headers.get("x-timestamp", "")
+                expected = hmac.new(secret.encode(), f"{ts}.".encode() + raw, hashlib.sha256).hexdigest()
+                if not hmac.compare_digest(expected, self.headers.get("x-signature", "")):
+                    return self._reply(401, {"error": "Unauthorized"})
+                data = json.loads(raw)
+                jobs = data if isinstance(data, list) else [data]
+                time.sleep(ingest.request_delay + ingest.job_delay * len(jobs))
+                now = time.perf_counter()
+                with ingest._lock:
+                    ingest.requests += 1
+                    ingest.jobs.extend(jobs)
+                    for j in jobs:
+                        ingest.arrivals.setdefault(str(j.get("eventId", "")), now)
+                    if ingest.log is not None:
+                        ingest.log.write("".join(f"{j.get('eventId', '')}\n" for j in jobs))
+                        ingest.log.flush()
+                if isinstance(data, list):
+                    return self._reply(200, {"ok": True, "results": [{"ok": True} for _ in jobs]})
+                return self._reply(200, {"ok": True})
+
+            def _reply(self, status: int, body: dict) -> None:
+                out = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def log_message(self, format, *args):  # silence default logging
+                return
+
+        class _Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 1024  # many workers connecting at once
+
+        self._lock = threading.Lock()
+        self.request_delay = request_delay
+        self.job_delay = job_delay
+        self.requests = 0
+        self.connections = 0
+        self.jobs: List[dict] = []
+        self.arrivals: Dict[str, float] = {}  # eventId -> perf_counter() of first acceptance
+        # Accepted eventIds, one per line, so a killed server's intake survives it
+        self.log = open(log_path, "a", encoding="utf-8") if log_path else None
+        self.server = _Server((host, port), _Handler)
+        scheme = "http"
+        if certfile:
+            import ssl
+            ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            ctx.load_cert_chain(certfile)
+            self.server.socket = ctx.wrap_socket(self.server.socket, server_side=True)
+            scheme = "https"
+        self.url = f"{scheme}://{host}:{self.server.server_address[1]}/api/print-jobs/ingest"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ing = sub.add_parser("ingest")
+    ing.add_argument("--port", type=int, required=True)
+    ing.add_argument("--secret", required=True)
+    ing.add_argument("--log")
+    ing.add_argument("--request-ms", type=float, default=0.0)
+    args = ap.parse_args()
+    if args.cmd == "ingest":
+        FakeIngestServer(args.secret, request_delay=args.request_ms / 1000.0, port=args.port, log_path=args.log)
+        while True:
+            time.sleep(3600)
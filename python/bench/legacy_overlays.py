@@ -0,0 +1,74 @@
+"""
+OverlayStore: the pending-overlay store agent.py and print_proxy.py shared
+before correlation_index, kept as the baseline that bench_overlay_store and
+bench_correlation measure against.
+
+One overlay per ip:/name: key with a per-entry TTL; put() replaces, pop()
+consumes. Expiry is driven by a min-heap of deadlines, so a lookup only
+touches entries that actually expired.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class PendingOverlay:
+    __slots__ = ("key", "data", "created_at", "expires_at", "seq")
+
+    def __init__(self, key: str, data: Dict[str, Any], created_at: float, expires_at: float, seq: int):
+        self.key = key
+        self.data = data
+        self.created_at = created_at
+        self.expires_at = expires_at
+        self.seq = seq
+
+
+class OverlayStore:
+    """Key -> overlay dict with per-entry TTL; put() replaces, pop() consumes."""
+
+    def __init__(self, ttl: float = 300, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: Dict[str, PendingOverlay] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _prune(self, now: float) -> None:
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, seq, key = heapq.heappop(heap)
+            entry = self._entries.get(key)
+            # Replaced or consumed entries leave stale heap items behind; skip them
+            if entry is not None and entry.seq == seq:
+                del self._entries[key]
+        # Keep stale items from piling up when keys are overwritten often
+        if len(heap) > 2 * len(self._entries) + 1024:
+            self._heap = [(e.expires_at, e.seq, e.key) for e in self._entries.values()]
+            heapq.heapify(self._heap)
+
+    def put(self, key: str, data: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        now = self.clock()
+        with self._lock:
+            self._prune(now)
+            entry = PendingOverlay(key, data, now, now + (self.ttl if ttl is None else ttl), next(self._seq))
+            self._entries[key] = entry
+            heapq.heappush(self._heap, (entry.expires_at, entry.seq, key))
+
+    def pop(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._prune(self.clock())
+            entry = self._entries.pop(key, None)
+        return entry.data if entry is not None else None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._prune(self.clock())
+            entry = self._entries.get(key)
+        return entry.data if entry is not None else None
@@ -0,0 +1,123 @@
+"""Synthetic RAW print jobs (PCL 5, PostScript, PDF) with a known page count.
+
+Each generator returns the job bytes; `pjl_wrap` adds the UEL/PJL envelope a
+Windows driver would. Raster and image payloads are random bytes, so form
+feeds and ESC bytes do occur inside binary data, as they do in real jobs.
+"""
+
+import os
+import random
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+UEL = b"\x1b%-12345X"
+
+# width x height in points, portrait
+POINTS = {"A4": (595, 842), "A3": (842, 1191), "Letter": (612, 792)}
+PCL_PAPER = {"A4": 26, "A3": 27, "Letter": 2}
+
+
+def pjl_wrap(body: bytes, language: str, copies: int = 1, duplex: bool = False,
+             rendermode: Optional[str] = None, paper: Optional[str] = None) -> bytes:
+    lines = [UEL + b"@PJL JOB NAME=\"bench\"\r\n"]
+    if copies > 1:
+        lines.append(b"@PJL SET COPIES=%d\r\n" % copies)
+    if duplex:
+        lines.append(b"@PJL SET DUPLEX=ON\r\n")
+    if rendermode:
+        lines.append(b"@PJL SET RENDERMODE=%s\r\n" % rendermode.encode())
+    if paper:
+        lines.append(b"@PJL SET PAPER=%s\r\n" % paper.upper().encode())
+    lines.append(b"@PJL ENTER LANGUAGE=%s\r\n" % language.encode())
+    return b"".join(lines) + body + UEL + b"@PJL EOJ\r\n" + UEL
+
+
+def pcl_job(pages: int, color: bool = False, duplex: bool = False, paper: str = "A4",
+            raster_kb: int = 64, rng: Optional[random.Random] = None) -> bytes:
+    rng = rng or random.Random(pages)
+    out = [b"\x1bE", b"\x1b&l%dA" % PCL_PAPER[paper], b"\x1b&l%dS" % (1 if duplex else 0)]
+    out.append(b"\x1b*r-3U" if color else b"\x1b*r1U")
+    if color:
+        out.append(b"\x1b*v6W" + bytes([0, 3, 8, 8, 8, 8]))
+    row = 512
+    for _ in range(pages):
+        out.append(b"\x1b*p0x0Y\x1b*t300R\x1b*r1A")
+        for _ in range(raster_kb * 1024 // row):
+            out.append(b"\x1b*b0m%dW" % row + rng.randbytes(row))
+        out.append(b"\x1b*rB\x0c")
+    out.append(b"\x1bE")
+    return b"".join(out)
+
+
+def ps_job(pages: int, color: bool = False, duplex: bool = False, paper: str = "A4",
+           image_kb: int = 64, rng: Optional[random.Random] = None) -> bytes:
+    rng = rng or random.Random(pages)
+    w, h = POINTS[paper]
+    out = [b"%!PS-Adobe-3.0\n%%Creator: bench\n%%Pages: " + str(pages).encode() + b"\n",
+           b"%%DocumentMedia: " + paper.encode() + b" %d %d 0 () ()\n" % (w, h),
+           b"%%EndComments\n%%BeginProlog\n/bd {bind def} bind def\n/sp {showpage} bd\n%%EndProlog\n",
+           b"%%BeginSetup\n<< /PageSize [%d %d] /Duplex %s >> setpagedevice\n%%%%EndSetup\n"
+           % (w, h, b"true" if duplex else b"false")]
+    for p in range(1, pages + 1):
+        out.append(b"%%%%Page: %d %d\n" % (p, p))
+        out.append(b"0.1 0.1 0.1 setrgbcolor\n" if not color else b"0.9 0.1 0.2 setrgbcolor\n")
+        for line in range(40):
+            out.append(b"72 %d moveto (Line %d of page %d lorem ipsum dolor sit amet) show\n" % (780 - line * 18, line, p))
+        data = rng.randbytes(image_kb * 1024).hex().encode()
+        out.append(b"gsave 100 100 scale 256 256 8 [256 0 0 256 0 0] {<")
+        out.append(data)
+        out.append(b">} image grestore\nsp\n")
+    out.append(b"%%Trailer\n%%EOF\n")
+    return b"".join(out)
+
+
+def pdf_job(pages: int, color: bool = False, paper: str = "A4", image_kb: int = 64,
+            rng: Optional[random.Random] = None) -> bytes:
+    rng = rng or random.Random(pages)
+    w, h = POINTS[paper]
+    space = b"/DeviceRGB" if color else b"/DeviceGray"
+    objs: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % (3 + 2 * i) for i in range(pages)) + b"] /Count %d >>" % pages,
+    ]
+    for i in range(pages):
+        objs.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R"
+                    b" /Resources << /ColorSpace << /CS0 %s >> >> >>" % (w, h, 4 + 2 * i, space))
+        stream = zlib.compress(rng.randbytes(image_kb * 1024), 1)
+        objs.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    out = [b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n"]
+    for n, body in enumerate(objs, 1):
+        out.append(b"%d 0 obj\n" % n + body + b"\nendobj\n")
+    out.append(b"trailer\n<< /Root 1 0 R /Size %d >>\n%%%%EOF\n" % (len(objs) + 1))
+    return b"".join(out)
+
+
+def mix(count: int, seed: int = 1, kb_per_page: int = 64) -> Iterator[Tuple[bytes, dict]]:
+    """(job bytes, expected analysis) for a varied stream of jobs."""
+    rng = random.Random(seed)
+    for i in range(count):
+        language = ("pcl", "postscript", "pdf")[i % 3]
+        pages = rng.randint(1, 12)
+        copies = rng.choice((1, 1, 1, 2, 3))
+        color = rng.random() < 0.4
+        duplex = rng.random() < 0.3 and language != "pdf"
+        paper = rng.choice(("A4", "A4", "A4", "A3"))
+        if language == "pcl":
+            body = pcl_job(pages, color, duplex, paper, kb_per_page, rng)
+            job = pjl_wrap(body, "PCL", copies)
+        elif language == "postscript":
+            body = ps_job(pages, color, duplex, paper, kb_per_page // 2, rng)
+            job = pjl_wrap(body, "POSTSCRIPT", copies)
+        else:
+            body = pdf_job(pages, color, paper, kb_per_page, rng)
+            job = pjl_wrap(body, "PDF", copies)
+        size = "A3" if paper == "A3" else "A4"
+        yield job, {"language": language, "pages": pages, "copies": copies, "duplex": duplex,
+                    "color": color, "paper": paper, "type": f"{size}{'Color' if color else 'BW'}"}
+
+
+def write(directory: str, count: int, seed: int = 1) -> None:
+    os.makedirs(directory, exist_ok=True)
+    for i, (job, _) in enumerate(mix(count, seed)):
+        with open(os.path.join(directory, f"job{i:04d}.prn"), "wb") as f:
+            f.write(job)
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""Load-test scenarios for the agent and the print proxy, with JSON results.
+
+    python bench/scenarios.py --out results.json
+    python bench/scenarios.py proxy_threaded proxy_slow_printer --quick
+    python bench/scenarios.py --out new.json --compare old.json --fail-over 10
+
+Every scenario runs in its own interpreter, so peak RSS is per scenario. The
+agent scenarios replay a synthetic corpus (bench/corpus.py) through the real
+parse / resolve / deliver path into a FakeIngestServer, with a FakeResolver
+in place of PowerShell. The proxy scenarios run print_proxy in a separate
+process between concurrent RAW clients and a (optionally throttled)
+FakePrinter.
+
+--compare prints each metric next to the baseline's. Metrics ending in
+"_per_s" are better when higher; "_ms", "_mb" and "_s" are better when lower.
+--fail-over exits non-zero when any of them regresses by more than that many
+percent.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+SECRET = "bench-secret"
+
+
+def _percentiles(samples: List[float], prefix: str) -> Dict[str, float]:
+    if not samples:
+        return {}
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))]  # noqa: E731
+    return {f"{prefix}_p50_ms": round(pick(0.50) * 1000, 2),
+            f"{prefix}_p95_ms": round(pick(0.95) * 1000, 2),
+            f"{prefix}_p99_ms": round(pick(0.99) * 1000, 2),
+            f"{prefix}_max_ms": round(samples[-1] * 1000, 2)}
+
+
+def _peak_rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _agent_env() -> None:
+    os.environ["PRINT_INGEST_HMAC_SECRET"] = SECRET
+    os.environ["PS_WORKERS"] = "0"
+    os.environ["LOCAL_NOTIFY_PORT"] = "0"
+
+
+# -- agent -----------------------------------------------------------------
+
+def agent_parse(events: int = 100_000, style: str = "userdata") -> Dict[str, Any]:
+    """CPU only: tokenise a wevtutil blob and pick the job fields."""
+    _agent_env()
+    import agent
+    from corpus import corpus
+    from event_xml import parse_events
+
+    text = corpus(events, style=style)
+    started = time.perf_counter()
+    parsed = sum(agent._parse_event_xml(rec) is not None for rec in parse_events(text))
+    elapsed = time.perf_counter() - started
+    return {"parsed": parsed, "events_per_s": round(events / elapsed), "mb_per_s": round(len(text) / elapsed / 1e6, 1),
+            "peak_rss_mb": _peak_rss_mb()}
+
+
+def agent_ingest(events: int = 20_000, deliver: str = "batch", printers: int = 20,
+                 request_ms: float = 2.0, resolve_ms: float = 300.0, deliver_workers: int = 0) -> Dict[str, Any]:
+    """Replay file -> cursor/dedup -> consumer -> deliver -> fake ingest API."""
+    _agent_env()
+    import agent
+    from corpus import printer_ip, printer_names, write
+    from dedup_index import DedupIndex
+    from event_source import EventCursor, ReplaySource
+    from fakes import FakeIngestServer, FakeResolver
+    from ingest_batcher import IngestBatcher
+    from outbox import Outbox
+    from printer_resolver import ResolverCache
+
+    tmp = tempfile.mkdtemp(prefix="agent-bench-")
+    replay = os.path.join(tmp, "events.xml")
+    write(replay, events, printers=printers)
+    server = FakeIngestServer(SECRET, request_delay=request_ms / 1000.0)
+    agent.INGEST_URL = server.url
+    resolver = FakeResolver({name: printer_ip(i) for i, name in enumerate(printer_names(printers))},
+                            enumerate_delay=resolve_ms / 1000.0, lookup_delay=resolve_ms / 1000.0)
+    agent.RESOLVER = ResolverCache(resolver)
+    agent.RESOLVER.refresh()
+
+    sink: Callable[[Dict[str, Any]], Any] = agent._post
+    closer: Callable[[], None] = lambda: None  # noqa: E731
+    if deliver == "batch":
+        batcher = IngestBatcher(agent._post_batch, agent.INGEST_BATCH_SIZE, agent.INGEST_BATCH_DELAY_MS / 1000.0)
+        sink, closer = batcher.add, batcher.close
+    elif deliver == "outbox":
+        box = Outbox(os.path.join(tmp, "outbox.db"), agent._post_batch, batch_size=agent.INGEST_BATCH_SIZE)
+        sink, closer = box.put, box.close
+    handed_at: Dict[str, float] = {}
+
+    def timed(payload: Dict[str, Any]) -> None:
+        handed_at[payload["eventId"]] = time.perf_counter()
+        sink(payload)
+
+    if deliver_workers:
+        agent.DELIVER_WORKERS = deliver_workers
+        agent.HTTP = agent.HttpPool(max_connections=deliver_workers, timeout=5)
+    agent._serve_notify()
+    pipeline = agent._start_pipeline(timed)
+    cursor = EventCursor(os.path.join(tmp, "cursor.json"))
+    cursor.value = 0
+    dedup = DedupIndex(agent.DEDUP_CAPACITY, agent.DEDUP_WINDOW, None)
+
+    started = time.perf_counter()
+    agent._poll_events(ReplaySource(replay), cursor, pipeline, dedup)
+    deadline = time.time() + 300
+    while len(server.jobs) < events and time.time() < deadline:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    closer()
+    server.close()
+    latencies = [server.arrivals[k] - t for k, t in handed_at.items() if k in server.arrivals]
+    return {"delivered": len(server.jobs), "requests": server.requests, "connections": server.connections,
+            "resolver_calls": resolver.enumerations + resolver.lookups,
+            "events_per_s": round(events / elapsed, 1), "wall_s": round(elapsed, 3),
+            **_percentiles(latencies, "deliver"), "peak_rss_mb": _peak_rss_mb()}
+
+
+# -- proxy -----------------------------------------------------------------
+
+def proxy(engine: str = "threaded", jobs: int = 200, job_kb: int = 1024, concurrency: int = 16,
+          read_rate_mbps: float = 0.0) -> Dict[str, Any]:
+    """Concurrent RAW jobs through a print_proxy child process to a FakePrinter."""
+    import socket
+
+    from fakes import FakePrinter, free_port, proc_status, send_job
+
+    printer = FakePrinter(read_rate=read_rate_mbps * 1e6 if read_rate_mbps else None)
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, "bench_proxy_engines.py"),
+                             "--serve", engine, str(printer.port), str(port)])
+    try:
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+        time.sleep(0.2)
+        warm = len(printer.jobs)
+        size = job_kb * 1024
+        peak_threads = 0
+        stop = threading.Event()
+
+        def sample() -> None:
+            nonlocal peak_threads
+            while not stop.is_set():
+                peak_threads = max(peak_threads, proc_status(proc.pid).get("Threads", 0))
+                time.sleep(0.01)
+
+        sent_at: Dict[int, float] = {}
+
+        def one(i: int) -> None:
+            sent_at[i] = send_job(port, size, wait_close=True, tag=i)
+
+        threading.Thread(target=sample, daemon=True).start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, range(jobs)))
+        complete = printer.wait_jobs(warm + jobs, timeout=300)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        # Client's first byte -> printer has read the whole job
+        latencies = [printer.finished[i] - t for i, t in sent_at.items() if i in printer.finished]
+        delivered = sum(printer.jobs[warm:])
+        status = proc_status(proc.pid)
+        return {"complete": complete, "mb_per_s": round(delivered / elapsed / 1e6, 1),
+                "jobs_per_s": round(jobs / elapsed, 1), "wall_s": round(elapsed, 3),
+                **_percentiles(latencies, "job"), "peak_threads": peak_threads,
+                "peak_rss_mb": round(status.get("VmHWM", 0) / 1024, 1)}
+    finally:
+        proc.kill()
+        proc.wait()
+        printer.close()
+
+
+# name -> (function, params, params for --quick)
+SCENARIOS: Dict[str, Any] = {
+    "agent_parse": (agent_parse, {"events": 100_000}, {"events": 10_000}),
+    "agent_parse_eventdata": (agent_parse, {"events": 100_000, "style": "eventdata"}, {"events": 10_000, "style": "eventdata"}),
+    "agent_ingest_batch": (agent_ingest, {"events": 20_000}, {"events": 2_000}),
+    "agent_ingest_direct": (agent_ingest, {"events": 5_000, "deliver": "direct"}, {"events": 500, "deliver": "direct"}),
+    "agent_ingest_outbox": (agent_ingest, {"events": 20_000, "deliver": "outbox"}, {"events": 2_000, "deliver": "outbox"}),
+    "agent_ingest_slow_api": (agent_ingest, {"events": 2_000, "deliver": "direct", "request_ms": 50.0, "deliver_workers": 16},
+                              {"events": 200, "deliver": "direct", "request_ms": 50.0, "deliver_workers": 16}),
+    "proxy_threaded": (proxy, {"engine": "threaded"}, {"engine": "threaded", "jobs": 40}),
+    "proxy_asyncio": (proxy, {"engine": "asyncio"}, {"engine": "asyncio", "jobs": 40}),
+    "proxy_slow_printer": (proxy, {"jobs": 32, "job_kb": 4096, "concurrency": 8, "read_rate_mbps": 8.0},
+                           {"jobs": 8, "job_kb": 4096, "concurrency": 4, "read_rate_mbps": 8.0}),
+}
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_child(name: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    out = subprocess.run([sys.executable, __file__, "--child", name, json.dumps(params)],
+                         stdout=subprocess.PIPE, check=False)
+    lines = out.stdout.decode(errors="ignore").strip().splitlines()
+    try:
+        return json.loads(lines[-1])
+    except (IndexError, ValueError):
+        return {"error": f"exit status {out.returncode}"}
+
+
+def _better(metric: str) -> int:
+    """+1 when higher is better, -1 when lower is better, 0 when not compared."""
+    if metric.endswith("_per_s"):
+        return 1
+    if metric.endswith(("_ms", "_mb", "_s")):
+        return -1
+    return 0
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """Print metric deltas; returns "scenario.metric" names that got worse, with %."""
+    worse = []
+    for name, metrics in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        for metric, value in metrics.items():
+            direction = _better(metric)
+            prev = old.get(metric)
+            if not direction or not isinstance(value, (int, float)) or not isinstance(prev, (int, float)) or not prev:
+                continue
+            change = (value - prev) / prev * 100
+            worse_by = -change * direction
+            print(f"{name:24} {metric:18} {prev:>12} -> {value:<12} {change:+7.1f}%")
+            if worse_by > 0:
+                worse.append((f"{name}.{metric}", worse_by))
+    return worse
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("scenarios", nargs="*", help=f"default: all of {', '.join(SCENARIOS)}")
+    ap.add_argument("--quick", action="store_true", help="smaller workloads")
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--compare", help="baseline results JSON")
+    ap.add_argument("--fail-over", type=float, help="exit 1 if a metric regresses by more than this %%")
+    ap.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        fn = SCENARIOS[args.child[0]][0]
+        print(json.dumps(fn(**json.loads(args.child[1]))))
+        return
+
+    names = args.scenarios or list(SCENARIOS)
+    report: Dict[str, Any] = {
+        "meta": {"git": _git_rev(), "python": platform.python_version(), "platform": platform.platform(),
+                 "cpus": os.cpu_count(), "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "quick": args.quick},
+        "params": {},
+        "results": {},
+    }
+    for name in names:
+        _, params, quick = SCENARIOS[name]
+        params = quick if args.quick else params
+        result = run_child(name, params)
+        report["params"][name] = params
+        report["results"][name] = result
+        print(json.dumps({"scenario": name, **result}), flush=True)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            worse = compare(json.load(f), report)
+        if args.fail_over is not None:
+            failed = [(m, pct) for m, pct in worse if pct > args.fail_over]
+            for metric, pct in failed:
+                print(f"REGRESSION {metric}: {pct:.1f}% worse")
+            if failed:
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Pending overlays matched to jobs by device, time and page count.
+
+The OverlayStore this replaces kept one overlay per ip:/name: key, so when
+two users printed to the same printer within seconds, the second overlay
+replaced the first and both jobs were billed to the second account. CorrelationIndex keeps
+every overlay. Each one is stored once, under all of its device keys, in
+time order. A job takes the best candidate:
+
+- only overlays posted from `window` seconds before the job up to `late`
+  seconds after it (clock skew, or a notification racing its event);
+- never one whose expected page count is known and differs from the
+  job's: that job is billed without an overlay instead of to another
+  user's account;
+- the oldest, so jobs on one printer pair with overlays first in, first
+  out, unless one of the next `lookahead` has the job's page count;
+- overlays older than one a job already took on that printer come last,
+  because their job was most likely cancelled. Otherwise they would shift
+  every later match by one.
+
+Each key has a sorted list of (time, seq). A lookup is a bisect per key
+plus at most `lookahead` candidates, O(log n), and a match or expiry is
+removed from every list it is in. A job with no candidate gets None, and
+the caller bills it without an overlay. Overlays nobody matched expire
+after `ttl` and are reported to on_expire.
+"""
+
+import bisect
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+_Slot = Tuple[float, int]  # (posted at, seq)
+
+
+class _Entry:
+    __slots__ = ("keys", "data", "at", "seq", "pages", "expires_at")
+
+    def __init__(self, keys: Tuple[str, ...], data: Dict[str, Any], at: float, seq: int, pages: int,
+                 expires_at: float):
+        self.keys = keys
+        self.data = data
+        self.at = at
+        self.seq = seq
+        self.pages = pages
+        self.expires_at = expires_at
+
+
+class CorrelationIndex:
+    # methods a shared index serves to other processes (overlay_store.share)
+    EXPOSED = ("add", "match", "peek", "__len__")
+
+    def __init__(self, ttl: float = 300, window: Optional[float] = None, late: float = 10, lookahead: int = 4,
+                 clock: Callable[[], float] = time.time,
+                 on_expire: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.ttl = ttl
+        self.window = ttl if window is None else window
+        self.late = late
+        self.lookahead = max(1, int(lookahead))
+        self.clock = clock
+        self.on_expire = on_expire
+        self._entries: Dict[int, _Entry] = {}
+        self._by_key: Dict[str, List[_Slot]] = {}
+        self._matched_up_to: Dict[str, float] = {}  # key -> time of the newest overlay a job took
+        self._heap: List[Tuple[float, int]] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, keys: Iterable[str], data: Dict[str, Any], pages: int = 0,
+            at: Optional[float] = None) -> None:
+        """Keep `data` for a job on any of `keys`; pages is the expected page count, 0 if unknown."""
+        keys = tuple(dict.fromkeys(k for k in keys if k))
+        if not keys:
+            return
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            entry = _Entry(keys, data, now if at is None else at, next(self._seq), max(0, int(pages or 0)),
+                           now + self.ttl)
+            self._entries[entry.seq] = entry
+            heapq.heappush(self._heap, (entry.expires_at, entry.seq))
+            slot = (entry.at, entry.seq)
+            for key in keys:
+                bisect.insort(self._by_key.setdefault(key, []), slot)
+
+    def match(self, keys: Sequence[str], pages: int = 0, at: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Take the best overlay for a job on `keys` that happened at `at` (now); None if there is none."""
+        now = self.clock()
+        at = now if at is None else at
+        with self._lock:
+            self._expire(now)
+            entry = self._find(keys, pages, at)
+            if entry is None:
+                return None
+            self._remove(entry)
+            for key in entry.keys:
+                if entry.at > self._matched_up_to.get(key, entry.at - 1):
+                    self._matched_up_to[key] = entry.at
+        return entry.data
+
+    def peek(self, keys: Sequence[str]) -> Optional[Dict[str, Any]]:
+        """The overlay a job on `keys` would take now, without taking it."""
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            entry = self._find(keys, 0, now)
+        return entry.data if entry is not None else None
+
+    def _find(self, keys: Sequence[str], pages: int, at: float) -> Optional[_Entry]:
+        lo, hi = at - self.window, at + self.late
+        best: Optional[Tuple[int, int, _Slot]] = None  # (stale, page count unknown, slot)
+        entries = self._entries
+        for key in keys:
+            slots = self._by_key.get(key)
+            if not slots:
+                continue
+            # Overlays older than one a job already took were probably cancelled: only take them last
+            fresh = max(lo, self._matched_up_to.get(key, lo))
+            for stale, start, end in ((0, fresh, hi), (1, lo, fresh)):
+                if best is not None and best[0] < stale:
+                    break
+                i = bisect.bisect_left(slots, (start, -1))
+                ranked = []
+                for slot in slots[i:i + self.lookahead]:
+                    if slot[0] > end or (stale and slot[0] == end):
+                        break
+                    expected = entries[slot[1]].pages
+                    if pages and expected and expected != pages:
+                        continue  # another job's page count
+                    ranked.append((stale, 0 if pages and expected else 1, slot))
+                if ranked:
+                    best = min(ranked + [best] if best is not None else ranked)
+                    break
+        return entries[best[2][1]] if best is not None else None
+
+    @staticmethod
+    def _unlink(index: Dict[Any, List[_Slot]], key: Any, slot: _Slot) -> None:
+        slots = index[key]
+        del slots[bisect.bisect_left(slots, slot)]
+        if not slots:
+            del index[key]
+
+    def _remove(self, entry: _Entry) -> None:
+        del self._entries[entry.seq]
+        slot = (entry.at, entry.seq)
+        for key in entry.keys:
+            self._unlink(self._by_key, key, slot)
+
+    def _expire(self, now: float) -> None:
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, seq = heapq.heappop(heap)
+            entry = self._entries.get(seq)
+            if entry is None:
+                continue  # matched before it expired
+            self._remove(entry)
+            if self.on_expire is not None:
+                self.on_expire(entry.data)
+        # Matched entries leave their heap items behind; rebuild when they pile up
+        if len(heap) > 2 * len(self._entries) + 1024:
+            self._heap = [(e.expires_at, e.seq) for e in self._entries.values()]
+            heapq.heapify(self._heap)
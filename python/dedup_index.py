@@ -0,0 +1,166 @@
+"""
+Bounded, persistent duplicate suppression for ingested print events.
+
+Events are keyed on a stable identity (EventRecordID plus a content digest)
+rather than Python's per-process hash(), so keys survive restarts. Keys sit
+in a fixed-size ring that also expires entries older than a time window, and
+the ring is snapshotted to disk so duplicates stay suppressed across runs.
+"""
+
+import hashlib
+import os
+import struct
+import threading
+import time
+from array import array
+from typing import Callable, Optional, Set, Union
+
+_MAGIC = b"PDX1"
+_HEADER = struct.Struct("<4sII")  # magic, capacity, count
+
+
+def event_key(record_id: int, xml: Union[str, bytes]) -> int:
+    """64-bit identity for an event: record id and content, stable across runs."""
+    data = xml.encode("utf-8", errors="ignore") if isinstance(xml, str) else xml
+    h = hashlib.blake2b(data, digest_size=8, person=b"print-evt")
+    h.update(struct.pack("<Q", int(record_id) & 0xFFFFFFFFFFFFFFFF))
+    return int.from_bytes(h.digest(), "little")
+
+
+class DedupIndex:
+    """Ring of the last `capacity` keys seen within `window_seconds`.
+
+    add() is check-and-insert and returns True for a new key. Memory is about
+    one set entry plus 12 bytes of ring per key, independent of uptime.
+    A key added with held=True suppresses duplicates at once but is left out
+    of saves until release(), so an event lost before it reached the outbox
+    is not skipped when it is read again after a restart. discard() forgets
+    a key whose event was not delivered, so it is accepted again.
+    """
+
+    def __init__(self, capacity: int = 200_000, window_seconds: float = 7 * 86400,
+                 path: Optional[str] = None, save_interval: float = 30.0,
+                 clock: Callable[[], float] = time.time):
+        self.capacity = max(1, int(capacity))
+        self.window = window_seconds
+        self.path = path
+        self.save_interval = save_interval
+        self.clock = clock
+        self._keys = array("Q", bytes(8 * self.capacity))
+        self._stamps = array("I", bytes(4 * self.capacity))
+        self._set: Set[int] = set()
+        self._held: Set[int] = set()
+        self._discarded = False  # ring slots of discarded keys are skipped on save
+        self._head = 0  # oldest entry
+        self._count = 0
+        self._dirty = False
+        self._saved_at = 0.0
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._set
+
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.window
+        while self._count and self._stamps[self._head] < cutoff:
+            self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        self._set.discard(self._keys[self._head])
+        self._head = (self._head + 1) % self.capacity
+        self._count -= 1
+
+    def add(self, key: int, held: bool = False) -> bool:
+        with self._lock:
+            if key in self._set:
+                return False
+            if held:
+                self._held.add(key)
+            now = self.clock()
+            self._expire(now)
+            if self._count == self.capacity:
+                self._evict_oldest()
+            pos = (self._head + self._count) % self.capacity
+            self._keys[pos] = key
+            self._stamps[pos] = int(now)
+            self._set.add(key)
+            self._count += 1
+            self._dirty = True
+            return True
+
+    def release(self, key: int) -> None:
+        """The held `key` is committed: include it in the next save."""
+        with self._lock:
+            if key in self._held:
+                self._held.discard(key)
+                self._dirty = True
+
+    def discard(self, key: int) -> None:
+        """Forget `key`: it is accepted by add() again and left out of saves."""
+        with self._lock:
+            if key in self._set:
+                self._set.discard(key)
+                self._held.discard(key)
+                self._discarded = True
+                self._dirty = True
+
+    def _ordered(self, arr: array) -> array:
+        end = self._head + self._count
+        if end <= self.capacity:
+            return arr[self._head:end]
+        return arr[self._head:] + arr[:end - self.capacity]
+
+    def save(self, force: bool = False) -> None:
+        if not self.path or not self._dirty:
+            return
+        if not force and self.clock() - self._saved_at < self.save_interval:
+            return
+        with self._lock:
+            keys = self._ordered(self._keys)
+            stamps = self._ordered(self._stamps)
+            if self._held or self._discarded:
+                live = self._set
+                kept = [i for i, key in enumerate(keys) if key in live and key not in self._held]
+                keys = array("Q", [keys[i] for i in kept])
+                stamps = array("I", [stamps[i] for i in kept])
+            count = len(keys)
+            self._dirty = False
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, self.capacity, count))
+                keys.tofile(f)
+                stamps.tofile(f)
+            os.replace(tmp, self.path)
+            self._saved_at = self.clock()
+        except OSError as e:
+            self._dirty = True
+            print(f"dedup save error: {e}")
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "rb") as f:  # type: ignore[arg-type]
+                magic, _, count = _HEADER.unpack(f.read(_HEADER.size))
+                if magic != _MAGIC:
+                    return
+                keys = array("Q")
+                stamps = array("I")
+                keys.fromfile(f, count)
+                stamps.fromfile(f, count)
+        except (OSError, EOFError, struct.error):
+            return
+        # Replay oldest first; a smaller capacity keeps only the newest entries
+        cutoff = self.clock() - self.window
+        for key, ts in zip(keys[-self.capacity:], stamps[-self.capacity:]):
+            if ts < cutoff or key in self._set:
+                continue
+            pos = (self._head + self._count) % self.capacity
+            self._keys[pos] = key
+            self._stamps[pos] = ts
+            self._set.add(key)
+            self._count += 1
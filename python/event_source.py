@@ -0,0 +1,192 @@
+"""
+Incremental PrintService event reading for the ingest agent.
+
+Instead of re-reading the newest few events on every poll, sources return only
+records with an EventRecordID above a persisted high-water mark, in pages of
+any size. WevtutilSource reads the live Windows log; ReplaySource serves an
+exported/rendered XML file so the pipeline can be driven on Linux.
+WevtutilSource.export() streams a time range for `agent.py backfill`.
+"""
+
+import bisect
+import io
+import json
+import os
+import subprocess
+import threading
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Set, Tuple
+
+from event_xml import EventRecord, parse_events
+
+LOG_NAME = "Microsoft-Windows-PrintService/Operational"
+
+
+def _by_record_id(rec: EventRecord) -> int:
+    return rec.record_id
+
+
+class EventSource:
+    """Interface: fetch(after, limit) returns up to `limit` events with
+    EventRecordID > after, oldest first. initial_cursor() is where a fresh
+    agent (no saved cursor) starts reading."""
+
+    def fetch(self, after: int, limit: int) -> List[EventRecord]:
+        raise NotImplementedError
+
+    def initial_cursor(self) -> int:
+        return 0
+
+    def read_new(self, after: int, page_size: int = 200) -> Iterator[EventRecord]:
+        """Page through everything newer than `after`."""
+        while True:
+            page = self.fetch(after, page_size)
+            for rec in page:
+                if rec.record_id > after:
+                    after = rec.record_id
+                yield rec
+            if len(page) < page_size:
+                return
+
+
+def _system_time(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+class WevtutilSource(EventSource):
+    """The live log, or with log_file=True an exported .evtx file at `log_name`."""
+
+    def __init__(self, event_id: int = 307, log_name: str = LOG_NAME, log_file: bool = False):
+        self.event_id = event_id
+        self.log_name = log_name
+        self.log_file = log_file
+
+    def _cmd(self, args: List[str]) -> List[str]:
+        return ["wevtutil", "qe", self.log_name, "/f:RenderedXml"] + (["/lf:true"] if self.log_file else []) + args
+
+    def _query(self, args: List[str]) -> str:
+        out = subprocess.check_output(self._cmd(args), stderr=subprocess.STDOUT, shell=False)
+        return out.decode("utf-8", errors="ignore")
+
+    def export(self, since: Optional[float] = None, until: Optional[float] = None,
+               read_chars: int = 1 << 20) -> Iterator[str]:
+        """Stream every event created in [since, until) as rendered XML text, oldest first.
+
+        wevtutil's output is read as it is produced, so a range of any size
+        never has to fit in memory. Raises CalledProcessError if it fails.
+        """
+        terms = [f"EventID={self.event_id}"]
+        if since is not None:
+            terms.append(f"TimeCreated[@SystemTime>='{_system_time(since)}']")
+        if until is not None:
+            terms.append(f"TimeCreated[@SystemTime<'{_system_time(until)}']")
+        xpath = "*[System[" + " and ".join(f"({t})" for t in terms) + "]]"
+        cmd = self._cmd([f"/q:{xpath}", "/rd:false"])
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, shell=False)
+        done = False
+        try:
+            text = io.TextIOWrapper(proc.stdout, encoding="utf-8", errors="ignore")  # type: ignore[arg-type]
+            for piece in iter(lambda: text.read(read_chars), ""):
+                yield piece
+            done = True
+        finally:
+            if not done:
+                proc.kill()  # the reader stopped early
+            proc.stdout.close()  # type: ignore[union-attr]
+            if proc.wait() != 0 and done:
+                raise subprocess.CalledProcessError(proc.returncode, cmd)
+
+    def fetch(self, after: int, limit: int) -> List[EventRecord]:
+        xpath = f"*[System[(EventID={self.event_id}) and (EventRecordID>{int(after)})]]"
+        # /rd:false returns oldest first, so /c pages forward from the cursor
+        text = self._query([f"/q:{xpath}", "/rd:false", f"/c:{int(limit)}"])
+        return sorted(parse_events(text), key=_by_record_id)
+
+    def initial_cursor(self) -> int:
+        # Start at the newest record; jobs printed before the first run are not billed
+        text = self._query([f"/q:*[System[(EventID={self.event_id})]]", "/rd:true", "/c:1"])
+        return max((rec.record_id for rec in parse_events(text)), default=0)
+
+
+class ReplaySource(EventSource):
+    """Serves events from a rendered-XML file (e.g. `wevtutil qe ... /f:RenderedXml > file`).
+
+    The file is re-read whenever it changes, so appending to it simulates new jobs.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._stamp: Tuple[float, int] = (0.0, -1)
+        self._events: List[EventRecord] = []
+
+    def _load(self) -> List[EventRecord]:
+        try:
+            st = os.stat(self.path)
+            if (st.st_mtime, st.st_size) != self._stamp:
+                with open(self.path, "r", encoding="utf-8-sig", errors="ignore") as f:
+                    self._events = sorted(parse_events(f.read()), key=_by_record_id)
+                self._stamp = (st.st_mtime, st.st_size)
+        except OSError:
+            return []
+        return self._events
+
+    def fetch(self, after: int, limit: int) -> List[EventRecord]:
+        events = self._load()
+        start = bisect.bisect_right(events, after, key=_by_record_id)
+        return events[start:start + limit]
+
+
+class EventCursor:
+    """EventRecordID high-water mark persisted to a small JSON file.
+
+    `value` is the newest record read. Records handed on with begin() are in
+    flight until done(); save() writes the committed mark, just below the
+    oldest record still in flight, so a restart reads those again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.value = -1
+        self._saved = -1
+        self._in_flight: Set[int] = set()
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.value = self._saved = int(json.load(f).get("lastRecordId", -1))
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    @property
+    def loaded(self) -> bool:
+        return self.value >= 0
+
+    def begin(self, record_id: int) -> None:
+        with self._lock:
+            self._in_flight.add(record_id)
+
+    def done(self, record_id: int) -> None:
+        with self._lock:
+            self._in_flight.discard(record_id)
+
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    @property
+    def committed(self) -> int:
+        with self._lock:
+            if self._in_flight:
+                return min(self.value, min(self._in_flight) - 1)
+            return self.value
+
+    def save(self) -> None:
+        value = self.committed
+        if value == self._saved:
+            return
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"lastRecordId": value}, f)
+            os.replace(tmp, self.path)
+            self._saved = value
+        except OSError as e:
+            print(f"cursor save error: {e}")
@@ -0,0 +1,105 @@
+"""
+Single-pass parsing of rendered PrintService event XML.
+
+One compiled pattern walks an event (or a whole multi-event `wevtutil` blob)
+once and picks out the System fields we need, every `<Data Name="...">` value
+under `<EventData>` and every leaf element under `<UserData>`. Field names are
+lower-cased, so `<Data Name="param3">`, `<Param3>` and `<param3>` all land on
+"param3".
+"""
+
+import re
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional
+
+# Tokens we care about; everything else is skipped by the regex engine. EventData
+# and UserData are taken as one block each, then split into fields with findall.
+_TOKEN_RE = re.compile(
+    r"<(?:"
+    r"(?P<start>Event)[\s>]"
+    r"|EventRecordID>(?P<rid>\d+)</"
+    r"|EventID(?:\s[^>]*)?>(?P<eid>\d+)</"
+    r"|TimeCreated\s+SystemTime=[\"'](?P<time>[^\"']*)[\"']"
+    r"|(?P<tag>EventData|UserData)>(?P<body>[^<]*(?:<(?!/(?P=tag)>)[^<]*)*)</(?P=tag)>"
+    r"|(?P<end>/Event)>"
+    r")"
+)
+_DATA_RE = re.compile(r"<Data\s+Name=[\"']([^\"']+)[\"']\s*(?:/>|>([^<]*)</Data>)")
+_LEAF_RE = re.compile(r"<([A-Za-z_][\w.-]*)(?:\s[^>]*)?>([^<]*)</\1>")
+
+_ENTITIES = {"&lt;": "<", "&gt;": ">", "&amp;": "&", "&quot;": '"', "&apos;": "'"}
+_ENTITY_RE = re.compile(r"&(?:lt|gt|amp|quot|apos);")
+
+
+def _unescape(value: str) -> str:
+    return _ENTITY_RE.sub(lambda m: _ENTITIES[m.group(0)], value)
+
+
+class EventRecord:
+    """Compact view of one event: System ids plus a flat name -> text field map."""
+
+    __slots__ = ("record_id", "event_id", "time_created", "fields", "xml")
+
+    def __init__(self, record_id: int = 0, event_id: int = 0, time_created: str = "",
+                 fields: Optional[Dict[str, str]] = None, xml: str = ""):
+        self.record_id = record_id
+        self.event_id = event_id
+        self.time_created = time_created
+        self.fields = fields if fields is not None else {}
+        self.xml = xml
+
+    def first(self, names: Iterable[str]) -> Optional[str]:
+        """Value of the first non-empty field among `names` (lower-case)."""
+        fields = self.fields
+        for name in names:
+            v = fields.get(name)
+            if v:
+                return v
+        return None
+
+    def __repr__(self) -> str:
+        return f"EventRecord(record_id={self.record_id}, event_id={self.event_id}, fields={self.fields!r})"
+
+
+def parse_events(text: str) -> Iterator[EventRecord]:
+    """Yield one EventRecord per <Event>...</Event> in `text`, in document order."""
+    rec: Optional[EventRecord] = None
+    start = 0
+    for m in _TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == "start":
+            rec = EventRecord()
+            start = m.start()
+        elif rec is None:
+            continue  # stray content outside an <Event>
+        elif kind == "body":
+            # EventData carries <Data Name=...>; UserData carries one leaf element per field
+            pairs = (_DATA_RE if m.group("tag") == "EventData" else _LEAF_RE).findall(m.group("body"))
+            fields = rec.fields
+            for name, value in pairs:
+                fields[name.lower()] = _unescape(value) if "&" in value else value
+        elif kind == "rid":
+            rec.record_id = int(m.group("rid"))
+        elif kind == "eid":
+            rec.event_id = int(m.group("eid"))
+        elif kind == "time":
+            rec.time_created = m.group("time")
+        elif kind == "end":
+            rec.xml = text[start:m.end()]
+            yield rec
+            rec = None
+
+
+def parse_event(xml: str) -> Optional[EventRecord]:
+    """Parse a single rendered event; None if `xml` holds no complete <Event>."""
+    for rec in parse_events(xml):
+        return rec
+    return None
+
+
+def event_time(time_created: str) -> Optional[float]:
+    """Unix time of a TimeCreated SystemTime (e.g. 2024-05-01T10:22:33.1234567Z); None if unparsable."""
+    try:
+        return datetime.fromisoformat(time_created).timestamp() if time_created else None
+    except ValueError:
+        return None
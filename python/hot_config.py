@@ -0,0 +1,140 @@
+"""
+Configuration files reloaded while the process runs.
+
+The agent and the proxy used to read their JSON config once, so adding a
+printer or a user mapping meant a restart, and the restart dropped the jobs
+in flight. HotConfig keeps the file compiled into one snapshot object:
+lookup tables built once, with nothing left to parse per job. check()
+compares the file's mtime and size. When they change it re-reads the file,
+compiles it and replaces the snapshot in one assignment. A file that does
+not parse or compile is reported, and the previous snapshot stays in use.
+
+Readers take `current` once per unit of work (a connection, an event) and
+use that object throughout, so a reload never changes the settings halfway
+through a job. Snapshots are never modified after they are published;
+freeze() makes their maps read-only.
+"""
+
+import json
+import os
+import threading
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+_Stamp = Tuple[float, int]
+
+
+class ConfigError(ValueError):
+    """The config file is not valid; the message names the offending key."""
+
+
+def freeze(value: Any) -> Any:
+    """A read-only copy of parsed JSON: objects become mappingproxies, arrays tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def file_stamp(path: str) -> Optional[_Stamp]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size
+
+
+def read_json(path: str) -> Dict[str, Any]:
+    """The config object in `path`; raises OSError or ConfigError."""
+    # utf-8-sig tolerates the BOM some editors and PowerShell write
+    with open(path, "r", encoding="utf-8-sig") as f:
+        try:
+            data = json.load(f)
+        except ValueError as e:
+            raise ConfigError(f"{path}: {e}") from None
+    if not isinstance(data, dict):
+        raise ConfigError(f"{path}: expected a JSON object")
+    return data
+
+
+class HotConfig(Generic[T]):
+    """The compiled snapshot of a config file, swapped when the file changes.
+
+    `compile(raw)` turns the parsed file into a snapshot or raises
+    ConfigError. Callbacks passed to subscribe() run after each swap with
+    (old, new); old is None for the first load.
+    """
+
+    def __init__(self, path: str, compile: Callable[[Dict[str, Any]], T], interval: float = 2.0,
+                 stamp: Optional[_Stamp] = None):
+        self.path = path
+        self.compile = compile
+        self.interval = interval
+        self.current: Optional[T] = None
+        self._stamp = stamp  # of the file `current` came from; None reads it on the first check()
+        self._subscribers: List[Callable[[Optional[T], T], None]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self, callback: Callable[[Optional[T], T], None]) -> None:
+        self._subscribers.append(callback)
+
+    @property
+    def stamp(self) -> Optional[_Stamp]:
+        return self._stamp
+
+    def load(self, raw: Dict[str, Any], stamp: Optional[_Stamp] = None) -> T:
+        """Compile `raw` and publish it; raises ConfigError and keeps the old snapshot if it is invalid.
+
+        `stamp` is that of the file `raw` was read from, when it came from the watched file.
+        """
+        with self._lock:
+            snapshot = self._swap(self.compile(raw))
+            if stamp is not None:
+                self._stamp = stamp
+            return snapshot
+
+    def _swap(self, snapshot: T) -> T:
+        old, self.current = self.current, snapshot
+        for callback in self._subscribers:
+            try:
+                callback(old, snapshot)
+            except Exception as e:
+                print(f"config reload error: {e}")
+        return snapshot
+
+    def check(self) -> bool:
+        """Reload if the file changed since the last load; True if a new snapshot was published."""
+        stamp = file_stamp(self.path)
+        if stamp is None or stamp == self._stamp:
+            return False
+        with self._lock:
+            if stamp == self._stamp:
+                return False
+            self._stamp = stamp  # a bad file is reported once, not on every check
+            try:
+                snapshot = self.compile(read_json(self.path))
+            except (OSError, ConfigError) as e:
+                print(f"config not reloaded, keeping the previous one: {e}")
+                return False
+            self._swap(snapshot)
+        print(f"config reloaded from {self.path}")
+        return True
+
+    def start(self) -> Optional[threading.Thread]:
+        """Check the file every `interval` seconds on a daemon thread; interval 0 disables it."""
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name="config-watch", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,100 @@
+"""
+Keep-alive HTTP(S) client for the agent's ingest posts and the proxy's agent
+notifications, built on http.client.
+
+Connections are kept per origin and reused across requests, so posting a job
+no longer pays for a new TCP connection and TLS handshake each time. At most
+`max_connections` requests per origin are in flight; extra callers wait.
+"""
+
+import http.client
+import ssl
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+Origin = Tuple[str, str, int]
+
+# Errors that mean a kept-alive connection went stale before we used it
+_STALE = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError,
+          BrokenPipeError, ConnectionAbortedError)
+
+
+class HttpPool:
+    def __init__(self, max_connections: int = 4, timeout: float = 5.0,
+                 context: Optional[ssl.SSLContext] = None):
+        self.max_connections = max(1, int(max_connections))
+        self.timeout = timeout
+        self.context = context
+        self.connections_opened = 0
+        self._idle: Dict[Origin, List[http.client.HTTPConnection]] = {}
+        self._slots: Dict[Origin, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _origin(self, url: str) -> Tuple[Origin, str]:
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        return (scheme, parts.hostname or "localhost", port), path
+
+    def _slot(self, origin: Origin) -> threading.BoundedSemaphore:
+        with self._lock:
+            slot = self._slots.get(origin)
+            if slot is None:
+                slot = self._slots[origin] = threading.BoundedSemaphore(self.max_connections)
+            return slot
+
+    def _checkout(self, origin: Origin) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(origin)
+            if idle:
+                return idle.pop(), True
+            self.connections_opened += 1
+        scheme, host, port = origin
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout, context=self.context), False
+        return http.client.HTTPConnection(host, port, timeout=self.timeout), False
+
+    def _checkin(self, origin: Origin, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._idle.setdefault(origin, []).append(conn)
+
+    def request(self, method: str, url: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        """Send one request and return (status, body). Raises on network errors."""
+        origin, path = self._origin(url)
+        slot = self._slot(origin)
+        with slot:
+            for attempt in range(2):
+                conn, reused = self._checkout(origin)
+                try:
+                    conn.request(method, path, body=body, headers=headers or {})
+                    resp = conn.getresponse()
+                    data = resp.read()
+                except _STALE:
+                    conn.close()
+                    if reused and attempt == 0:
+                        continue  # server closed an idle connection: reconnect once
+                    raise
+                except Exception:
+                    conn.close()
+                    raise
+                if resp.will_close:
+                    conn.close()
+                else:
+                    self._checkin(origin, conn)
+                return resp.status, data
+        raise ConnectionError("unreachable")
+
+    def post(self, url: str, body: bytes, headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        return self.request("POST", url, body, headers)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
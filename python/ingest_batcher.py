@@ -0,0 +1,78 @@
+"""
+Size/deadline batching for the agent's ingest posts.
+
+Jobs are handed to `send` in lists of up to `max_items`, at the latest
+`max_delay` seconds after the first job of a batch arrived. add() blocks once
+`max_pending` jobs are waiting so a slow backend pushes back on the caller
+instead of growing memory. A job's `done` callback runs once its batch has
+been posted.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class IngestBatcher:
+    def __init__(self, send: Callable[[List[Dict[str, Any]]], None], max_items: int = 20,
+                 max_delay: float = 0.25, max_pending: Optional[int] = None):
+        self.send = send
+        self.max_items = max(1, int(max_items))
+        self.max_delay = max(0.0, float(max_delay))
+        self.max_pending = max_pending or self.max_items * 4
+        self._items: List[Dict[str, Any]] = []
+        self._done: List[Optional[Callable[[], None]]] = []
+        self._first_at = 0.0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add(self, item: Dict[str, Any], done: Optional[Callable[[], None]] = None) -> None:
+        with self._cond:
+            while len(self._items) >= self.max_pending and not self._closed:
+                self._cond.wait()
+            if not self._items:
+                self._first_at = time.monotonic()
+            self._items.append(item)
+            self._done.append(done)
+            self._cond.notify_all()
+
+    def _take(self) -> Optional[Tuple[List[Dict[str, Any]], List[Optional[Callable[[], None]]]]]:
+        with self._cond:
+            while True:
+                if self._items:
+                    wait = self._first_at + self.max_delay - time.monotonic()
+                    if len(self._items) >= self.max_items or wait <= 0 or self._closed:
+                        batch = self._items[:self.max_items], self._done[:self.max_items]
+                        # Leftovers keep the older deadline: they have already waited
+                        del self._items[:self.max_items]
+                        del self._done[:self.max_items]
+                        self._cond.notify_all()
+                        return batch
+                    self._cond.wait(wait)
+                elif self._closed:
+                    return None
+                else:
+                    self._cond.wait()
+
+    def _run(self) -> None:
+        while True:
+            taken = self._take()
+            if taken is None:
+                return
+            batch, done = taken
+            try:
+                self.send(batch)
+            except Exception as e:
+                print(f"ingest batch error: {e}")
+            for callback in done:
+                if callback is not None:
+                    callback()
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Flush what is pending and stop the sender thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
@@ -0,0 +1,323 @@
+"""
+Streaming page, paper and colour counting for RAW print jobs.
+
+JobAnalyzer is fed the same chunks the proxy forwards and never looks at a
+byte twice: the PJL envelope is read for job settings (COPIES, DUPLEX,
+PAPER, RENDERMODE) and the language (ENTER LANGUAGE, else sniffed from
+%!PS, %PDF-, PCL escapes), after which one compiled pattern per language
+is run over each chunk. Tokens cut by a chunk boundary are caught by
+rescanning only the few bytes around the boundary; PCL raster/font data is
+skipped by its declared length so binary bytes are not taken for form feeds.
+
+Counting is heuristic by nature:
+- PCL pages are form feeds outside binary data.
+- PostScript pages are %%Page: comments (showpage when there is no DSC).
+- PDF pages are /Type /Page objects (/Count when they are compressed away).
+- Colour is any non-grey colour setting, unless PJL RENDERMODE says otherwise.
+PCL XL is recognised but not page-counted.
+"""
+
+import re
+from typing import Any, Dict, Optional
+
+# Longest token the scanners need to see whole across a chunk boundary
+_OVERLAP = 96
+# Colour operands are read back from just before setrgbcolor/setcmykcolor
+_LOOKBACK = 48
+# Give up waiting for the end of the PJL envelope after this much
+_MAX_HEAD = 64 * 1024
+
+# UEL and PJL command lines in front of the page description
+_ENVELOPE_RE = re.compile(rb"(?:\x1b%-12345X|@PJL[^\n]*\n|[ \t\r\n])*")
+_PJL_RE = re.compile(
+    rb"@PJL[ \t]+(?:SET[ \t]+(?P<key>[A-Z]+)[ \t]*=[ \t]*(?P<value>[^\r\n]*)"
+    rb"|ENTER[ \t]+LANGUAGE[ \t]*=[ \t]*(?P<lang>[A-Z0-9]+))",
+    re.IGNORECASE,
+)
+
+# Every alternative starts with a literal byte so sre can skip ahead to it
+_PS_RE = re.compile(
+    rb"%%(?:Page:[ \t](?P<page>)"
+    rb"|Pages:[ \t]*(?P<pages>\d+)\s"
+    rb"|(?:DocumentMedia|PageMedia):[ \t]*(?P<media>[A-Za-z0-9]+)"
+    rb"|DocumentProcessColors:(?P<process>[^\r\n]*)\r?\n)"
+    rb"|/(?:Duplex\s+(?P<duplex>true)"
+    rb"|PageSize\s*\[\s*(?P<psw>[\d.]+)\s+(?P<psh>[\d.]+)\s*\]"
+    rb"|NumCopies\s+(?P<copies>\d+)\s)"
+    rb"|s(?:howpage(?P<showpage>)\b"
+    rb"|etrgbcolor(?P<setrgb>)\b"
+    rb"|etcmykcolor(?P<setcmyk>)\b)"
+)
+_RGB_ARGS_RE = re.compile(rb"([\d.]+)\s+([\d.]+)\s+([\d.]+)\s*$")
+_CMYK_ARGS_RE = re.compile(rb"([\d.]+)\s+([\d.]+)\s+([\d.]+)\s+[\d.]+\s*$")
+
+_PDF_RE = re.compile(
+    rb"/(?:Type\s*/Page(?P<page>)[\s/>]"
+    rb"|Count\s+(?P<count>\d+)[\s/>]"
+    rb"|MediaBox\s*\[\s*[-\d.]+\s+[-\d.]+\s+(?P<pdfw>[\d.]+)\s+(?P<pdfh>[\d.]+)\s*\]"
+    rb"|Device(?:RGB|CMYK)(?P<rgb>)[\s/>\]]"
+    rb"|Duplex\s*/(?P<duplex>)Duplex"
+    rb"|NumCopies\s+(?P<copies>\d+)[\s/>])"
+)
+
+# PCL 5: form feed, or an escape sequence. Parameterised escapes are
+# ESC <group char> <param char> (<value><lowercase>)* <value><uppercase>
+_PCL_RE = re.compile(
+    rb"\x0c"
+    rb"|\x1b(?:(?P<grp>[!-/])(?P<pc>[`-~])(?P<params>(?:[-+]?[\d.]*[`-~])*[-+]?[\d.]*[@-^])|[0-~])"
+)
+_PCL_PARAM_RE = re.compile(rb"([-+]?[\d.]*)([`-~@-^])")
+
+# Escapes followed by `value` bytes of binary data
+_PCL_DATA = {b"*bW", b"*bV", b"(sW", b")sW", b"*cW", b"*vW", b"&pX", b"*mW", b"*oW", b"&bW", b"*gW"}
+_PCL_PAPER = {1: "Executive", 2: "Letter", 3: "Legal", 25: "A5", 26: "A4", 27: "A3"}
+_PAPER_NAMES = {b"A3": "A3", b"A4": "A4", b"A5": "A5", b"LETTER": "Letter", b"LEGAL": "Legal"}
+
+# Portrait width x height in points
+_PAPER_POINTS = (("A5", 420, 595), ("A4", 595, 842), ("A3", 842, 1191), ("Letter", 612, 792), ("Legal", 612, 1008))
+
+
+def paper_from_points(width: float, height: float) -> Optional[str]:
+    w, h = sorted((width, height))
+    for name, pw, ph in _PAPER_POINTS:
+        if abs(w - pw) <= 3 and abs(h - ph) <= 3:
+            return name
+    return None
+
+
+def _num(value: bytes, default: float = 0.0) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+class JobAnalyzer:
+    """Feed RAW job chunks in order; result() summarises what was printed."""
+
+    def __init__(self):
+        self.bytes = 0
+        self.language: Optional[str] = None
+        self.pages = 0
+        self.declared_pages = 0
+        self.showpages = 0
+        self.copies = 1
+        self.duplex = False
+        self.color = False
+        self.paper: Optional[str] = None
+        self._pjl_color: Optional[bool] = None
+        self._head = bytearray()
+        self._carry = b""
+        self._before = b""
+        self._pending = b""
+        self._skip = 0
+        self._pattern: Optional["re.Pattern[bytes]"] = None
+
+    # -- feeding ---------------------------------------------------------
+
+    def feed(self, data) -> None:
+        if not data:
+            return
+        self.bytes += len(data)
+        if self.language is None:
+            self._head += data
+            data = self._sniff(final=False)
+            if data is None:
+                return
+        if self.language == "pcl":
+            self._scan_pcl(data)
+        elif self._pattern is not None:
+            self._scan(data)
+
+    def _sniff(self, final: bool) -> Optional[bytes]:
+        """Read the PJL envelope and pick the language; returns the body bytes so far,
+        or None while the envelope may still continue."""
+        head = bytes(self._head)
+        end = _ENVELOPE_RE.match(head).end()
+        body = head[end:]
+        if not final and len(head) < _MAX_HEAD and (len(body) < 16 or body.startswith(b"@PJL")):
+            return None
+        lang = None
+        for m in _PJL_RE.finditer(head, 0, end):
+            if m.group("lang"):
+                lang = m.group("lang").decode("ascii").lower()
+            else:
+                self._pjl(m.group("key"), m.group("value"))
+        if lang in ("postscript", "ps"):
+            lang = "postscript"
+        elif lang not in ("pcl", "pdf", "pclxl"):
+            if body.startswith(b"%!"):
+                lang = "postscript"
+            elif body.startswith(b"%PDF-"):
+                lang = "pdf"
+            elif b") HP-PCL XL" in body[:256]:
+                lang = "pclxl"
+            elif body.startswith(b"\x1b"):
+                lang = "pcl"
+            else:
+                lang = "unknown"
+        self.language = lang
+        self._pattern = {"postscript": _PS_RE, "pdf": _PDF_RE}.get(lang)
+        self._head = bytearray()
+        return body
+
+    def _scan(self, data) -> None:
+        """finditer over the chunk, plus the matches that straddle the previous boundary."""
+        pattern = self._pattern
+        token = self._token
+        carry = self._carry
+        if carry:
+            joint = carry + bytes(data[:_OVERLAP])
+            cut = len(carry)
+            self._before = b""
+            for m in pattern.finditer(joint):
+                if m.start() < cut < m.end():
+                    token(m)
+        self._before = carry
+        for m in pattern.finditer(data):
+            token(m)
+        if len(data) >= _OVERLAP:
+            self._carry = bytes(data[-_OVERLAP:])
+        else:
+            self._carry = (carry + bytes(data))[-_OVERLAP:]
+
+    def _scan_pcl(self, data) -> None:
+        """Sequential search so binary payloads can be jumped over by length."""
+        if self._pending:
+            data = self._pending + bytes(data)
+            self._pending = b""
+        n = len(data)
+        pos = self._skip
+        if pos >= n:
+            self._skip = pos - n
+            return
+        self._skip = 0
+        search = _PCL_RE.search
+        while True:
+            m = search(data, pos)
+            if m is None:
+                break
+            pos = m.end()
+            params = m.group("params")
+            if params is not None:
+                pos += self._pcl_escape(m.group("grp") + m.group("pc"), params)
+                if pos > n:
+                    self._skip = pos - n
+                    return
+            elif m.end() - m.start() == 1:
+                self.pages += 1  # form feed
+        # an escape cut by the chunk boundary is completed by the next chunk
+        end = bytes(data[max(pos, n - _OVERLAP):])
+        tail = end.rfind(b"\x1b")
+        if tail >= 0:
+            self._pending = end[tail:]
+
+    def _pcl_escape(self, prefix: bytes, params: bytes) -> int:
+        """Apply one (possibly combined) escape; returns binary bytes that follow it."""
+        follow = 0
+        for value, char in _PCL_PARAM_RE.findall(params):
+            cmd = prefix + char.upper()
+            v = _num(value)
+            if cmd in _PCL_DATA:
+                follow += int(v)
+                if cmd == b"*vW":
+                    self.color = True  # configure image data: a colour palette
+            elif cmd == b"&lS":
+                self.duplex = v in (1, 2)
+            elif cmd == b"&lA":
+                self._note_paper(_PCL_PAPER.get(int(v)))
+            elif cmd == b"&lX":
+                self.copies = max(1, int(v))
+            elif cmd == b"*rU":
+                self.color = self.color or int(v) != 1
+        return follow
+
+    # -- tokens ----------------------------------------------------------
+
+    def _operands(self, m: "re.Match[bytes]") -> bytes:
+        start = m.start()
+        text = bytes(m.string[max(0, start - _LOOKBACK):start])
+        if start < _LOOKBACK:
+            text = self._before + text
+        return text
+
+    def _token(self, m: "re.Match[bytes]") -> None:
+        kind = m.lastgroup
+        if kind == "page":
+            self.pages += 1
+        elif kind == "showpage":
+            self.showpages += 1
+        elif kind in ("pages", "count"):
+            self.declared_pages = max(self.declared_pages, int(m.group(kind)))
+        elif kind == "duplex":
+            self.duplex = True
+        elif kind == "rgb":
+            self.color = True
+        elif kind == "setrgb" and not self.color:
+            args = _RGB_ARGS_RE.search(self._operands(m))
+            if args:
+                r, g, b = (_num(v) for v in args.groups())
+                self.color = not (r == g == b)
+        elif kind == "setcmyk" and not self.color:
+            args = _CMYK_ARGS_RE.search(self._operands(m))
+            if args:
+                self.color = any(_num(v) for v in args.groups())
+        elif kind == "process":
+            names = m.group("process").lower()
+            self.color = self.color or any(c in names for c in (b"cyan", b"magenta", b"yellow"))
+        elif kind == "copies":
+            self.copies = max(1, int(m.group("copies")))
+        elif kind == "media":
+            self._note_paper(_PAPER_NAMES.get(m.group("media").upper()))
+        elif kind == "psh":
+            self._note_paper(paper_from_points(_num(m.group("psw")), _num(m.group("psh"))))
+        elif kind == "pdfh":
+            self._note_paper(paper_from_points(_num(m.group("pdfw")), _num(m.group("pdfh"))))
+
+    def _pjl(self, key: bytes, value: bytes) -> None:
+        key = key.upper()
+        value = value.strip().strip(b'"').upper()
+        if key in (b"COPIES", b"QTY"):
+            self.copies = max(1, int(_num(value, 1)))
+        elif key == b"DUPLEX":
+            self.duplex = value == b"ON"
+        elif key == b"PAPER":
+            self._note_paper(_PAPER_NAMES.get(value))
+        elif key == b"RENDERMODE":
+            self._pjl_color = value == b"COLOR"
+        elif key == b"PLANESINUSE":
+            self._pjl_color = value != b"1"
+
+    def _note_paper(self, name: Optional[str]) -> None:
+        # the largest sheet in the job decides the A3/A4 price
+        if name and (self.paper is None or name == "A3"):
+            self.paper = name
+
+    # -- result ----------------------------------------------------------
+
+    def result(self) -> Dict[str, Any]:
+        if self.language is None:
+            body = self._sniff(final=True)
+            if self.language == "pcl":
+                self._scan_pcl(body)
+            elif self._pattern is not None:
+                self._scan(body)
+        pages = self.pages
+        if self.language == "postscript" and not pages:
+            pages = self.declared_pages or self.showpages
+        elif self.language == "pdf" and not pages:
+            pages = self.declared_pages
+        color = self.color if self._pjl_color is None else self._pjl_color
+        paper = self.paper or "A4"
+        size = "A3" if paper == "A3" else "A4"
+        return {
+            "language": self.language,
+            "pages": pages,
+            "copies": self.copies,
+            "quantity": pages * self.copies,
+            "duplex": self.duplex,
+            "color": color,
+            "paper": paper,
+            "type": f"{size}{'Color' if color else 'BW'}",
+            "bytes": self.bytes,
+        }
@@ -0,0 +1,114 @@
+"""
+Scatter-gather job output for the print proxy.
+
+Injectors return a job as a list of parts instead of one concatenated bytes
+object: small preamble/trailer buffers around the untouched job, which is a
+memoryview (job spooled in RAM) or a FileRegion (job spooled to disk). The
+forwarder writes buffers with one sendmsg() per run of buffers and file
+regions with sendfile(), so a 50 MB job is never copied just to add a few
+hundred bytes of PJL on each side. Where sendmsg/os.sendfile are missing
+(Windows) the same calls fall back to sendall() and read-and-send.
+"""
+
+import asyncio
+import io
+import socket
+from typing import Any, Iterable, List, NamedTuple, Union
+
+# Linux IOV_MAX is 1024; stay well below it
+_MAX_IOV = 64
+_HAS_SENDMSG = hasattr(socket.socket, "sendmsg")
+
+
+class FileRegion(NamedTuple):
+    file: Any  # binary file object with fileno()
+    offset: int
+    count: int
+
+
+JobPart = Union[bytes, bytearray, memoryview, FileRegion]
+
+
+def as_parts(result: Any) -> List[JobPart]:
+    """Normalise an injector result: one bytes-like object or a sequence of parts."""
+    if isinstance(result, (bytes, bytearray, memoryview, FileRegion)):
+        return [result]
+    return list(result)
+
+
+def part_bytes(part: JobPart) -> bytes:
+    """Materialise one part (for injectors that must rewrite the job itself)."""
+    if isinstance(part, FileRegion):
+        part.file.seek(part.offset)
+        return part.file.read(part.count)
+    return bytes(part)
+
+
+def spool_region(spool: Any, size: int) -> JobPart:
+    """The spooled job without reading it back: a view of the in-memory buffer,
+    or a region of the temp file once SpooledTemporaryFile has rolled over."""
+    spool.flush()
+    inner = getattr(spool, "_file", spool)
+    if isinstance(inner, io.BytesIO):
+        return inner.getbuffer()[:size]
+    return FileRegion(inner, 0, size)
+
+
+def release(parts: Iterable[JobPart]) -> None:
+    """Drop memoryviews so the spool's BytesIO can be closed."""
+    for part in parts:
+        if isinstance(part, memoryview):
+            part.release()
+
+
+def _send_buffers(sock: socket.socket, views: List[memoryview]) -> None:
+    if not _HAS_SENDMSG:
+        for view in views:
+            sock.sendall(view)
+        return
+    while views:
+        sent = sock.sendmsg(views[:_MAX_IOV])
+        while sent:
+            first = len(views[0])
+            if sent >= first:
+                sent -= first
+                views.pop(0)
+            else:
+                views[0] = views[0][sent:]
+                sent = 0
+
+
+def send_parts(sock: socket.socket, parts: Iterable[JobPart]) -> int:
+    """Write all parts to a blocking socket in order; returns bytes sent."""
+    pending: List[memoryview] = []
+    total = 0
+    for part in parts:
+        if isinstance(part, FileRegion):
+            _send_buffers(sock, pending)
+            pending = []
+            if part.count:
+                sock.sendfile(part.file, part.offset, part.count)
+            total += part.count
+        elif len(part):
+            view = memoryview(part).cast("B")
+            pending.append(view)
+            total += len(view)
+    _send_buffers(sock, pending)
+    return total
+
+
+async def send_parts_async(writer: asyncio.StreamWriter, parts: Iterable[JobPart], timeout: float = 10) -> int:
+    """asyncio counterpart of send_parts; file regions go through loop.sendfile()."""
+    loop = asyncio.get_running_loop()
+    total = 0
+    for part in parts:
+        if isinstance(part, FileRegion):
+            await asyncio.wait_for(writer.drain(), timeout)
+            if part.count:
+                await loop.sendfile(writer.transport, part.file, part.offset, part.count)
+            total += part.count
+        elif len(part):
+            writer.write(part)
+            total += len(part)
+            await asyncio.wait_for(writer.drain(), timeout)
+    return total
@@ -0,0 +1,246 @@
+"""
+Job boundaries inside one RAW connection.
+
+Drivers may send several documents over one connection. Each is framed by
+the PJL Universal Exit Language (UEL, ESC%-12345X), usually bracketed as
+
+    UEL @PJL JOB ... @PJL ENTER LANGUAGE=...  <PDL data>  UEL @PJL EOJ ... UEL
+
+JobSplitter cuts the stream into jobs as it arrives, without buffering it.
+Only the PJL lines right after each UEL are parsed. A job ends:
+- after an @PJL EOJ line, and the UEL directly after it;
+- before a UEL whose PJL lines hold @PJL JOB, once the current job has data
+  or its own JOB (drivers that never send EOJ);
+- before a UEL whose PJL lines hold ENTER LANGUAGE, in a job without JOB
+  that already has PDL data (back-to-back unbracketed jobs).
+A UEL inside a JOB ... EOJ bracket does not end the job, so a job may
+switch languages. Streams without PJL are one job, as before. Leading
+whitespace and UELs join the next job. Such bytes left at the end of the
+connection are dropped.
+
+JobStream wraps the splitter for a read loop that owns the socket: the
+loop pushes what it receives and takes the jobs out one part at a time.
+"""
+
+import re
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from job_buffers import JobPart
+
+UEL = b"\x1b%-12345X"
+
+_UEL_RE = re.compile(re.escape(UEL))
+# One PJL command line after a UEL; group 1 is the command word
+_PJL_LINE = re.compile(rb"[ \t\r\n]*@PJL[ \t]*([A-Za-z]*)[^\r\n]*\r?\n")
+_PJL_START = re.compile(rb"[ \t\r\n]*@PJL")
+_PDL_BYTE = re.compile(rb"[^ \t\r\n\f\x00]")
+_JUNK = re.compile(rb"(?:[ \t\r\n\f\x00]|\x1b%-12345X)*")
+# PJL lines after a UEL longer than this are taken as complete rather than waiting for more
+_MAX_BLOCK = 4096
+
+
+class JobSplitter:
+    """Incremental job segmentation; see the module docstring.
+
+    feed() and close() return (part, ends_job) pairs in stream order. A part
+    belongs to the current job, and ends_job marks the last part of a job.
+    Parts may be memoryviews of the data passed to feed(), so use them
+    before feeding the next chunk.
+    """
+
+    def __init__(self):
+        self._tail = b""  # held back: a cut UEL, PJL lines still arriving, or leading junk
+        self._started = False  # the current job has non-junk bytes
+        self._bracketed = False  # ... and opened with @PJL JOB
+        self._has_pdl = False  # ... and has bytes outside PJL lines
+        self._after_eoj = False  # ... and ended with EOJ; a UEL right after it still belongs to it
+        self.jobs = 0  # jobs ended so far
+
+    @property
+    def in_job(self) -> bool:
+        """Inside a JOB ... EOJ bracket: the client still owes the rest of the job."""
+        return self._bracketed
+
+    def feed(self, data: JobPart) -> List[Tuple[JobPart, bool]]:
+        if self._tail:
+            buf = memoryview(self._tail + bytes(data))
+            self._tail = b""
+        else:
+            buf = memoryview(data)
+        return self._scan(buf, final=False)
+
+    def close(self) -> List[Tuple[JobPart, bool]]:
+        """End of stream: flush what is held back and end the current job."""
+        tail, self._tail = self._tail, b""
+        out = self._scan(memoryview(tail), final=True) if tail or self._after_eoj else []
+        if self._started:
+            out.append((b"", True))
+            self._end_job()
+        return out
+
+    def _end_job(self) -> None:
+        self.jobs += 1
+        self._started = self._bracketed = self._has_pdl = self._after_eoj = False
+
+    def _scan(self, buf: memoryview, final: bool) -> List[Tuple[JobPart, bool]]:
+        out: List[Tuple[JobPart, bool]] = []
+        size = len(buf)
+        start = 0  # first byte of the current job not yet returned
+        pos = 0
+        if self._after_eoj:
+            if not final and size < len(UEL) and UEL.startswith(buf):
+                self._tail = bytes(buf)
+                return out
+            pos = len(UEL) if buf[:len(UEL)] == UEL else 0
+            out.append((buf[:pos], True))
+            self._end_job()
+            start = pos
+        while pos < size:
+            if not self._started:
+                junk_end = _JUNK.match(buf, pos).end()
+                if junk_end == size or (not final and size - junk_end < len(UEL)
+                                        and UEL.startswith(buf[junk_end:])):
+                    # only whitespace/UELs so far: they join the next job, or are dropped at EOF
+                    if not final:
+                        self._tail = bytes(buf[start:])
+                    return out
+                self._started = True
+            m = _UEL_RE.search(buf, pos)
+            if m is None:
+                hold = size if final else self._cut_uel(buf, pos, size)
+                self._note_pdl(buf, pos, hold)
+                if hold < size:
+                    self._tail = bytes(buf[hold:])
+                if hold > start:
+                    out.append((buf[start:hold], False))
+                return out
+            i = m.start()
+            self._note_pdl(buf, pos, i)
+            block = self._block(buf, i, size, final)
+            if block is None:
+                self._tail = bytes(buf[i:])
+                if i > start:
+                    out.append((buf[start:i], False))
+                return out
+            end, commands = block
+            if "EOJ" in commands:
+                rest = buf[end:end + len(UEL)]
+                if rest == UEL:
+                    end += len(UEL)
+                elif not final and len(rest) < len(UEL) and UEL.startswith(rest):
+                    # the UEL that closes the job may be in the next chunk
+                    self._after_eoj = True
+                    self._tail = bytes(rest)
+                    out.append((buf[start:end], False))
+                    return out
+                out.append((buf[start:end], True))
+                self._end_job()
+                start = pos = end
+                continue
+            if ("JOB" in commands and (self._bracketed or self._has_pdl)) or \
+                    ("ENTER" in commands and not self._bracketed and self._has_pdl):
+                if i > start:
+                    out.append((buf[start:i], True))
+                else:
+                    out.append((b"", True))  # the job's bytes went out with earlier chunks
+                self._end_job()
+                start = pos = i
+                continue
+            if "JOB" in commands:
+                self._bracketed = True
+            pos = end
+        if size > start:
+            out.append((buf[start:size], False))
+        return out
+
+    def _note_pdl(self, buf: memoryview, start: int, end: int) -> None:
+        if not self._has_pdl and end > start and _PDL_BYTE.search(buf, start, end):
+            self._has_pdl = True
+
+    @staticmethod
+    def _cut_uel(buf: memoryview, pos: int, size: int) -> int:
+        """Where a UEL cut off by the end of the chunk starts, else size."""
+        for k in range(max(pos, size - len(UEL) + 1), size):
+            if buf[k] == 0x1B and UEL.startswith(buf[k:size]):
+                return k
+        return size
+
+    @staticmethod
+    def _block(buf: memoryview, i: int, size: int, final: bool) -> Optional[Tuple[int, List[str]]]:
+        """(end, command words) of the PJL lines after the UEL at i; None while they are still arriving."""
+        pos = i + len(UEL)
+        commands: List[str] = []
+        while True:
+            m = _PJL_LINE.match(buf, pos)
+            if m is None:
+                break
+            word = bytes(m.group(1)).upper().decode("ascii")
+            commands.append(word)
+            pos = m.end()
+            if word in ("ENTER", "EOJ"):
+                return pos, commands
+        if not final and size - i < _MAX_BLOCK:
+            if pos + 8 > size and b"@PJL".startswith(bytes(buf[pos:]).lstrip(b" \t\r\n")[:4]):
+                return None  # too little after the UEL to tell yet
+            if _PJL_START.match(buf, pos):
+                return None  # a PJL line without its line end yet
+        return pos, commands
+
+
+class JobStream:
+    """The jobs of one connection, one part at a time.
+
+    The read loop push()es every chunk it receives, and b"" at end of
+    stream. next_job() moves on to the next job: True once it has started,
+    False at end of stream, None while more data is needed. read() gives
+    the current job's next part, b"" once the job is over (and until
+    next_job()), or None while more data is needed. Parts may be views of
+    the pushed chunk, so use them before pushing the next one.
+
+    With split=False the whole connection is one job.
+    """
+
+    def __init__(self, split: bool = True):
+        self._splitter: Optional[JobSplitter] = JobSplitter() if split else None
+        self._parts: Deque[Tuple[JobPart, bool]] = deque()
+        self._done = True  # the current job is over
+        self._data = False  # split=False: bytes seen
+        self.eof = False
+
+    @property
+    def in_job(self) -> bool:
+        """The client is in the middle of a bracketed job, so a pause is not the end of it."""
+        return self._splitter is not None and self._splitter.in_job
+
+    def push(self, data: JobPart) -> None:
+        if not data:
+            self.eof = True
+            if self._splitter is not None:
+                self._parts.extend(self._splitter.close())
+            elif self._data:
+                self._parts.append((b"", True))
+        elif self._splitter is not None:
+            self._parts.extend(self._splitter.feed(data))
+        else:
+            self._data = True
+            self._parts.append((data, False))
+
+    def next_job(self) -> Optional[bool]:
+        if not self._done:
+            raise RuntimeError("the current job has not been read to its end")
+        if self._parts:
+            self._done = False
+            return True
+        return False if self.eof else None
+
+    def read(self) -> Optional[JobPart]:
+        while not self._done:
+            if not self._parts:
+                return None
+            part, ends_job = self._parts.popleft()
+            if ends_job:
+                self._done = True
+            if part:
+                return part
+        return b""
@@ -0,0 +1,87 @@
+"""
+Concurrent HTTP/1.1 servers for the local control endpoints: the proxy's
+/set and /metrics, and the agent's /notify and /metrics.
+
+Both used to run on a plain socketserver.TCPServer. That serves one
+request at a time and closes the connection after each one, so a burst of
+/set calls from the billing UI and the proxy's notifications queued up
+behind each other. LocalHTTPServer serves each connection on its own
+thread and keeps it open between requests (HTTP/1.1 keep-alive) until it
+has been idle for idle_seconds.
+
+POST bodies are one JSON object, an array of them, or
+{"token": ..., "overlays": [...]}. overlay_items() turns all three into a
+list, so one request can carry a whole batch of overlays.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+# Bodies larger than this are refused rather than read
+MAX_BODY = 8 * 1024 * 1024
+
+
+class LocalHandler(BaseHTTPRequestHandler):
+    """Base handler: keep-alive, every reply with a Content-Length, no access log."""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self) -> None:
+        self.timeout = self.server.idle_seconds  # type: ignore[attr-defined]
+        super().setup()
+
+    def read_body(self) -> bytes:
+        """The request body. Read it before replying, even to refuse, so the next request on the connection parses."""
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            self.close_connection = True
+            raise ValueError(f"request body of {length} bytes")
+        return self.rfile.read(length) if length > 0 else b""
+
+    def reply(self, status: int, body: bytes = b"", content_type: str = "application/json") -> None:
+        self.send_response(status)
+        if body:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):  # silence default HTTP logging
+        return
+
+
+class LocalHTTPServer(ThreadingHTTPServer):
+    allow_reuse_address = True
+
+    def __init__(self, address: Tuple[str, int], handler: type, backlog: int = 1024, idle_seconds: float = 30.0):
+        self.request_queue_size = backlog
+        self.idle_seconds = idle_seconds
+        super().__init__(address, handler)
+
+
+def serve_local(port: int, handler: type, backlog: int = 1024, idle_seconds: float = 30.0) -> threading.Thread:
+    """Serve `handler` on 127.0.0.1:port from a daemon thread."""
+    server = LocalHTTPServer(("127.0.0.1", port), handler, backlog, idle_seconds)
+    t = threading.Thread(target=server.serve_forever, name=f"http-{port}", daemon=True)
+    t.start()
+    return t
+
+
+def overlay_items(data: Any) -> Tuple[List[Dict[str, Any]], str, bool]:
+    """(overlays, top-level token, bulk) of a parsed POST body."""
+    if isinstance(data, list):
+        items, token, bulk = data, "", True
+    elif isinstance(data, dict) and isinstance(data.get("overlays"), list):
+        items, token, bulk = data["overlays"], str(data.get("token") or ""), True
+    else:
+        items, token, bulk = [data], "", False
+    if not all(isinstance(item, dict) for item in items):
+        raise ValueError("overlays must be JSON objects")
+    return items, token, bulk
+
+
+def bulk_reply(accepted: int) -> bytes:
+    return json.dumps({"accepted": accepted}).encode("utf-8")
@@ -0,0 +1,286 @@
+"""
+In-process counters, gauges and histograms, rendered as Prometheus text.
+
+Shared by the agent and the print proxy; both serve REGISTRY.render() at
+GET /metrics. Updates take one small lock per series, so they are cheap
+enough for per-event and per-chunk hot paths. A process serving metrics for
+others (the proxy's worker processes) merges their families() with
+render_families().
+"""
+
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; covers sub-millisecond parsing up to slow printer transfers
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Series:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+
+class CounterSeries(_Series):
+    __slots__ = ()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class GaugeSeries(_Series):
+    __slots__ = ("fn",)
+
+    def __init__(self):
+        super().__init__()
+        self.fn: Optional[Callable[[], float]] = None
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+    def set_function(self, fn: Optional[Callable[[], float]]) -> None:
+        """Read the value from `fn` at scrape time instead of tracking it."""
+        self.fn = fn
+
+    def read(self) -> float:
+        if self.fn is not None:
+            try:
+                return float(self.fn())
+            except Exception:
+                return float("nan")
+        return self.value
+
+
+class _Timer:
+    __slots__ = ("series", "started")
+
+    def __init__(self, series: "HistogramSeries"):
+        self.series = series
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.series.observe(time.perf_counter() - self.started)
+
+
+class HistogramSeries:
+    __slots__ = ("_lock", "buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self._lock = threading.Lock()
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+
+class Metric:
+    """A named family; unlabelled metrics are used directly, labelled ones via labels()."""
+
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        key = tuple(str(v) for v in values)
+        series = self._series.get(key)
+        if series is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                series = self._series.setdefault(key, self._new())
+        return series
+
+    def _samples(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return sorted(self._series.items())
+
+    def _label_text(self, values: Tuple[str, ...], *extra: str) -> str:
+        parts = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, values)]
+        parts.extend(e for e in extra if e)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self, extra: str = "") -> List[str]:
+        """HELP, TYPE and sample lines; `extra` (e.g. 'worker="1"') is added to every sample's labels."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, series in self._samples():
+            lines.extend(self._render_series(values, series, extra))
+        return lines
+
+    def _render_series(self, values: Tuple[str, ...], series, extra: str = "") -> List[str]:
+        return [f"{self.name}{self._label_text(values, extra)} {_fmt(series.value)}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        if not self.labelnames:
+            self.labels()
+
+    def _new(self):
+        return CounterSeries()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        if not self.labelnames:
+            self.labels()
+
+    def _new(self):
+        return GaugeSeries()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self.labels().dec(amount)
+
+    def set_function(self, fn: Optional[Callable[[], float]]) -> None:
+        self.labels().set_function(fn)
+
+    def _render_series(self, values: Tuple[str, ...], series, extra: str = "") -> List[str]:
+        return [f"{self.name}{self._label_text(values, extra)} {_fmt(series.read())}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        if not self.labelnames:
+            self.labels()
+
+    def _new(self):
+        return HistogramSeries(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def _render_series(self, values: Tuple[str, ...], series, extra: str = "") -> List[str]:
+        with series._lock:
+            counts = list(series.counts)
+            total, count = series.sum, series.count
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            cumulative += n
+            le = 'le="%s"' % _fmt(bound)
+            lines.append(f"{self.name}_bucket{self._label_text(values, extra, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{self._label_text(values, extra)} {_fmt(total)}")
+        lines.append(f"{self.name}_count{self._label_text(values, extra)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric: Metric) -> Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing  # re-import / re-registration returns the live metric
+            self._metrics[metric.name] = metric
+            return metric
+
+    def unregister(self, name: str) -> None:
+        """Stop exposing `name`, e.g. in a process where another one reports it."""
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))  # type: ignore[return-value]
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labelnames))  # type: ignore[return-value]
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))  # type: ignore[return-value]
+
+    def families(self, extra: str = "") -> List[Tuple[str, List[str]]]:
+        """(name, rendered lines) per metric; plain data, so it can be sent to another process."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return [(metric.name, metric.render(extra)) for metric in metrics]
+
+    def render(self) -> str:
+        return render_families([self.families()])
+
+
+def render_families(groups: Iterable[List[Tuple[str, List[str]]]]) -> str:
+    """One exposition from several families() results; samples of a family stay under one HELP/TYPE."""
+    merged: Dict[str, List[str]] = {}
+    for families in groups:
+        for name, lines in families:
+            if name in merged:
+                merged[name].extend(lines[2:])
+            else:
+                merged[name] = list(lines)
+    return "\n".join(line for lines in merged.values() for line in lines) + "\n"
+
+
+REGISTRY = Registry()
@@ -0,0 +1,243 @@
+"""
+Durable on-disk outbox between the agent's event consumer and the ingest API.
+
+put() only appends to memory; a writer thread commits pending jobs to SQLite
+in one transaction per flush (one fsync per batch rather than per job) and
+then calls each job's on_commit callback, and a sender thread drains
+committed rows in batches. Failed sends are retried with exponential backoff
+and jitter; a job leaves the outbox only once the backend accepted it, or
+rejected it permanently (kept as "dead" for inspection). A failed SQLite
+write is logged and retried, the jobs it held staying queued in memory.
+"""
+
+import json
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PENDING = 0
+DEAD = 1
+
+_DB_RETRY_MAX = 5.0  # seconds between attempts while SQLite keeps failing
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_at REAL NOT NULL DEFAULT 0,
+    state INTEGER NOT NULL DEFAULT 0,
+    last_status INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (state, next_at, id);
+"""
+
+
+def is_permanent(status: int) -> bool:
+    """4xx other than auth/timeout/rate-limit will not succeed on retry."""
+    return 400 <= status < 500 and status not in (401, 408, 429)
+
+
+class Outbox:
+    """`send(payloads)` must return one HTTP status per payload (0 = network error)."""
+
+    def __init__(self, path: str, send: Callable[[List[Dict[str, Any]]], List[int]],
+                 batch_size: int = 20, flush_interval: float = 0.1,
+                 base_backoff: float = 1.0, max_backoff: float = 300.0,
+                 max_pending: int = 10_000):
+        self.path = path
+        self.send = send
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_pending = max_pending
+        self.sent = 0
+        self.dead = 0
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.executescript(_SCHEMA)
+        self._db_lock = threading.Lock()
+        self._pending: List[str] = []
+        self._on_commit: List[Optional[Callable[[], None]]] = []
+        self._cond = threading.Condition()
+        self._due = threading.Event()
+        self._failures = 0
+        self._closed = False
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._writer, daemon=True),
+            threading.Thread(target=self._sender, daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+
+    # -- producer side -----------------------------------------------------
+
+    def put(self, payload: Dict[str, Any], on_commit: Optional[Callable[[], None]] = None) -> None:
+        """Queue `payload`; `on_commit` runs on the writer thread once it is on disk."""
+        with self._cond:
+            while len(self._pending) >= self.max_pending and not self._closed:
+                self._cond.wait()
+            self._pending.append(json.dumps(payload, separators=(",", ":")))
+            self._on_commit.append(on_commit)
+            self._cond.notify_all()
+
+    def _transaction(self, statements: List[Tuple[str, List[Tuple[Any, ...]]]]) -> None:
+        """Run each (sql, rows) with executemany in one transaction; rolls back and raises sqlite3.Error."""
+        with self._db_lock:
+            try:
+                self._db.execute("BEGIN")
+                for sql, rows in statements:
+                    if rows:
+                        self._db.executemany(sql, rows)
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                if self._db.in_transaction:
+                    try:
+                        self._db.execute("ROLLBACK")
+                    except sqlite3.Error:
+                        pass
+                raise
+
+    def _db_retry(self, attempt: int) -> float:
+        return min(_DB_RETRY_MAX, self.flush_interval * (2 ** attempt))
+
+    def _writer(self) -> None:
+        flushed = 0.0
+        errors = 0
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                closed = self._closed
+            # Group commit: at most one transaction per flush_interval
+            wait = flushed + self.flush_interval - time.monotonic()
+            if wait > 0 and not closed:
+                time.sleep(wait)
+            with self._cond:
+                rows, self._pending = self._pending, []
+                callbacks, self._on_commit = self._on_commit, []
+                closed = self._closed
+                self._cond.notify_all()  # room for put()
+            if not rows:
+                if closed:
+                    return
+                continue
+            flushed = time.monotonic()
+            try:
+                self._transaction([("INSERT INTO outbox (payload) VALUES (?)", [(r,) for r in rows])])
+            except sqlite3.Error as e:
+                # Back in front of newer jobs, in order, for the next attempt
+                with self._cond:
+                    self._pending[:0] = rows
+                    self._on_commit[:0] = callbacks
+                delay = self._db_retry(errors)
+                errors += 1
+                print(f"outbox write error, {len(rows)} jobs kept in memory, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                continue
+            errors = 0
+            self._due.set()
+            for callback in callbacks:
+                if callback is not None:
+                    try:
+                        callback()
+                    except Exception as e:
+                        print(f"outbox commit callback error: {e}")
+
+    # -- sender side -------------------------------------------------------
+
+    def backlog(self) -> int:
+        with self._db_lock:
+            row = self._db.execute("SELECT COUNT(*) FROM outbox WHERE state = ?", (PENDING,)).fetchone()
+        with self._cond:
+            return int(row[0]) + len(self._pending)
+
+    def _next_batch(self) -> Tuple[List[Tuple[int, int, str]], Optional[float]]:
+        now = time.time()
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT id, attempts, payload FROM outbox WHERE state = ? AND next_at <= ? ORDER BY id LIMIT ?",
+                (PENDING, now, self.batch_size),
+            ).fetchall()
+            if rows:
+                return rows, None
+            nxt = self._db.execute("SELECT MIN(next_at) FROM outbox WHERE state = ?", (PENDING,)).fetchone()[0]
+        return [], (None if nxt is None else max(0.0, nxt - now))
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.max_backoff, self.base_backoff * (2 ** max(0, attempts - 1)))
+        return random.uniform(delay / 2, delay)
+
+    def _sender(self) -> None:
+        while not self._stop.is_set():
+            try:
+                rows, wait = self._next_batch()
+            except sqlite3.Error as e:
+                print(f"outbox read error: {e}")
+                self._stop.wait(_DB_RETRY_MAX)
+                continue
+            if not rows:
+                self._due.wait(self.flush_interval if wait is None else min(wait, 5.0))
+                self._due.clear()
+                continue
+            try:
+                statuses = list(self.send([json.loads(p) for _, _, p in rows]))
+            except Exception as e:
+                print(f"outbox send error: {e}")
+                statuses = []
+            statuses += [0] * (len(rows) - len(statuses))
+            done, dead, retry = [], [], []
+            now = time.time()
+            for (row_id, attempts, _), status in zip(rows, statuses):
+                if 200 <= status < 300:
+                    done.append((row_id,))
+                elif is_permanent(status):
+                    dead.append((DEAD, status, row_id))
+                else:
+                    retry.append((now + self._backoff(attempts + 1), status, row_id))
+            results = [
+                ("DELETE FROM outbox WHERE id = ?", done),
+                ("UPDATE outbox SET state = ?, attempts = attempts + 1, last_status = ? WHERE id = ?", dead),
+                ("UPDATE outbox SET attempts = attempts + 1, next_at = ?, last_status = ? WHERE id = ?", retry),
+            ]
+            errors = 0
+            while True:
+                try:
+                    self._transaction(results)
+                    break
+                except sqlite3.Error as e:
+                    # Until this is written the rows stay due and would be sent again
+                    delay = self._db_retry(errors)
+                    errors += 1
+                    print(f"outbox write error, retrying in {delay:.1f}s: {e}")
+                    if self._stop.wait(delay):
+                        return
+            self.sent += len(done)
+            self.dead += len(dead)
+            if retry and not done:
+                # Backend looks down: pause the whole sender, not just these rows
+                self._failures += 1
+                self._stop.wait(self._backoff(self._failures))
+            else:
+                self._failures = 0
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Commit pending jobs and stop; unsent rows stay on disk for the next run.
+
+        A send already in flight may finish after `timeout`; the database is
+        then left for the process to close on exit."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._threads[0].join(timeout)
+        self._stop.set()
+        self._due.set()
+        self._threads[1].join(timeout)
+        if not self._threads[1].is_alive():
+            with self._db_lock:
+                self._db.close()
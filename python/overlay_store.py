@@ -0,0 +1,44 @@
+"""
+Pending credential overlays shared between processes.
+
+share() serves a CorrelationIndex (or any object listing its methods in
+EXPOSED) to other processes over a local socket: the print proxy's worker
+processes read the overlays posted to the supervisor's /set. attach()
+returns a proxy with the same methods.
+"""
+
+import os
+from multiprocessing.managers import BaseManager, Server
+from typing import Any, Tuple
+
+
+class _OverlayManager(BaseManager):
+    pass
+
+
+# The client side asks the server which methods the shared store has
+_OverlayManager.register("overlays")
+
+
+def share(store: Any) -> Tuple[Server, Any, bytes]:
+    """A not yet started server for `store`, its address and authkey.
+
+    Run server.serve_forever() in a thread; every attach()ed process then
+    reads and consumes the same overlays. The address is a Unix socket where
+    there is one, so it is never reachable from the network.
+    """
+
+    class Manager(_OverlayManager):
+        pass
+
+    Manager.register("overlays", callable=lambda: store, exposed=store.EXPOSED)
+    authkey = os.urandom(32)
+    server = Manager(authkey=authkey).get_server()
+    return server, server.address, authkey
+
+
+def attach(address: Any, authkey: bytes) -> Any:
+    """Proxy for the store share() serves at `address`; safe to use from several threads."""
+    manager = _OverlayManager(address=address, authkey=authkey)
+    manager.connect()
+    return manager.overlays()
@@ -0,0 +1,100 @@
+"""
+Staged worker pipeline for the ingest agent.
+
+Each stage has a bounded input queue and its own worker threads; a worker
+hands its result to the next stage's queue and blocks while that queue is
+full. A slow stage (typically delivery) therefore pushes back on the stages
+before it, and finally on the event reader, instead of work being dropped.
+A stage function returning None ends that item's trip (e.g. an event that
+is not a print job).
+
+put() takes an optional `done` callback, called once the item has finished:
+it ended its trip, a stage failed on it, or it left the last stage. A stage
+built with acks=True is called as fn(item, done) instead and calls `done`
+itself, e.g. only once the item is on disk.
+"""
+
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+_STOP = object()
+
+
+def _noop() -> None:
+    pass
+
+
+class Stage:
+    def __init__(self, name: str, fn: Callable[..., Any], workers: int = 1, queue_size: int = 100,
+                 acks: bool = False):
+        self.name = name
+        self.fn = fn
+        self.acks = acks
+        self.workers = max(1, int(workers))
+        self.queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.processed = 0
+        self.failed = 0
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+
+class Pipeline:
+    """Runs items through `stages` in order; put() blocks while the first queue is full."""
+
+    def __init__(self, stages: Sequence[Stage]):
+        if not stages:
+            raise ValueError("pipeline needs at least one stage")
+        self.stages = list(stages)
+        self._started = False
+
+    def start(self) -> "Pipeline":
+        if self._started:
+            return self
+        self._started = True
+        for i, stage in enumerate(self.stages):
+            nxt = self.stages[i + 1] if i + 1 < len(self.stages) else None
+            for n in range(stage.workers):
+                t = threading.Thread(target=self._work, args=(stage, nxt), name=f"{stage.name}-{n}", daemon=True)
+                stage._threads.append(t)
+                t.start()
+        return self
+
+    def put(self, item: Any, timeout: Optional[float] = None, done: Optional[Callable[[], None]] = None) -> None:
+        self.stages[0].queue.put((item, done or _noop), timeout=timeout)
+
+    def depths(self) -> Dict[str, int]:
+        return {stage.name: stage.depth() for stage in self.stages}
+
+    @staticmethod
+    def _work(stage: Stage, nxt: Optional[Stage]) -> None:
+        while True:
+            entry = stage.queue.get()
+            if entry is _STOP:
+                return
+            item, done = entry
+            try:
+                out = stage.fn(item, done) if stage.acks else stage.fn(item)
+            except Exception as e:
+                with stage._lock:
+                    stage.failed += 1
+                print(f"{stage.name} stage error: {e}")
+                done()  # dropped, as before; must not hold back what comes after it
+                continue
+            with stage._lock:
+                stage.processed += 1
+            if out is not None and nxt is not None:
+                nxt.queue.put((out, done))  # blocks while the next stage is saturated
+            elif not stage.acks:
+                done()
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Finish queued items stage by stage, then stop the workers."""
+        for stage in self.stages:
+            for _ in stage._threads:
+                stage.queue.put(_STOP)
+            for t in stage._threads:
+                t.join(timeout)
@@ -9,6 +9,32 @@ Local Print Proxy
   headers (pluggable) and forwards to the target printer IP/port.
 - Posts the same credentials to the existing agent local notify API so the
   backend can catalog the job (already implemented in the repo).
+- Counts pages, copies, duplex, paper size and colour of each job while it
+  streams through (job_analyzer) and adds the result to that notification.
+- Queues received jobs per printer (printer_queue): one thread owns each
+  printer's connection, forwards in arrival order and retries with backoff
+  while the printer is busy or unreachable (scheduleJobs, on by default;
+  off forwards each connection directly as before). A streamable job for a
+  printer with nothing queued still streams straight through; only jobs
+  that meet contention, or a printer refusing connections, are spooled.
+- Lets a listener name a pool of equivalent printers ("targets") and picks
+  one per job by least outstanding bytes, round-robin or sticky user, with
+  health checks (printer_pool); the chosen printer is what overlay lookup
+  and the agent notification see.
+- Optionally pre-forks worker processes that share the listener ports with
+  SO_REUSEPORT ("workers"; proxy_workers); overlays posted to /set stay in
+  the supervisor and workers read them over a local socket.
+- Splits a connection that carries several jobs at their PJL/UEL boundaries
+  (job_splitter; splitJobs, on by default): each job gets its own target,
+  overlay, injection and notification. A client pausing inside a
+  JOB ... EOJ bracket is waited for up to jobIdleSeconds instead of having
+  its job cut after clientIdleSeconds.
+- Reloads print_proxy.config.json when it changes (configReloadSeconds;
+  hot_config, proxy_config): the file is checked and compiled into
+  read-only tables, connections keep the version they started with, and
+  listeners added to or removed from "listeners" are bound or closed
+  without a restart. An invalid edit is reported and the running config
+  stays.
 
 This is vendor-agnostic plumbing. Vendor-specific injection is handled via
 simple strategy functions selected per printer profile.
@@ -18,16 +44,32 @@ Do not expose it to the network. Per-job credentials are kept in-memory only
 for the duration of the job processing.
 """
 
+import asyncio
+import contextlib
 import os
+import signal
 import sys
 import json
 import socket
 import threading
 import time
-from http.server import BaseHTTPRequestHandler, HTTPServer
-from typing import Dict, Any, Optional, Tuple
+from typing import Callable, Dict, Any, List, Optional, Tuple
 import socketserver
-import urllib.request
+import tempfile
+
+from http_pool import HttpPool
+from job_analyzer import JobAnalyzer
+from job_buffers import JobPart, as_parts, release, send_parts, send_parts_async, spool_region
+from job_splitter import JobStream
+from local_http import LocalHandler, bulk_reply, overlay_items, serve_local
+from metrics import CONTENT_TYPE, REGISTRY, render_families
+from correlation_index import CorrelationIndex
+from hot_config import ConfigError, HotConfig, file_stamp
+from overlay_store import attach, share
+from printer_pool import STRATEGIES, PoolMember, PrinterPool
+from printer_queue import PrinterQueue, QueuedJob, Scheduler, SpoolBudget, SpoolFull
+from proxy_workers import WorkerSet, answer_supervisor, shared_lock
+from proxy_config import ListenerPlan, ProxyConfig, TargetPlan, compile_config
 
 
 def _base_dir() -> str:
@@ -48,10 +90,12 @@ def _read_json(path: str) -> Dict[str, Any]:
 
 
 CONFIG_PATH = os.environ.get("PRINT_PROXY_CONFIG", os.path.join(BASE_DIR, "print_proxy.config.json"))
+CONFIG_STAMP = file_stamp(CONFIG_PATH)
 CONFIG: Dict[str, Any] = _read_json(CONFIG_PATH)
 
 
 def cfg(key: str, default: Any = None):
+    # Process-wide settings read at startup; per-connection ones come from current_config()
     v = CONFIG.get(key)
     return default if v is None else v
 
@@ -59,16 +103,27 @@ def cfg(key: str, default: Any = None):
 class VendorInjector:
     """Strategy for injecting accounting info into RAW job bytes.
 
-    Each function takes (job_bytes, account_username, account_password, profile)
-    and returns possibly-modified bytes.
+    Each function takes (job, account_username, account_password, profile) and
+    returns the job to send as a list of parts (bytes, memoryview or
+    job_buffers.FileRegion); a plain bytes result is accepted too. `job` is a
+    view of the spooled job, so injectors that only wrap it should return it
+    as one part rather than concatenating (job_buffers.part_bytes() gives the
+    bytes to injectors that really rewrite it).
+
+    Injectors that only wrap the job also provide a framer in FRAMERS returning
+    (preamble, trailer), which lets the proxy stream the job body untouched.
     """
 
     @staticmethod
-    def none(job: bytes, user: str, pwd: str, profile: Dict[str, Any]) -> bytes:
-        return job
+    def none(job: JobPart, user: str, pwd: str, profile: Dict[str, Any]) -> List[JobPart]:
+        return [job]
+
+    @staticmethod
+    def none_frame(user: str, pwd: str, profile: Dict[str, Any]) -> Tuple[bytes, bytes]:
+        return b"", b""
 
     @staticmethod
-    def pjl_header(job: bytes, user: str, pwd: str, profile: Dict[str, Any]) -> bytes:
+    def pjl_frame(user: str, pwd: str, profile: Dict[str, Any]) -> Tuple[bytes, bytes]:
         # Basic PJL preamble. Real models require precise keys; this is a placeholder.
         # Example keys (vary by vendor): SET DEPT=xxxx, SET USERNAME=..., SET ACCT=...
         lines = [
@@ -89,7 +144,12 @@ class VendorInjector:
         lines.append(b"@PJL ENTER LANGUAGE = PCL\r\n")
         preamble = b"".join(lines)
         trailer = b"\x1B%-12345X"  # Universal reset
-        return preamble + job + trailer
+        return preamble, trailer
+
+    @staticmethod
+    def pjl_header(job: JobPart, user: str, pwd: str, profile: Dict[str, Any]) -> List[JobPart]:
+        preamble, trailer = VendorInjector.pjl_frame(user, pwd, profile)
+        return [preamble, job, trailer]
 
 
 INJECTORS = {
@@ -97,205 +157,1110 @@ INJECTORS = {
     "pjl": VendorInjector.pjl_header,
 }
 
+FRAMERS = {
+    "none": VendorInjector.none_frame,
+    "pjl": VendorInjector.pjl_frame,
+}
+
+
+def _compile(raw: Dict[str, Any]) -> ProxyConfig:
+    conf = compile_config(raw, INJECTORS, FRAMERS, STRATEGIES)
+    _attach_pools(conf)
+    return conf
+
+
+LIVE_CONFIG: HotConfig[ProxyConfig] = HotConfig(CONFIG_PATH, _compile, float(cfg("configReloadSeconds", 2) or 0),
+                                                CONFIG_STAMP)
+_FIRST_LOAD_LOCK = threading.Lock()
+
+
+def current_config() -> ProxyConfig:
+    """The config snapshot to use for a whole connection; compiled from CONFIG on first use."""
+    conf = LIVE_CONFIG.current
+    if conf is None:
+        with _FIRST_LOAD_LOCK:
+            conf = LIVE_CONFIG.current or LIVE_CONFIG.load(CONFIG)
+    return conf
+
+
+# Keep-alive connections for agent notifications
+HTTP = HttpPool(max_connections=int(cfg("agentNotifyConnections", 2) or 2), timeout=5)
+
 
 def http_post(url: str, headers: Dict[str, str], data: Dict[str, Any]) -> Tuple[int, str]:
     body = json.dumps(data).encode("utf-8")
-    req = urllib.request.Request(url, data=body, method="POST")
-    for k, v in headers.items():
-        req.add_header(k, v)
-    req.add_header("Content-Type", "application/json")
     try:
-        with urllib.request.urlopen(req, timeout=5) as resp:
-            text = resp.read().decode("utf-8", errors="ignore")
-            return resp.getcode() or 0, text
+        status, text = HTTP.post(url, body, {**headers, "Content-Type": "application/json"})
+        return status, text.decode("utf-8", errors="ignore")
     except Exception as e:
         return 0, str(e)
 
 
-class CredentialServer(BaseHTTPRequestHandler):
+# Served as Prometheus text at GET /metrics on the credential HTTP port
+JOBS = REGISTRY.counter("print_proxy_jobs_total", "RAW jobs received", ("listener",))
+BYTES = REGISTRY.counter("print_proxy_bytes_total", "Job bytes received from clients", ("listener",))
+UPSTREAM_ERRORS = REGISTRY.counter("print_proxy_upstream_errors_total", "Jobs whose printer connection failed", ("listener",))
+FORWARD_SECONDS = REGISTRY.histogram("print_proxy_forward_seconds", "First job byte to printer connection closed", ("listener",))
+ACTIVE_CONNECTIONS = REGISTRY.gauge("print_proxy_active_connections", "Open client connections", ("listener",))
+OVERLAYS = REGISTRY.counter("print_proxy_overlays_total",
+                            "Overlays received on /set, applied to a job or expired unused; jobs without one (unmatched)",
+                            ("result",))
+PENDING_OVERLAYS = REGISTRY.gauge("print_proxy_pending_overlays", "Overlays waiting for a job")
+PAGES = REGISTRY.counter("print_proxy_pages_total", "Pages counted by the job analyser", ("listener", "type"))
+# Per-printer queues (scheduleJobs)
+QUEUE_WAIT = REGISTRY.histogram("print_proxy_queue_wait_seconds", "Job queued to its turn on the printer", ("printer",))
+PRINTER_FORWARD_SECONDS = REGISTRY.histogram("print_proxy_printer_forward_seconds",
+                                             "Printer connection opened to job confirmed, last attempt", ("printer",))
+QUEUE_DEPTH = REGISTRY.gauge("print_proxy_queue_depth", "Jobs accepted and waiting for their printer", ("printer",))
+QUEUE_REJECTED = REGISTRY.counter("print_proxy_queue_rejected_total",
+                                  "Connections closed unread because the printer queue or spool stayed full", ("printer",))
+FORWARD_RETRIES = REGISTRY.counter("print_proxy_forward_retries_total", "Failed printer attempts that were retried", ("printer",))
+FORWARD_FAILED = REGISTRY.counter("print_proxy_forward_failed_total", "Jobs dropped after retryForSeconds", ("printer",))
+SPOOL_BYTES = REGISTRY.gauge("print_proxy_spool_bytes", "Bytes of accepted jobs not yet forwarded")
+# Printer pools (listeners with "targets")
+POOL_JOBS = REGISTRY.counter("print_proxy_pool_jobs_total", "Jobs sent to each pool member", ("pool", "printer"))
+POOL_MEMBER_UP = REGISTRY.gauge("print_proxy_pool_member_up", "1 while the pool member passes health checks",
+                                ("pool", "printer"))
+POOL_OUTSTANDING_BYTES = REGISTRY.gauge("print_proxy_pool_outstanding_bytes",
+                                        "Job bytes spooled for the pool member and not yet forwarded", ("pool", "printer"))
+
+
+class CredentialServer(LocalHandler):
     """Minimal local HTTP server to receive per-job credentials from your app UI.
 
     POST /set
       { token, deviceIP, deviceName, accountUsername, accountPassword, type, quantity }
+      or an array of such records, or { token, overlays: [...] }, answered
+      with { accepted: N }
 
-    The record is kept for a short TTL and retrieved by the print path using
-    deviceIP or deviceName.
+    The record is kept for a short TTL and matched to a job by the print
+    path using deviceIP or deviceName: several may wait for one printer,
+    and each job takes the oldest (correlation_index). Connections are kept alive and served
+    concurrently (local_http).
+
+    GET /metrics
+      Prometheus text for the proxy's counters and histograms, including
+      those of every worker process (labelled worker="N").
     """
 
-    pending: Dict[str, Dict[str, Any]] = {}
+    pending = CorrelationIndex(ttl=int(cfg("pendingTtlSeconds", 300)), window=cfg("matchWindowSeconds"),
+                               late=float(cfg("matchLateSeconds", 10)),
+                               on_expire=lambda data: OVERLAYS.labels("expired").inc())
+    PENDING_OVERLAYS.set_function(pending.__len__)
+    workers: Optional[WorkerSet] = None
+
+    @staticmethod
+    def put_pending(keys: List[str], data: Dict[str, Any]):
+        CredentialServer.pending.add(keys, data)
 
     @staticmethod
-    def put_pending(key: str, data: Dict[str, Any]):
-        data = {**data, "_ts": int(time.time())}
-        CredentialServer.pending[key] = data
+    def get_pending(keys: List[str]) -> Optional[Dict[str, Any]]:
+        return CredentialServer.pending.match(keys)
 
     @staticmethod
-    def get_pending(key: str) -> Optional[Dict[str, Any]]:
-        now = int(time.time())
-        prune_before = now - int(cfg("pendingTtlSeconds", 300))
-        for k in list(CredentialServer.pending.keys()):
-            if int(CredentialServer.pending[k].get("_ts", 0)) < prune_before:
-                CredentialServer.pending.pop(k, None)
-        return CredentialServer.pending.pop(key, None)
-
-    def _ok(self):
-        self.send_response(200)
-        self.end_headers()
-
-    def _unauthorized(self):
-        self.send_response(401)
-        self.end_headers()
-
-    def _notfound(self):
-        self.send_response(404)
-        self.end_headers()
+    def overlay_info(data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "accountUsername": str(data.get("accountUsername") or ""),
+            "accountPassword": str(data.get("accountPassword") or ""),
+            "type": str(data.get("type") or ""),
+            "quantity": int(data.get("quantity") or 0),
+            "deviceName": str(data.get("deviceName") or ""),
+            "deviceIP": str(data.get("deviceIP") or ""),
+        }
+
+    def do_GET(self):  # type: ignore
+        if self.path != "/metrics":
+            self.reply(404)
+            return
+        workers = CredentialServer.workers
+        body = render_families([REGISTRY.families()] + (workers.metrics() if workers else [])).encode("utf-8")
+        self.reply(200, body, CONTENT_TYPE)
 
     def do_POST(self):  # type: ignore
         try:
+            raw = self.read_body()
             if self.path != "/set":
-                self._notfound()
+                self.reply(404)
                 return
-            length = int(self.headers.get("Content-Length", "0"))
-            raw = self.rfile.read(length).decode("utf-8", errors="ignore") if length > 0 else "{}"
-            data = json.loads(raw)
-            token = self.headers.get("x-proxy-token") or str(data.get("token") or "")
-            expected = str(cfg("localProxyToken", ""))
-            if expected and token != expected:
-                self._unauthorized()
+            items, token, bulk = overlay_items(json.loads(raw or b"{}"))
+            expected = current_config().proxy_token
+            header = self.headers.get("x-proxy-token")
+            if expected and any((header or str(item.get("token") or "") or token) != expected for item in items):
+                self.reply(401)
                 return
-            device_ip = str(data.get("deviceIP") or "")
-            device_name = str(data.get("deviceName") or "")
-            info = {
-                "accountUsername": str(data.get("accountUsername") or ""),
-                "accountPassword": str(data.get("accountPassword") or ""),
-                "type": str(data.get("type") or ""),
-                "quantity": int(data.get("quantity") or 0),
-                "deviceName": device_name,
-                "deviceIP": device_ip,
-            }
-            if device_ip:
-                CredentialServer.put_pending(f"ip:{device_ip}", info)
-            if device_name:
-                CredentialServer.put_pending(f"name:{device_name.lower()}", info)
-            self._ok()
+            infos = [self.overlay_info(item) for item in items]
         except Exception:
-            self.send_response(400)
-            self.end_headers()
-
-    def log_message(self, format, *args):  # silence default HTTP logging
-        return
+            self.reply(400)
+            return
+        for info in infos:
+            CredentialServer.put_pending(overlay_keys(info["deviceIP"], info["deviceName"]), info)
+        OVERLAYS.labels("received").inc(len(infos))
+        self.reply(200, bulk_reply(len(infos)) if bulk else b"")
 
 
 def start_http_server() -> threading.Thread:
     port = int(cfg("localHttpPort", 57991) or 57991)
-    server = socketserver.TCPServer(("127.0.0.1", port), CredentialServer)
-    t = threading.Thread(target=server.serve_forever, daemon=True)
-    t.start()
-    return t
-
+    return serve_local(port, CredentialServer, int(cfg("httpBacklog", 1024) or 1024),
+                       float(cfg("httpIdleSeconds", 30) or 30))
 
-def get_profile_for_target(device_ip: str) -> Dict[str, Any]:
-    profiles = cfg("printerProfiles", {}) or {}
-    return profiles.get(device_ip, profiles.get("default", {}))
 
-
-def notify_agent_overlay(info: Dict[str, Any]):
+def notify_agent_overlay(info: Dict[str, Any], conf: ProxyConfig):
     # Forward to existing agent local notify so backend links credentials to the job
-    port = int(cfg("agentNotifyPort", 57981) or 57981)
-    token = str(cfg("agentNotifyToken", "") or "")
-    url = f"http://127.0.0.1:{port}/notify"
     headers = {}
-    if token:
-        headers["x-agent-token"] = token
-    http_post(url, headers, info)
+    if conf.notify_token:
+        headers["x-agent-token"] = conf.notify_token
+    http_post(conf.notify_url, headers, info)
+
+
+def overlay_notice(listener: ListenerPlan, device_ip: str, overlay: Optional[Dict[str, Any]],
+                   analysis: Optional[Dict[str, Any]] = None,
+                   member: Optional[PoolMember] = None) -> Dict[str, Any]:
+    overlay = overlay or {}
+    notice = {
+        "deviceIP": device_ip,
+        "deviceName": listener.device_name,
+        "type": str(overlay.get("type") or ""),
+        "quantity": int(overlay.get("quantity") or 0),
+        "accountUsername": str(overlay.get("accountUsername") or ""),
+        "accountPassword": str(overlay.get("accountPassword") or ""),
+    }
+    if analysis:
+        notice["analysis"] = analysis
+    if member is not None:
+        # the pool member that printed it; deviceName stays the listener's, which the agent matches on
+        notice["targetIP"] = member.ip
+        notice["targetName"] = member.name
+    return notice
+
+
+def new_analyzer(conf: ProxyConfig) -> Optional[JobAnalyzer]:
+    return JobAnalyzer() if conf.analyze_jobs else None
+
+
+def finish_analysis(analyzer: Optional[JobAnalyzer], label: str) -> Optional[Dict[str, Any]]:
+    """The analyser's result, or None when disabled, the job was empty or no pages were found."""
+    if analyzer is None or not analyzer.bytes:
+        return None
+    try:
+        analysis = analyzer.result()
+    except Exception:
+        return None
+    if not analysis["pages"]:
+        return None
+    PAGES.labels(label, analysis["type"]).inc(analysis["quantity"])
+    return analysis
+
+
+def frame_job(target: TargetPlan, overlay: Optional[Dict[str, Any]]) -> Tuple[bytes, bytes]:
+    account_user = str(overlay.get("accountUsername") or "") if overlay else ""
+    account_pwd = str(overlay.get("accountPassword") or "") if overlay else ""
+    try:
+        return target.framer(account_user, account_pwd, target.profile)
+    except Exception:
+        return b"", b""
+
+
+def inject_job(target: TargetPlan, job: JobPart, overlay: Optional[Dict[str, Any]]) -> List[JobPart]:
+    account_user = str(overlay.get("accountUsername") or "") if overlay else ""
+    account_pwd = str(overlay.get("accountPassword") or "") if overlay else ""
+    try:
+        return as_parts(target.injector(job, account_user, account_pwd, target.profile))
+    except Exception:
+        return [job]
+
+
+def spool_job_parts(spool: Any, total: int, target: TargetPlan, overlay: Optional[Dict[str, Any]]) -> List[JobPart]:
+    """The spooled job plus its injected headers, without copying the job body."""
+    job = spool_region(spool, total)
+    if target.framer is not None:
+        preamble, trailer = frame_job(target, overlay)
+        return [preamble, job, trailer]
+    return inject_job(target, job, overlay)
+
+
+_SCHEDULER: Optional[Scheduler] = None
+# "ip:port" -> lock shared by the worker processes, so each printer still sees one connection
+_CONNECTION_LOCKS: Dict[str, Any] = {}
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def get_scheduler(conf: ProxyConfig) -> Optional[Scheduler]:
+    """The per-printer queues, or None when scheduleJobs is off (direct forwarding)."""
+    global _SCHEDULER
+    if not conf.get("scheduleJobs", True):
+        return None
+    if _SCHEDULER is None:
+        with _SCHEDULER_LOCK:
+            if _SCHEDULER is None:
+                budget = SpoolBudget(int(cfg("spoolMaxBytes", 1024 * 1024 * 1024)))
+                SPOOL_BYTES.set_function(lambda: budget.used)
+                _SCHEDULER = Scheduler(
+                    budget,
+                    on_new=lambda q: QUEUE_DEPTH.labels(q.name).set_function(q.depth),
+                    locks=_CONNECTION_LOCKS,
+                    max_jobs=int(cfg("queueMaxJobs", 32) or 32),
+                    connect_timeout=float(cfg("upstreamConnectSeconds", 10)),
+                    confirm_timeout=float(cfg("upstreamConfirmSeconds", 2)),
+                    retry_initial=float(cfg("retryInitialSeconds", 0.5)),
+                    retry_max=float(cfg("retryMaxSeconds", 10)),
+                    retry_for=float(cfg("retryForSeconds", 300)),
+                    on_done=_job_forwarded,
+                    on_retry=_forward_retried,
+                )
+    return _SCHEDULER
+
+
+def _job_forwarded(q: PrinterQueue, job: QueuedJob, ok: bool, waited: float, forward_s: float, attempts: int) -> None:
+    QUEUE_WAIT.labels(q.name).observe(waited)
+    PRINTER_FORWARD_SECONDS.labels(q.name).observe(forward_s)
+    FORWARD_SECONDS.labels(job.label).observe(time.perf_counter() - job.received_at)
+    if ok:
+        pool_health(q.name, True)
+    else:
+        FORWARD_FAILED.labels(q.name).inc()
+        UPSTREAM_ERRORS.labels(job.label).inc()
+
+
+def _forward_retried(q: PrinterQueue, error: Exception) -> None:
+    FORWARD_RETRIES.labels(q.name).inc()
+    pool_health(q.name, False)
+
+
+def enqueue_job(printer: PrinterQueue, budget: SpoolBudget, spool: Any, total: int, started: float, label: str,
+                target: TargetPlan, overlay: Optional[Dict[str, Any]]) -> None:
+    """Hand a spooled job (and its admitted slot) to the printer's queue, which closes the spool."""
+    parts = spool_job_parts(spool, total, target, overlay)
+    pool_load(printer.name, total)
+
+    def cleanup() -> None:
+        release(parts)
+        spool.close()
+        budget.release(total)
+        pool_load(printer.name, -total)
+
+    printer.put(QueuedJob(parts, total, label, started or time.perf_counter(), cleanup))
+
+
+# Printer pools, one per listener with "targets", attached to the listener's
+# plan when a config is compiled. A reload that keeps a listener's targets and
+# balance keeps its pool, with the members' health and load; pools the new
+# config no longer uses are closed once it is live. Pool members are also
+# indexed by "ip:port" so the queues, which only know the printer, can report
+# load and forward failures back to every pool holding it.
+_POOLS: Dict[Tuple[Any, ...], PrinterPool] = {}
+_POOL_MEMBERS: Dict[str, List[Tuple[PrinterPool, PoolMember]]] = {}
+_POOLS_LOCK = threading.Lock()
+_LISTENERS: Optional["Listeners"] = None  # set in the process that serves the RAW ports
+
+
+def _attach_pools(conf: ProxyConfig) -> None:
+    with _POOLS_LOCK:
+        for plan in conf.listeners.values():
+            key = plan.pool_key
+            if key is None:
+                continue
+            if key not in _POOLS:
+                _POOLS[key] = _build_pool(plan, conf)
+            plan.pool = _POOLS[key]
+            if _LISTENERS is not None:
+                plan.pool.start()  # health checks only where the listeners are served
+
+
+def _build_pool(plan: ListenerPlan, conf: ProxyConfig) -> PrinterPool:
+    pool = PrinterPool(plan.device_name or str(plan.port),
+                       [PoolMember(ip, port, name) for ip, port, name in plan.members],
+                       plan.balance,
+                       probe_interval=float(conf.get("healthCheckSeconds", 10)),
+                       probe_timeout=float(conf.get("healthCheckTimeoutSeconds", 2)),
+                       fail_after=int(conf.get("healthCheckFailures", 2) or 2))
+    for member in pool.members:
+        # replaced, not appended to: pool_load() iterates it without the lock
+        _POOL_MEMBERS[member.key] = _POOL_MEMBERS.get(member.key, []) + [(pool, member)]
+        POOL_MEMBER_UP.labels(pool.name, member.key).set_function(lambda m=member: int(m.healthy))
+        POOL_OUTSTANDING_BYTES.labels(pool.name, member.key).set_function(lambda m=member: m.outstanding_bytes)
+    return pool
+
+
+def _retire_pools(conf: ProxyConfig) -> None:
+    """Close the pools `conf` no longer uses; their jobs in flight finish on them."""
+    used = {plan.pool_key for plan in conf.listeners.values()}
+    with _POOLS_LOCK:
+        retired = [_POOLS.pop(key) for key in list(_POOLS) if key not in used]
+        labels = {(pool.name, m.key) for pool in _POOLS.values() for m in pool.members}
+        for pool in retired:
+            pool.close()
+            for member in pool.members:
+                rest = [entry for entry in _POOL_MEMBERS.get(member.key, ()) if entry[0] is not pool]
+                if rest:
+                    _POOL_MEMBERS[member.key] = rest
+                else:
+                    _POOL_MEMBERS.pop(member.key, None)
+                if (pool.name, member.key) not in labels:
+                    for gauge in (POOL_MEMBER_UP, POOL_OUTSTANDING_BYTES):
+                        gauge.labels(pool.name, member.key).set_function(None)
+                        gauge.labels(pool.name, member.key).set(0)
+
+
+def pool_load(printer: str, n: int) -> None:
+    """Count n spooled bytes (negative once forwarded) against the pool members for printer "ip:port"."""
+    for pool, member in _POOL_MEMBERS.get(printer, ()):
+        pool.add_bytes(member, n)
+
+
+def pool_health(printer: str, ok: bool) -> None:
+    for pool, member in _POOL_MEMBERS.get(printer, ()):
+        pool.mark(member, ok)
+
+
+def overlay_keys(device_ip: str = "", device_name: str = "", pool: Optional[PrinterPool] = None) -> List[str]:
+    """ip:/name: keys overlays are posted and looked up under."""
+    keys = [f"ip:{device_ip}"] if device_ip else []
+    if device_name:
+        keys.append(f"name:{device_name.lower()}")
+    if pool is not None:
+        # the app may have posted it for another printer of the same pool
+        keys += [f"ip:{m.ip}" for m in pool.members]
+    return keys
+
+
+def _pending_user(listener: ListenerPlan, pool: PrinterPool) -> str:
+    """The billing user of the overlay waiting for this listener, without taking it."""
+    overlay = CredentialServer.pending.peek(overlay_keys("", listener.device_name, pool))
+    return str(overlay.get("accountUsername") or "") if overlay else ""
+
+
+def choose_target(listener: ListenerPlan) -> Tuple[str, int, Optional[PrinterPool], Optional[PoolMember]]:
+    """(ip, port, pool, member) to print to; pool and member are None for single-target listeners.
+
+    A chosen member counts as busy until pool.release(member).
+    """
+    pool = listener.pool
+    if pool is None:
+        return listener.target_ip, listener.target_port, None, None
+    member = pool.choose(_pending_user(listener, pool) if pool.strategy == "sticky-user" else "")
+    POOL_JOBS.labels(pool.name, member.key).inc()
+    return member.ip, member.port, pool, member
+
+
+def lookup_overlay(device_ip: str, listener: ListenerPlan,
+                   pool: Optional[PrinterPool] = None) -> Optional[Dict[str, Any]]:
+    overlay = CredentialServer.get_pending(overlay_keys(device_ip, listener.device_name, pool))
+    OVERLAYS.labels("applied" if overlay else "unmatched").inc()
+    return overlay
+
+
+def _confirm(upstream: socket.socket, timeout: float) -> None:
+    """Half-close and wait up to `timeout` for the printer's FIN, as PrinterQueue does after a job."""
+    upstream.shutdown(socket.SHUT_WR)
+    upstream.settimeout(timeout)
+    try:
+        while upstream.recv(4096):
+            pass
+    except OSError:  # timeout, or a reset once the whole job is sent
+        pass
 
 
 class RawProxyHandler(socketserver.BaseRequestHandler):
     def handle(self):  # type: ignore
-        # Determine target from config (single target or by port mapping)
-        listen_name = str(self.server.server_address[1])  # port as string
-        listeners = cfg("listeners", {}) or {}
-        listener = listeners.get(listen_name, {})
-        device_ip = str(listener.get("targetIP") or cfg("defaultTargetIP", ""))
-        device_port = int(listener.get("targetPort") or cfg("defaultTargetPort", 9100) or 9100)
-
-        # Read entire job into memory; for large jobs, consider streaming with temp file
-        self.request.settimeout(30)
-        chunks = []
-        total = 0
+        port = self.server.server_address[1]
+        self.label = str(port)
+        active = ACTIVE_CONNECTIONS.labels(self.label)
+        active.inc()
+        try:
+            self._handle(port)
+        finally:
+            active.dec()
+
+    def _handle(self, port: int) -> None:
+        # The connection keeps this config version to the end, even across a reload
+        self.conf = conf = current_config()
+        listener = conf.listener(port)
+        self.request.settimeout(conf.client_idle)
+        self.jobs = JobStream(split=conf.split_jobs)
+        self.buf = memoryview(bytearray(conf.chunk_bytes))
+        # One pass per job on the connection; each picks its own target and overlay
+        while self._next_job():
+            ip, target_port, self.pool, member = choose_target(listener)
+            try:
+                self._serve(listener, ip, target_port, member)
+            finally:
+                if member is not None:
+                    self.pool.release(member)
+            while self._read():
+                pass  # what is left of a job over maxJobBytes
+
+    def _serve(self, listener: ListenerPlan, device_ip: str, device_port: int,
+               member: Optional[PoolMember]) -> None:
+        conf = self.conf
+        # Injector from the printer's profile
+        target = conf.target(device_ip)
+        max_bytes = conf.max_job_bytes
+        self.analyzer = new_analyzer(conf)
+        scheduler = get_scheduler(conf)
+        if scheduler is not None:
+            printer = scheduler.queue_for(device_ip, device_port)
+            upstream = self._claim(printer, target, device_ip, device_port)
+            if upstream is not None:
+                try:
+                    overlay = self._stream_job(listener, device_ip, device_port, target, max_bytes, upstream,
+                                               printer.confirm_timeout)
+                finally:
+                    printer.unclaim()
+            else:
+                overlay = self._queue_job(scheduler, printer, listener, device_ip, target, max_bytes)
+        elif conf.stream_jobs and target.framer is not None:
+            overlay = self._stream_job(listener, device_ip, device_port, target, max_bytes)
+        else:
+            overlay = self._spool_job(listener, device_ip, device_port, target, max_bytes)
+        analysis = finish_analysis(self.analyzer, self.label)
+
+        # Notify agent for DB cataloging (best-effort)
+        if overlay or analysis:
+            notify_agent_overlay(overlay_notice(listener, device_ip, overlay, analysis, member), conf)
+
+    def _fill(self) -> None:
+        """Receive the next chunk into the connection's buffer and push it to the job stream.
+
+        A client silent for clientIdleSeconds is taken as done, unless it is
+        inside a bracketed job; then it gets jobIdleSeconds in all.
+        """
+        deadline = None
         while True:
             try:
-                data = self.request.recv(64 * 1024)
+                n = self.request.recv_into(self.buf)
             except socket.timeout:
-                break
-            if not data:
-                break
-            chunks.append(data)
-            total += len(data)
-            # small safety cap
-            if total > int(cfg("maxJobBytes", 50 * 1024 * 1024)):
-                break
-        job = b"".join(chunks)
-
-        # Fetch pending credentials for this device
-        overlay = CredentialServer.get_pending(f"ip:{device_ip}") if device_ip else None
-        if (not overlay) and listener.get("deviceName"):
-            overlay = CredentialServer.get_pending(f"name:{str(listener.get('deviceName')).lower()}")
-        account_user = str(overlay.get("accountUsername") or "") if overlay else ""
-        account_pwd = str(overlay.get("accountPassword") or "") if overlay else ""
-
-        # Choose injector based on profile
-        profile = get_profile_for_target(device_ip)
-        injector_name = str(profile.get("injector") or "none")
-        injector = INJECTORS.get(injector_name, VendorInjector.none)
+                if self.jobs.in_job:
+                    if deadline is None:
+                        deadline = time.monotonic() + self.conf.job_idle
+                    if time.monotonic() < deadline:
+                        continue
+                n = 0
+            self.jobs.push(self.buf[:n])
+            return
+
+    def _next_job(self) -> bool:
+        started = self.jobs.next_job()
+        while started is None:
+            self._fill()
+            started = self.jobs.next_job()
+        return started
+
+    def _read(self) -> JobPart:
+        """The current job's next part, b"" once it is over; valid until the next call."""
+        part = self.jobs.read()
+        while part is None:
+            self._fill()
+            part = self.jobs.read()
+        return part
+
+    def _claim(self, printer: PrinterQueue, target: TargetPlan, device_ip: str,
+               device_port: int) -> Optional[socket.socket]:
+        """A connection to the printer for streaming this job straight through, or None to queue it.
+
+        Only when the job can stream and the printer has nothing queued or
+        being sent; a printer that refuses the connection gets the job
+        through its queue, with retries.
+        """
+        if not (self.conf.stream_jobs and target.framer is not None) or not printer.claim():
+            return None
         try:
-            out_job = injector(job, account_user, account_pwd, profile)
-        except Exception:
-            out_job = job
+            return socket.create_connection((device_ip, device_port), timeout=printer.connect_timeout)
+        except OSError:
+            printer.unclaim()
+            return None
 
-        # Forward to real printer
+    def _stream_job(self, listener: ListenerPlan, device_ip: str, device_port: int,
+                    target: TargetPlan, max_bytes: int, upstream: Optional[socket.socket] = None,
+                    confirm: float = 0.0) -> Optional[Dict[str, Any]]:
+        """Pipe the job to the printer as it arrives.
+
+        The upstream connection, unless given, is opened once the first bytes
+        are in and the overlay is resolved; every chunk is received into the
+        same buffer and the preamble goes out in one sendmsg() with the first
+        chunk. With `confirm`, the printer's FIN is awaited as PrinterQueue
+        does, so the next job does not find it still busy.
+        """
+        data = self._read()
+        if not data:
+            self._close(upstream)
+            return None
+        started = time.perf_counter()
+        JOBS.labels(self.label).inc()
+        received = BYTES.labels(self.label)
+        overlay = lookup_overlay(device_ip, listener, self.pool)
+        preamble, trailer = frame_job(target, overlay)
+
+        if upstream is None:
+            try:
+                upstream = socket.create_connection((device_ip, device_port), timeout=10)
+            except Exception:
+                upstream = None
+
+        head = [preamble]
+        analyzer = self.analyzer
+        total = 0
+        while data:
+            n = len(data)
+            # small safety cap: anything beyond maxJobBytes is read but not forwarded
+            if total < max_bytes and upstream is not None:
+                try:
+                    send_parts(upstream, head + [data[:max_bytes - total]])
+                    head = []
+                except Exception:
+                    upstream = self._close(upstream)
+            if analyzer is not None:
+                analyzer.feed(data)
+            total += n
+            received.inc(n)
+            data = self._read()
+
+        if upstream is not None:
+            try:
+                send_parts(upstream, head + [trailer])
+                if confirm:
+                    _confirm(upstream, confirm)
+            except Exception:
+                pass
+            self._close(upstream)
+        else:
+            UPSTREAM_ERRORS.labels(self.label).inc()
+        FORWARD_SECONDS.labels(self.label).observe(time.perf_counter() - started)
+        return overlay
+
+    def _receive(self, spool: Any, max_bytes: int, budget: Optional[SpoolBudget] = None) -> Tuple[int, float]:
+        """Read the job into `spool`; returns (bytes, perf_counter() of the first byte).
+
+        With a budget every chunk is reserved before it is stored, so a full
+        spool stops reading from the client; on error the reservation is undone.
+        """
+        total = 0
+        started = 0.0
+        wait = self.conf.spool_wait
+        try:
+            while total <= max_bytes:
+                data = self._read()
+                if not data:
+                    break
+                if budget is not None and not budget.reserve(len(data), wait):
+                    raise SpoolFull(f"{budget.used} bytes spooled")
+                if not total:
+                    started = time.perf_counter()
+                total += len(data)
+                spool.write(data)
+                if self.analyzer is not None:
+                    self.analyzer.feed(data)
+        except BaseException:
+            if budget is not None:
+                budget.release(total)
+            raise
+        if total:
+            JOBS.labels(self.label).inc()
+            BYTES.labels(self.label).inc(total)
+        return total, started
+
+    def _queue_job(self, scheduler: Scheduler, printer: PrinterQueue, listener: ListenerPlan, device_ip: str,
+                   target: TargetPlan, max_bytes: int) -> Optional[Dict[str, Any]]:
+        """Spool the job and queue it for the printer's connection owner (scheduleJobs)."""
+        if not printer.admit(timeout=self.conf.queue_admit):
+            QUEUE_REJECTED.labels(printer.name).inc()
+            return None
+        spool = tempfile.SpooledTemporaryFile(max_size=self.conf.spool_threshold)
+        total = 0
         try:
-            with socket.create_connection((device_ip, device_port), timeout=10) as s:
-                s.sendall(out_job)
+            total, started = self._receive(spool, max_bytes, scheduler.budget)
+            overlay = lookup_overlay(device_ip, listener, self.pool)
+            enqueue_job(printer, scheduler.budget, spool, total, started, self.label, target, overlay)
         except Exception:
-            pass
+            QUEUE_REJECTED.labels(printer.name).inc()
+            printer.cancel()
+            scheduler.budget.release(total)
+            spool.close()
+            return None
+        return overlay
 
-        # Notify agent for DB cataloging (best-effort)
-        if overlay:
-            info = {
-                "deviceIP": device_ip,
-                "deviceName": str(listener.get("deviceName") or ""),
-                "type": str(overlay.get("type") or ""),
-                "quantity": int(overlay.get("quantity") or 0),
-                "accountUsername": account_user,
-                "accountPassword": account_pwd,
-            }
-            notify_agent_overlay(info)
+    def _spool_job(self, listener: ListenerPlan, device_ip: str, device_port: int,
+                   target: TargetPlan, max_bytes: int) -> Optional[Dict[str, Any]]:
+        """Receive the whole job before forwarding (streamJobs=false or custom injectors).
+
+        Jobs larger than spoolThresholdBytes spill to a temp file instead of RAM.
+        """
+        with tempfile.SpooledTemporaryFile(max_size=self.conf.spool_threshold) as spool:
+            total, started = self._receive(spool, max_bytes)
+
+            # Fetch pending credentials for this device
+            overlay = lookup_overlay(device_ip, listener, self.pool)
+
+            parts = spool_job_parts(spool, total, target, overlay)
+            printer = f"{device_ip}:{device_port}"
+            pool_load(printer, total)
+            try:
+                with socket.create_connection((device_ip, device_port), timeout=10) as s:
+                    send_parts(s, parts)
+            except Exception:
+                UPSTREAM_ERRORS.labels(self.label).inc()
+            finally:
+                release(parts)
+                pool_load(printer, -total)
+            if total:
+                FORWARD_SECONDS.labels(self.label).observe(time.perf_counter() - started)
+        return overlay
+
+    @staticmethod
+    def _close(sock: Optional[socket.socket]) -> None:
+        if sock is not None:
+            try:
+                sock.close()
+            except Exception:
+                pass
+        return None
 
 
 class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
     allow_reuse_address = True
+    request_queue_size = int(cfg("listenBacklog", 128) or 128)
+
 
+class ReusePortTCPServer(ThreadedTCPServer):
+    allow_reuse_port = True
 
-def start_raw_listener(port: int) -> ThreadedTCPServer:
-    srv = ThreadedTCPServer(("127.0.0.1", port), RawProxyHandler)
+
+def start_raw_listener(port: int, reuse_port: bool = False) -> ThreadedTCPServer:
+    server_class = ReusePortTCPServer if reuse_port else ThreadedTCPServer
+    srv = server_class(("127.0.0.1", port), RawProxyHandler)
     t = threading.Thread(target=srv.serve_forever, daemon=True)
     t.start()
     return srv
 
 
-def main():
-    # Start HTTP endpoint for credentials
-    start_http_server()
-    # Start one or more RAW listeners
-    listeners = cfg("listeners", {}) or {"9100": {}}
-    servers = []
-    for port_str in listeners.keys():
+# ---------------------------------------------------------------------------
+# asyncio engine ("engine": "asyncio"): every listener on one event loop, with
+# non-blocking upstream connections and a per-listener connection limit.
+# Overlay lookup, injectors and agent notify are shared with the threaded path.
+# ---------------------------------------------------------------------------
+
+class AsyncJobReader:
+    """asyncio counterpart of RawProxyHandler's _fill/_next_job/_read."""
+
+    def __init__(self, reader: asyncio.StreamReader, conf: ProxyConfig):
+        self.reader = reader
+        self.conf = conf  # the connection's config version
+        self.jobs = JobStream(split=conf.split_jobs)
+
+    async def _fill(self) -> None:
+        conf = self.conf
+        deadline = None
+        while True:
+            try:
+                data = await asyncio.wait_for(self.reader.read(conf.chunk_bytes), conf.client_idle)
+            except asyncio.TimeoutError:
+                if self.jobs.in_job:
+                    if deadline is None:
+                        deadline = time.monotonic() + conf.job_idle
+                    if time.monotonic() < deadline:
+                        continue
+                data = b""
+            except ConnectionError:
+                data = b""
+            self.jobs.push(data)
+            return
+
+    async def next_job(self) -> bool:
+        started = self.jobs.next_job()
+        while started is None:
+            await self._fill()
+            started = self.jobs.next_job()
+        return started
+
+    async def read(self) -> JobPart:
+        part = self.jobs.read()
+        while part is None:
+            await self._fill()
+            part = self.jobs.read()
+        return part
+
+
+async def _open_printer(device_ip: str, device_port: int,
+                        timeout: float = 10) -> Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]:
+    try:
+        return await asyncio.wait_for(asyncio.open_connection(device_ip, device_port), timeout)
+    except Exception:
+        return None
+
+
+async def _open_upstream(device_ip: str, device_port: int) -> Optional[asyncio.StreamWriter]:
+    opened = await _open_printer(device_ip, device_port)
+    return opened[1] if opened is not None else None
+
+
+async def _close_async(writer: Optional[asyncio.StreamWriter]) -> None:
+    if writer is None:
+        return
+    try:
+        writer.close()
+        await writer.wait_closed()
+    except Exception:
+        pass
+
+
+async def _write_async(writer: Optional[asyncio.StreamWriter], data: bytes) -> Optional[asyncio.StreamWriter]:
+    if writer is None or not data:
+        return writer
+    try:
+        writer.write(data)
+        await asyncio.wait_for(writer.drain(), 10)
+        return writer
+    except Exception:
+        await _close_async(writer)
+        return None
+
+
+async def _confirm_async(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, timeout: float) -> None:
+    """asyncio counterpart of _confirm."""
+    try:
+        writer.write_eof()
+        await asyncio.wait_for(_read_to_eof(reader), timeout)
+    except (OSError, asyncio.TimeoutError):
+        pass
+
+
+async def _read_to_eof(reader: asyncio.StreamReader) -> None:
+    while await reader.read(4096):
+        pass
+
+
+async def _acquire(take: Callable[[], bool], source: Any, timeout: float) -> bool:
+    """take() until it succeeds or `timeout` passes, without blocking the loop or an executor thread.
+
+    `source` (a PrinterQueue or the SpoolBudget) wakes the wait whenever it
+    gives capacity back; nothing runs in between.
+    """
+    if take():
+        return True
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    ready = asyncio.Event()
+
+    def wake() -> None:
+        with contextlib.suppress(RuntimeError):  # the loop is closed
+            loop.call_soon_threadsafe(ready.set)
+
+    source.add_waiter(wake)
+    try:
+        while True:
+            ready.clear()  # before take(): a release after it sets the event again
+            if take():
+                return True
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(ready.wait(), remaining)
+    finally:
+        source.remove_waiter(wake)
+
+
+async def _queue_async(reader: AsyncJobReader, scheduler: Scheduler, listener: ListenerPlan, device_ip: str,
+                       device_port: int, target: TargetPlan, max_bytes: int,
+                       label: str, analyzer: Optional[JobAnalyzer],
+                       pool: Optional[PrinterPool] = None) -> Optional[Dict[str, Any]]:
+    """asyncio counterpart of RawProxyHandler._queue_job."""
+    conf = reader.conf
+    printer = scheduler.queue_for(device_ip, device_port)
+    if not await _acquire(lambda: printer.admit(timeout=0), printer, conf.queue_admit):
+        QUEUE_REJECTED.labels(printer.name).inc()
+        return None
+    budget = scheduler.budget
+    wait = conf.spool_wait
+    spool = tempfile.SpooledTemporaryFile(max_size=conf.spool_threshold)
+    total = 0
+    started = 0.0
+    try:
+        while total <= max_bytes:
+            data = await reader.read()
+            if not data:
+                break
+            n = len(data)
+            if not await _acquire(lambda: budget.reserve(n, 0), budget, wait):
+                raise SpoolFull(f"{budget.used} bytes spooled")
+            if not total:
+                started = time.perf_counter()
+            total += n
+            spool.write(data)
+            if analyzer is not None:
+                analyzer.feed(data)
+        if total:
+            JOBS.labels(label).inc()
+            BYTES.labels(label).inc(total)
+        overlay = lookup_overlay(device_ip, listener, pool)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, enqueue_job, printer, budget, spool, total, started, label,
+                                   target, overlay)
+    except BaseException as e:
+        QUEUE_REJECTED.labels(printer.name).inc()
+        printer.cancel()
+        budget.release(total)
+        spool.close()
+        if not isinstance(e, Exception):
+            raise
+        return None
+    return overlay
+
+
+async def _stream_async(reader: AsyncJobReader, listener: ListenerPlan, device_ip: str, target: TargetPlan,
+                        max_bytes: int, label: str, analyzer: Optional[JobAnalyzer], pool: Optional[PrinterPool],
+                        upstream: Optional[asyncio.StreamWriter], confirm_reader: Optional[asyncio.StreamReader] = None,
+                        confirm: float = 0.0) -> Optional[Dict[str, Any]]:
+    """asyncio counterpart of RawProxyHandler._stream_job, on an opened (or failed, None) upstream."""
+    data = await reader.read()
+    if not data:
+        await _close_async(upstream)
+        return None
+    started = time.perf_counter()
+    JOBS.labels(label).inc()
+    received = BYTES.labels(label)
+    overlay = lookup_overlay(device_ip, listener, pool)
+    preamble, trailer = frame_job(target, overlay)
+    upstream = await _write_async(upstream, preamble)
+    total = 0
+    while data:
+        if total < max_bytes:
+            upstream = await _write_async(upstream, data[:max_bytes - total])
+        if analyzer is not None:
+            analyzer.feed(data)
+        total += len(data)
+        received.inc(len(data))
+        data = await reader.read()
+    upstream = await _write_async(upstream, trailer)
+    if upstream is None:
+        UPSTREAM_ERRORS.labels(label).inc()
+    elif confirm_reader is not None:
+        await _confirm_async(confirm_reader, upstream, confirm)
+    await _close_async(upstream)
+    FORWARD_SECONDS.labels(label).observe(time.perf_counter() - started)
+    return overlay
+
+
+async def _forward_async(reader: AsyncJobReader, port: int, listener: ListenerPlan, device_ip: str,
+                         device_port: int, analyzer: Optional[JobAnalyzer] = None,
+                         pool: Optional[PrinterPool] = None) -> Optional[Dict[str, Any]]:
+    conf = reader.conf
+    target = conf.target(device_ip)
+    max_bytes = conf.max_job_bytes
+
+    label = str(port)
+    scheduler = get_scheduler(conf)
+    streams = conf.stream_jobs and target.framer is not None
+    if scheduler is not None:
+        # Straight through while the printer is idle, as RawProxyHandler._claim
+        printer = scheduler.queue_for(device_ip, device_port)
+        if streams and printer.claim():
+            try:
+                opened = await _open_printer(device_ip, device_port, printer.connect_timeout)
+                if opened is not None:
+                    return await _stream_async(reader, listener, device_ip, target, max_bytes, label, analyzer,
+                                               pool, opened[1], opened[0], printer.confirm_timeout)
+            finally:
+                printer.unclaim()
+        return await _queue_async(reader, scheduler, listener, device_ip, device_port, target,
+                                  max_bytes, label, analyzer, pool)
+    if streams:
+        return await _stream_async(reader, listener, device_ip, target, max_bytes, label, analyzer, pool,
+                                   await _open_upstream(device_ip, device_port))
+
+    # Buffered path for injectors that need the whole job
+    with tempfile.SpooledTemporaryFile(max_size=conf.spool_threshold) as spool:
+        total = 0
+        started = 0.0
+        while total <= max_bytes:
+            data = await reader.read()
+            if not data:
+                break
+            if not total:
+                started = time.perf_counter()
+            spool.write(data)
+            if analyzer is not None:
+                analyzer.feed(data)
+            total += len(data)
+        if total:
+            JOBS.labels(label).inc()
+            BYTES.labels(label).inc(total)
+        overlay = lookup_overlay(device_ip, listener, pool)
+        printer = f"{device_ip}:{device_port}"
+        pool_load(printer, total)
         try:
-            p = int(port_str)
-        except Exception:
-            continue
-        servers.append(start_raw_listener(p))
+            upstream = await _open_upstream(device_ip, device_port)
+            if upstream is not None:
+                loop = asyncio.get_running_loop()
+                parts = await loop.run_in_executor(None, spool_job_parts, spool, total, target, overlay)
+                try:
+                    await send_parts_async(upstream, parts)
+                except Exception:
+                    await _close_async(upstream)
+                    upstream = None
+                finally:
+                    release(parts)
+        finally:
+            pool_load(printer, -total)
+        if upstream is None:
+            UPSTREAM_ERRORS.labels(label).inc()
+        await _close_async(upstream)
+        if total:
+            FORWARD_SECONDS.labels(label).observe(time.perf_counter() - started)
+    return overlay
+
+
+async def _serve_raw_async(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                           port: int, limit: asyncio.Semaphore) -> None:
+    active = ACTIVE_CONNECTIONS.labels(str(port))
+    active.inc()
+    # The connection keeps this config version to the end, even across a reload
+    jobs = AsyncJobReader(reader, current_config())
+    listener = jobs.conf.listener(port)
+    async with limit:
+        try:
+            while await jobs.next_job():
+                await _serve_job_async(jobs, port, listener)
+                while await jobs.read():
+                    pass  # what is left of a job over maxJobBytes, or of one that failed
+        finally:
+            active.dec()
+            await _close_async(writer)
+
+
+async def _serve_job_async(jobs: AsyncJobReader, port: int, listener: ListenerPlan) -> None:
+    """One job of a RAW connection: target, forward, notify."""
+    analyzer = new_analyzer(jobs.conf)
+    device_ip, device_port, pool, member = choose_target(listener)
+    try:
+        overlay = await _forward_async(jobs, port, listener, device_ip, device_port, analyzer, pool)
+    except Exception:
+        overlay = analyzer = None
+    finally:
+        if member is not None:
+            pool.release(member)
+    analysis = finish_analysis(analyzer, str(port))
+    # Notify agent for DB cataloging (best-effort, blocking HTTP off the loop)
+    if overlay or analysis:
+        loop = asyncio.get_running_loop()
+        notice = overlay_notice(listener, device_ip, overlay, analysis, member)
+        await loop.run_in_executor(None, notify_agent_overlay, notice, jobs.conf)
+
+
+async def start_raw_listener_async(port: int, reuse_port: bool = False) -> asyncio.AbstractServer:
+    limit = asyncio.Semaphore(current_config().listener(port).max_connections)
+
+    async def _client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await _serve_raw_async(reader, writer, port, limit)
+
+    return await asyncio.start_server(_client, "127.0.0.1", port, reuse_address=True, reuse_port=reuse_port,
+                                      backlog=int(cfg("listenBacklog", 128) or 128))
+
+
+class Listeners:
+    """This process's RAW listeners by port, bound and closed as the config's listeners change.
+
+    A closed listener stops accepting; connections it already accepted run
+    to the end.
+    """
+
+    def __init__(self, reuse_port: bool = False):
+        self.reuse_port = reuse_port
+        self.servers: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+
+    def sync(self, ports: List[int]) -> Tuple[List[int], List[int]]:
+        """Bind the ports not yet served, close those not in `ports`; returns (bound, closed)."""
+        bound, closed = [], []
+        with self._lock:
+            for port in sorted(set(ports) - set(self.servers)):
+                try:
+                    self.servers[port] = self._bind(port)
+                except OSError as e:
+                    print(f"print proxy: cannot listen on {port}: {e}")
+                    continue
+                bound.append(port)
+            for port in sorted(set(self.servers) - set(ports)):
+                self._close(self.servers.pop(port))
+                closed.append(port)
+        return bound, closed
+
+    def _bind(self, port: int) -> Any:
+        return start_raw_listener(port, self.reuse_port)
+
+    def _close(self, server: Any) -> None:
+        # shutdown() waits for serve_forever() to return, server_close() for the open connections
+        def close() -> None:
+            server.shutdown()
+            server.server_close()
+        threading.Thread(target=close, daemon=True).start()
+
+
+class AsyncListeners(Listeners):
+    """Listeners on an event loop (engine asyncio); sync() is called from other threads."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, reuse_port: bool = False):
+        super().__init__(reuse_port)
+        self.loop = loop
+
+    def _bind(self, port: int) -> Any:
+        return asyncio.run_coroutine_threadsafe(start_raw_listener_async(port, self.reuse_port), self.loop).result()
+
+    def _close(self, server: Any) -> None:
+        self.loop.call_soon_threadsafe(server.close)
+
+
+def _config_swapped(old: Optional[ProxyConfig], new: ProxyConfig) -> None:
+    global CONFIG
+    CONFIG = new.raw
+    if old is None:
+        return
+    _retire_pools(new)
+    if _LISTENERS is not None:
+        bound, closed = _LISTENERS.sync(new.ports)
+        if bound or closed:
+            print(f"print proxy: listening on {', '.join(map(str, sorted(_LISTENERS.servers)))}")
+
+
+LIVE_CONFIG.subscribe(_config_swapped)
+
+
+def _serve_pools() -> None:
+    """Start the health checks of the pools this process now serves."""
+    with _POOLS_LOCK:
+        for pool in _POOLS.values():
+            pool.start()
+
+
+async def serve_async(ports: List[int], reuse_port: bool = False) -> None:
+    global _LISTENERS
+    loop = asyncio.get_running_loop()
+    listeners = AsyncListeners(loop, reuse_port)
+    await loop.run_in_executor(None, listeners.sync, ports)
+    _LISTENERS = listeners
+    _serve_pools()
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        _LISTENERS = None
+        for srv in listeners.servers.values():
+            srv.close()
+
+
+def serve_listeners(ports: List[int], reuse_port: bool = False) -> None:
+    """Serve the RAW listeners until interrupted, following config reloads."""
+    global _LISTENERS
+    LIVE_CONFIG.start()
+    if str(cfg("engine", "threaded")).lower() == "asyncio":
+        try:
+            asyncio.run(serve_async(ports, reuse_port))
+        except KeyboardInterrupt:
+            pass
+        return
+    listeners = Listeners(reuse_port)
+    listeners.sync(ports)
+    _LISTENERS = listeners
+    _serve_pools()
     # Sleep forever
     try:
         while True:
@@ -304,6 +1269,71 @@ def main():
         pass
 
 
+def configured_printers(ports: List[int]) -> List[str]:
+    """"ip:port" of every printer the listeners can send to."""
+    conf = current_config()
+    return sorted({key for port in ports for key in conf.listener(port).printers()})
+
+
+def _worker_main(index: int, conn: Any, config: Dict[str, Any], stamp: Any, ports: List[int],
+                 overlays_address: Any, authkey: bytes, locks: Dict[str, Any]) -> None:
+    """Entry point of a worker process (serve_workers).
+
+    The worker starts from the supervisor's config and watches the file on
+    its own, so a change made since (or while it was respawned) is picked up
+    on its first check.
+    """
+    CONFIG.clear()
+    CONFIG.update(config)
+    LIVE_CONFIG.load(CONFIG, stamp)
+    CredentialServer.pending = attach(overlays_address, authkey)
+    # The supervisor reports the shared store; the local index it replaced is gone
+    REGISTRY.unregister(PENDING_OVERLAYS.name)
+    _CONNECTION_LOCKS.update(locks)
+    answer_supervisor(conn, index)
+    serve_listeners(ports, reuse_port=True)
+
+
+def serve_workers(ports: List[int], count: int) -> None:
+    """Supervisor: the credential server and overlay store here, the listeners in `count` workers."""
+    overlay_server, address, authkey = share(CredentialServer.pending)
+    locks = {key: shared_lock() for key in configured_printers(ports)}
+    # Printers added by a reload get a lock per worker until the next restart
+    workers = WorkerSet(count, _worker_main, (dict(CONFIG), LIVE_CONFIG.stamp, ports, address, authkey, locks))
+    threading.Thread(target=overlay_server.serve_forever, name="overlay-store", daemon=True).start()
+    LIVE_CONFIG.start()  # for localProxyToken
+    CredentialServer.workers = workers.start()
+    start_http_server()
+    print(f"print proxy: {count} workers on ports {', '.join(map(str, ports))}")
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        workers.watch()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        workers.stop()
+
+
+def main():
+    try:
+        conf = current_config()
+    except ConfigError as e:
+        print(f"print proxy: {CONFIG_PATH}: {e}")
+        sys.exit(2)
+    # Start one or more RAW listeners
+    ports = list(conf.ports)
+    workers = int(cfg("workers", 1) or 1)
+    if workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        print("print proxy: SO_REUSEPORT is not available on this platform, running a single process")
+        workers = 1
+    if workers > 1:
+        serve_workers(ports, workers)
+        return
+    # Start HTTP endpoint for credentials
+    start_http_server()
+    serve_listeners(ports)
+
+
 if __name__ == "__main__":
     main()
 
@@ -0,0 +1,147 @@
+"""
+Pools of equivalent printers behind one proxy listener.
+
+A listener with "targets" instead of "targetIP" sends each job to one pool
+member chosen by its "balance" strategy:
+
+- least-bytes (default): the member with the fewest bytes queued and in
+  flight. Jobs still being received count at the average job size, so a
+  burst of connections that have not been spooled yet still spreads out.
+- round-robin.
+- sticky-user: the same billing user always lands on the same printer.
+  This uses rendezvous hashing, so a member leaving the pool only moves
+  its own users. Without a user it falls back to least-bytes.
+
+Members failing a health check leave the pool until they pass again. The
+check is a TCP connect every healthCheckSeconds, skipped while a member
+has jobs in flight, because a one-connection printer would refuse it. On
+top of that, forward failures reported by the print path count as failed
+checks. When every member is down, jobs still go to the least-loaded one
+and wait in its queue.
+"""
+
+import socket
+import threading
+import zlib
+from typing import Any, Mapping, Optional, Sequence
+
+STRATEGIES = ("least-bytes", "round-robin", "sticky-user")
+
+
+class PoolMember:
+    __slots__ = ("ip", "port", "name", "key", "outstanding_bytes", "outstanding_jobs", "healthy", "failures")
+
+    def __init__(self, ip: str, port: int = 9100, name: str = ""):
+        self.ip = ip
+        self.port = int(port)
+        self.name = name
+        self.key = f"{ip}:{self.port}"
+        self.outstanding_bytes = 0
+        self.outstanding_jobs = 0
+        self.healthy = True
+        self.failures = 0
+
+    @classmethod
+    def from_config(cls, spec: Any, default_port: int = 9100) -> "PoolMember":
+        """"10.0.0.5", "10.0.0.5:9101" or {"ip"/"targetIP", "port"/"targetPort", "name"}."""
+        if isinstance(spec, Mapping):
+            ip = str(spec.get("ip") or spec.get("targetIP") or "")
+            port = int(spec.get("port") or spec.get("targetPort") or default_port)
+            return cls(ip, port, str(spec.get("name") or spec.get("deviceName") or ""))
+        host, _, port = str(spec).partition(":")
+        return cls(host, int(port or default_port))
+
+
+class PrinterPool:
+    def __init__(self, name: str, members: Sequence[PoolMember], strategy: str = "least-bytes",
+                 probe_interval: float = 10.0, probe_timeout: float = 2.0, fail_after: int = 2):
+        if not members:
+            raise ValueError(f"printer pool {name!r} has no targets")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown balance strategy {strategy!r}, expected one of {STRATEGIES}")
+        self.name = name
+        self.members = list(members)
+        self.strategy = strategy
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.fail_after = max(1, int(fail_after))
+        self._next = 0
+        self._avg_job = 0.0  # moving average of add_bytes() sizes
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # -- choosing --------------------------------------------------------
+
+    def choose(self, user: str = "") -> PoolMember:
+        """Pick a member for a new job and count the job against it until release()."""
+        with self._lock:
+            up = [m for m in self.members if m.healthy] or self.members
+            if self.strategy == "round-robin":
+                member = up[self._next % len(up)]
+                self._next += 1
+            elif self.strategy == "sticky-user" and user:
+                key = user.strip().lower().encode("utf-8")
+                member = max(up, key=lambda m: zlib.crc32(key + b"@" + m.key.encode()))
+            else:
+                member = min(up, key=lambda m: (m.outstanding_bytes + m.outstanding_jobs * self._avg_job,
+                                                m.outstanding_jobs))
+            member.outstanding_jobs += 1
+            return member
+
+    def release(self, member: PoolMember) -> None:
+        """The connection choose() picked `member` for is done."""
+        with self._lock:
+            member.outstanding_jobs = max(0, member.outstanding_jobs - 1)
+
+    def add_bytes(self, member: PoolMember, n: int) -> None:
+        """Job bytes spooled for `member`; negative once they are forwarded."""
+        with self._lock:
+            member.outstanding_bytes = max(0, member.outstanding_bytes + n)
+            if n > 0:
+                self._avg_job = n if not self._avg_job else 0.9 * self._avg_job + 0.1 * n
+
+    # -- health ----------------------------------------------------------
+
+    def mark(self, member: PoolMember, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                if not member.healthy:
+                    print(f"pool {self.name}: {member.key} is back")
+                member.failures = 0
+                member.healthy = True
+                return
+            member.failures += 1
+            if member.healthy and member.failures >= self.fail_after:
+                member.healthy = False
+                print(f"pool {self.name}: {member.key} taken out after {member.failures} failed checks")
+
+    def probe(self, member: PoolMember) -> bool:
+        try:
+            socket.create_connection((member.ip, member.port), timeout=self.probe_timeout).close()
+            return True
+        except OSError:
+            return False
+
+    def check(self) -> None:
+        """One health-check round over the idle members."""
+        for member in self.members:
+            if member.outstanding_jobs or member.outstanding_bytes:
+                continue
+            self.mark(member, self.probe(member))
+
+    def start(self) -> "PrinterPool":
+        if self._thread is None and self.probe_interval > 0:
+            self._thread = threading.Thread(target=self._run, name=f"pool-{self.name}", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.probe_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"pool {self.name}: health check error: {e}")
+
+    def close(self) -> None:
+        self._stop.set()
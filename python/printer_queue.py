@@ -0,0 +1,294 @@
+"""
+Per-printer job queues for the print proxy.
+
+A RAW printer takes one connection at a time, so handlers no longer connect
+upstream themselves. A received job is spooled and put on the queue of its
+target (ip:port), and that queue's single worker thread is the only code
+that connects to the printer. It forwards jobs in arrival order and retries
+with exponential backoff while the printer refuses the connection or resets
+it before the whole job is sent.
+A job is only dropped once retryForSeconds has passed.
+
+Accepted-but-not-forwarded jobs are bounded twice:
+- per printer, by queue slots; a handler waits for a slot before it reads
+  the job;
+- globally, by a byte budget; a handler stops reading from its client
+  while the spool is full.
+Either way the back-pressure reaches the Windows spooler as a slow TCP
+peer rather than as lost jobs.
+
+A printer with nothing queued or being sent does not need any of that:
+claim() gives its turn to a handler that streams the job straight through,
+as without queues, so the printer gets the first bytes at once. Jobs that
+arrive meanwhile queue behind it.
+
+With several proxy worker processes each has its own queues; a printer's
+connection is then also guarded by a lock shared between the processes.
+"""
+
+import contextlib
+import queue
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from job_buffers import JobPart, send_parts
+
+
+class SpoolFull(Exception):
+    """The spool byte budget stayed exhausted for the whole wait."""
+
+
+class _Wakeups:
+    """Callbacks run, from any thread, whenever capacity is given back.
+
+    For waiters that must not block a thread (the asyncio engine): they try
+    again when woken instead of polling.
+    """
+
+    def __init__(self):
+        self._waiters: List[Callable[[], None]] = []
+        self._waiters_lock = threading.Lock()
+
+    def add_waiter(self, fn: Callable[[], None]) -> None:
+        with self._waiters_lock:
+            self._waiters.append(fn)
+
+    def remove_waiter(self, fn: Callable[[], None]) -> None:
+        with self._waiters_lock:
+            with contextlib.suppress(ValueError):
+                self._waiters.remove(fn)
+
+    def _wake(self) -> None:
+        # Every waiter, like notify_all: one woken that no longer wants it would swallow the wakeup
+        with self._waiters_lock:
+            waiters = list(self._waiters)
+        for fn in waiters:
+            fn()
+
+
+class SpoolBudget(_Wakeups):
+    """Bytes held by accepted jobs across all printers."""
+
+    def __init__(self, max_bytes: int):
+        super().__init__()
+        self.max_bytes = max(1, int(max_bytes))
+        self.used = 0
+        self._cond = threading.Condition()
+
+    def reserve(self, n: int, timeout: Optional[float] = None) -> bool:
+        # An empty spool always admits, so one job larger than the budget still goes through
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.used == 0 or self.used + n <= self.max_bytes, timeout):
+                return False
+            self.used += n
+            return True
+
+    def release(self, n: int) -> None:
+        if n <= 0:
+            return
+        with self._cond:
+            self.used = max(0, self.used - n)
+            self._cond.notify_all()
+        self._wake()
+
+
+class QueuedJob:
+    __slots__ = ("parts", "size", "label", "received_at", "queued_at", "cleanup")
+
+    def __init__(self, parts: List[JobPart], size: int, label: str, received_at: float,
+                 cleanup: Optional[Callable[[], None]] = None):
+        self.parts = parts
+        self.size = size
+        self.label = label
+        self.received_at = received_at  # perf_counter() of the first job byte
+        self.queued_at = time.perf_counter()
+        self.cleanup = cleanup
+
+
+class PrinterQueue(_Wakeups):
+    """Ordered jobs for one printer and the thread that owns its connection.
+
+    on_done(queue, job, ok, waited_s, forward_s, attempts) runs after every
+    job, on_retry(queue, error) before every backoff sleep. `lock`, when
+    given, is held around every printer connection (a multiprocessing.Lock
+    shared by the worker processes).
+    """
+
+    def __init__(self, host: str, port: int, max_jobs: int = 32, connect_timeout: float = 10.0,
+                 confirm_timeout: float = 2.0, retry_initial: float = 0.5, retry_max: float = 10.0,
+                 retry_for: float = 300.0,
+                 on_done: Optional[Callable[..., None]] = None,
+                 on_retry: Optional[Callable[["PrinterQueue", Exception], None]] = None,
+                 lock: Optional[Any] = None):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.name = f"{host}:{port}"
+        self.connect_timeout = connect_timeout
+        self.confirm_timeout = confirm_timeout
+        self.retry_initial = retry_initial
+        self.retry_max = retry_max
+        self.retry_for = retry_for
+        self.on_done = on_done
+        self.on_retry = on_retry
+        self.lock = lock
+        self.forwarded = 0
+        self.failed = 0
+        self.retries = 0
+        self._slots = threading.BoundedSemaphore(max(1, int(max_jobs)))
+        self._admitted = 0  # jobs holding a slot: being received, queued or sent
+        self._state = threading.Lock()
+        self._turn = threading.Lock()  # held while this process talks to the printer
+        self._jobs: "queue.Queue[Optional[QueuedJob]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"printer-{self.name}", daemon=True)
+        self._thread.start()
+
+    def admit(self, timeout: Optional[float] = None) -> bool:
+        """Take a queue slot before receiving a job; put() or cancel() gives it back."""
+        if not self._slots.acquire(timeout=timeout):
+            return False
+        with self._state:
+            self._admitted += 1
+        return True
+
+    def cancel(self) -> None:
+        self._done()
+
+    def _done(self) -> None:
+        with self._state:
+            self._admitted -= 1
+        self._slots.release()
+        self._wake()
+
+    def claim(self) -> bool:
+        """Take the printer for one job sent directly, if no other job is ahead; unclaim() gives it back.
+
+        False while jobs are received, queued or sent, or while another
+        process holds the printer; the job is then queued like any other.
+        """
+        with self._state:
+            if self._admitted or not self._turn.acquire(False):
+                return False
+        if self.lock is not None and not self.lock.acquire(False):
+            self._turn.release()
+            return False
+        return True
+
+    def unclaim(self) -> None:
+        if self.lock is not None:
+            self.lock.release()
+        self._turn.release()
+
+    def put(self, job: QueuedJob) -> None:
+        self._jobs.put(job)
+
+    def depth(self) -> int:
+        return self._jobs.qsize()
+
+    def close(self, timeout: float = 10.0) -> None:
+        self._jobs.put(None)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            waited = time.perf_counter() - job.queued_at
+            try:
+                with self._turn:  # after a job streamed through by claim()
+                    ok, forward_s, attempts = self._forward(job)
+            finally:
+                if job.cleanup is not None:
+                    try:
+                        job.cleanup()
+                    except Exception:
+                        pass
+                self._done()
+            if ok:
+                self.forwarded += 1
+            else:
+                self.failed += 1
+            if self.on_done is not None:
+                self.on_done(self, job, ok, waited, forward_s, attempts)
+
+    def _forward(self, job: QueuedJob) -> Tuple[bool, float, int]:
+        deadline = time.monotonic() + self.retry_for
+        delay = self.retry_initial
+        attempts = 0
+        while True:
+            attempts += 1
+            started = time.perf_counter()
+            try:
+                self._deliver(job)
+                return True, time.perf_counter() - started, attempts
+            except OSError as e:
+                if time.monotonic() + delay > deadline:
+                    print(f"printer {self.name}: dropping {job.size} byte job after {attempts} attempts: {e}")
+                    return False, time.perf_counter() - started, attempts
+                self.retries += 1
+                if self.on_retry is not None:
+                    self.on_retry(self, e)
+                time.sleep(delay)
+                delay = min(delay * 2, self.retry_max)
+
+    def _deliver(self, job: QueuedJob) -> None:
+        """One attempt: send the whole job, then wait for the printer's FIN.
+
+        Only errors while connecting or sending raise, and are retried. Once
+        the whole job is sent and the write side shut down, the job counts as
+        delivered: a reset on the final read is logged, not retried, since a
+        second copy could print twice. A printer that keeps the connection
+        open is taken as done after confirm_timeout.
+        """
+        with self.lock or contextlib.nullcontext(), \
+                socket.create_connection((self.host, self.port), timeout=self.connect_timeout) as s:
+            send_parts(s, job.parts)
+            s.shutdown(socket.SHUT_WR)
+            s.settimeout(self.confirm_timeout)
+            try:
+                while s.recv(4096):
+                    pass  # PJL status read-back is not used
+            except socket.timeout:
+                pass
+            except OSError as e:
+                print(f"printer {self.name}: {e} after the whole {job.size} byte job was sent; not resending")
+
+
+class Scheduler:
+    """One PrinterQueue per target, created on first use.
+
+    `locks` maps "ip:port" to the connection lock of that printer's queue.
+    """
+
+    def __init__(self, budget: SpoolBudget, on_new: Optional[Callable[[PrinterQueue], None]] = None,
+                 locks: Optional[Dict[str, Any]] = None, **queue_options: Any):
+        self.budget = budget
+        self.on_new = on_new
+        self.locks = locks or {}
+        self.queue_options = queue_options
+        self._queues: Dict[Tuple[str, int], PrinterQueue] = {}
+        self._lock = threading.Lock()
+
+    def queue_for(self, host: str, port: int) -> PrinterQueue:
+        key = (host, int(port))
+        q = self._queues.get(key)
+        if q is None:
+            with self._lock:
+                q = self._queues.get(key)
+                if q is None:
+                    q = self._queues[key] = PrinterQueue(host, int(port), lock=self.locks.get(f"{host}:{int(port)}"),
+                                                         **self.queue_options)
+                    if self.on_new is not None:
+                        self.on_new(q)
+        return q
+
+    def queues(self) -> List[PrinterQueue]:
+        with self._lock:
+            return list(self._queues.values())
+
+    def close(self, timeout: float = 10.0) -> None:
+        for q in self.queues():
+            q.close(timeout)
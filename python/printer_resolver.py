@@ -0,0 +1,163 @@
+"""
+Printer name -> IP resolution for the ingest agent.
+
+The agent used to spawn up to three PowerShell processes per print event to
+find a printer's host address. Resolution now goes through a cache that is
+filled by one bulk enumeration of all printers and ports (on startup and on a
+refresh interval), so a per-job lookup is normally a dict hit.
+
+The OS-specific part sits behind PrinterResolver so the cache can be driven by
+a fake resolver on Linux.
+"""
+
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def _looks_like_ip(value: str) -> bool:
+    return bool(value) and all(c.isdigit() or c == "." for c in value) and value.count(".") == 3
+
+
+def _ps_quote(value: str) -> str:
+    return value.replace("'", "''")
+
+
+class PrinterResolver:
+    """Backend interface used by ResolverCache.
+
+    enumerate() returns every known printer mapped to its host address (or to
+    None when the printer has no TCP/IP port). lookup() resolves a single
+    printer and is only used for names missing from the last enumeration.
+    """
+
+    def enumerate(self) -> Dict[str, Optional[str]]:
+        raise NotImplementedError
+
+    def lookup(self, printer_name: str) -> Optional[str]:
+        raise NotImplementedError
+
+
+class PowerShellResolver(PrinterResolver):
+    """Windows resolver built on Get-Printer / Get-PrinterPort / Win32_TCPIPPrinterPort.
+
+    `run` executes one PowerShell command and returns its stdout ("" on error).
+    """
+
+    def __init__(self, run: Callable[[str], str]):
+        self.run = run
+
+    def _json_rows(self, cmd: str) -> List[Dict[str, Any]]:
+        out = self.run(f"{cmd} | ConvertTo-Json -Compress")
+        if not out:
+            return []
+        try:
+            rows = json.loads(out)
+        except Exception:
+            return []
+        # ConvertTo-Json emits a bare object when there is only one row
+        if isinstance(rows, dict):
+            rows = [rows]
+        return [r for r in rows if isinstance(r, dict)]
+
+    def enumerate(self) -> Dict[str, Optional[str]]:
+        printers = self._json_rows("Get-Printer -ErrorAction SilentlyContinue | Select-Object Name,PortName")
+        if not printers:
+            return {}
+        ports: Dict[str, str] = {}
+        for row in self._json_rows("Get-PrinterPort -ErrorAction SilentlyContinue | Select-Object Name,PrinterHostAddress"):
+            if row.get("Name") and row.get("PrinterHostAddress"):
+                ports[str(row["Name"])] = str(row["PrinterHostAddress"])
+        unresolved = [str(p.get("PortName") or "") for p in printers]
+        if any(port and not _looks_like_ip(port) and port not in ports for port in unresolved):
+            # CIM fallback for ports Get-PrinterPort does not report an address for
+            for row in self._json_rows("Get-CimInstance -ClassName Win32_TCPIPPrinterPort | Select-Object Name,HostAddress"):
+                if row.get("Name") and row.get("HostAddress"):
+                    ports.setdefault(str(row["Name"]), str(row["HostAddress"]))
+        result: Dict[str, Optional[str]] = {}
+        for p in printers:
+            name = str(p.get("Name") or "")
+            port = str(p.get("PortName") or "")
+            if not name:
+                continue
+            result[name] = port if _looks_like_ip(port) else ports.get(port)
+        return result
+
+    def lookup(self, printer_name: str) -> Optional[str]:
+        # 1) Try PowerShell Get-Printer -> PortName
+        port = self.run(f"(Get-Printer -Name '{_ps_quote(printer_name)}' -ErrorAction SilentlyContinue).PortName")
+        if not port:
+            return None
+        # If the port string already looks like an IP
+        if _looks_like_ip(port):
+            return port
+        # 2) Resolve via Get-PrinterPort
+        ip = self.run(f"(Get-PrinterPort -Name '{_ps_quote(port)}' -ErrorAction SilentlyContinue).PrinterHostAddress")
+        if ip:
+            return ip
+        # 3) CIM fallback
+        ip = self.run(f"(Get-CimInstance -ClassName Win32_TCPIPPrinterPort -Filter \"Name='{_ps_quote(port)}'\").HostAddress")
+        return ip or None
+
+
+class ResolverCache:
+    """TTL cache with negative caching in front of a PrinterResolver.
+
+    Positive entries live for `ttl` seconds, misses for `negative_ttl`.
+    refresh() replaces the table with a bulk enumeration; start() runs it on
+    a background thread every `refresh_interval` seconds.
+    """
+
+    def __init__(self, resolver: PrinterResolver, ttl: float = 600, negative_ttl: float = 60,
+                 refresh_interval: float = 300, clock: Callable[[], float] = time.monotonic):
+        self.resolver = resolver
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self._entries: Dict[str, Tuple[Optional[str], float]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def refresh(self) -> int:
+        try:
+            table = self.resolver.enumerate()
+        except Exception as e:
+            print(f"printer enumeration error: {e}")
+            return 0
+        now = self.clock()
+        fresh = {
+            name: (ip, now + (self.ttl if ip else self.negative_ttl))
+            for name, ip in table.items()
+        }
+        with self._lock:
+            self._entries = fresh
+        return len(fresh)
+
+    def resolve(self, printer_name: str) -> Optional[str]:
+        if not printer_name:
+            return None
+        now = self.clock()
+        entry = self._entries.get(printer_name)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+        try:
+            ip = self.resolver.lookup(printer_name)
+        except Exception:
+            ip = None
+        with self._lock:
+            self._entries[printer_name] = (ip, now + (self.ttl if ip else self.negative_ttl))
+        return ip
+
+    def start(self) -> threading.Thread:
+        def loop():
+            self.refresh()
+            while not self._stop.wait(self.refresh_interval):
+                self.refresh()
+        t = threading.Thread(target=loop, daemon=True)
+        t.start()
+        return t
+
+    def stop(self) -> None:
+        self._stop.set()
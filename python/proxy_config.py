@@ -0,0 +1,207 @@
+"""
+print_proxy.config.json compiled into immutable lookup tables.
+
+The proxy used to look keys up in the raw config dict on every connection
+(listeners, printerProfiles, maxJobBytes...) and resolve a profile's
+injector by name on every job. compile_config() does all of that once per
+config version:
+
+- ProxyConfig: the settings read per connection, parsed and checked, plus
+  get() for the rest of the raw file;
+- ListenerPlan, one per listener port: its target with the defaults applied,
+  or its pool of targets and balance strategy;
+- TargetPlan, one per printer profile: the profile with its injector and
+  framer functions already looked up.
+
+print_proxy keeps one ProxyConfig in a hot_config.HotConfig. Each connection
+takes the snapshot once and keeps it until it closes. Values that do not
+parse (a port that is not a number, targets that is not a list...) raise
+ConfigError, so a bad edit never replaces a working config.
+"""
+
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional, Sequence, Tuple
+
+from hot_config import ConfigError, freeze
+from printer_pool import PoolMember
+
+_Member = Tuple[str, int, str]  # (ip, port, name) of a pool target
+
+
+def _number(raw: Mapping[str, Any], key: str, default: Any, kind: Callable[[Any], Any] = int,
+            where: str = "") -> Any:
+    """raw[key] as `kind`, `default` if it is missing or null."""
+    value = raw.get(key)
+    if value is None:
+        return default
+    try:
+        value = kind(value)
+    except (TypeError, ValueError):
+        raise ConfigError(f"{where}{key}: expected a number, got {raw[key]!r}") from None
+    return value
+
+
+def _port(raw: Mapping[str, Any], key: str, default: int, where: str = "") -> int:
+    port = _number(raw, key, default, int, where) or default
+    if not 0 < port < 65536:
+        raise ConfigError(f"{where}{key}: {port} is not a TCP port")
+    return port
+
+
+def _object(raw: Mapping[str, Any], key: str, where: str = "") -> Mapping[str, Any]:
+    value = raw.get(key) or {}
+    if not isinstance(value, Mapping):
+        raise ConfigError(f"{where}{key}: expected an object")
+    return value
+
+
+class TargetPlan:
+    """A printer profile with its injector resolved."""
+
+    __slots__ = ("profile", "injector_name", "injector", "framer")
+
+    def __init__(self, profile: Mapping[str, Any], injector_name: str, injector: Callable, framer: Optional[Callable]):
+        self.profile = profile
+        self.injector_name = injector_name
+        self.injector = injector
+        self.framer = framer  # None for injectors that need the whole job
+
+
+class ListenerPlan:
+    """One RAW listener: where its jobs go."""
+
+    __slots__ = ("port", "raw", "device_name", "target_ip", "target_port", "members", "balance",
+                 "max_connections", "pool")
+
+    def __init__(self, port: int, raw: Mapping[str, Any], device_name: str, target_ip: str, target_port: int,
+                 members: Tuple[_Member, ...], balance: str, max_connections: int):
+        self.port = port
+        self.raw = raw
+        self.device_name = device_name
+        self.target_ip = target_ip
+        self.target_port = target_port
+        self.members = members  # empty for a single targetIP
+        self.balance = balance
+        self.max_connections = max_connections
+        self.pool: Any = None  # the PrinterPool, attached by print_proxy before the snapshot is published
+
+    @property
+    def pool_key(self) -> Optional[Tuple[Any, ...]]:
+        """Identity of the pool: a reload that keeps it keeps the pool and its health state."""
+        if not self.members:
+            return None
+        return self.device_name or str(self.port), self.members, self.balance
+
+    def printers(self) -> Sequence[str]:
+        """"ip:port" of every printer this listener sends to."""
+        if self.members:
+            return [f"{ip}:{port}" for ip, port, _ in self.members]
+        return [f"{self.target_ip}:{self.target_port}"] if self.target_ip else []
+
+
+class ProxyConfig:
+    """One version of the proxy config. Never modified once published."""
+
+    def __init__(self, raw: Dict[str, Any], listeners: Mapping[int, ListenerPlan],
+                 targets: Mapping[str, TargetPlan], default_target: TargetPlan, default_listener: ListenerPlan):
+        self.raw = raw  # the parsed file, for cfg(); treat as read-only
+        self.listeners = listeners
+        self.targets = targets
+        self.default_target = default_target
+        self._default_listener = default_listener
+        # Per-connection and per-job settings
+        self.max_job_bytes = _number(raw, "maxJobBytes", 50 * 1024 * 1024)
+        self.chunk_bytes = _number(raw, "chunkBytes", 64 * 1024) or 64 * 1024
+        self.client_idle = _number(raw, "clientIdleSeconds", 30.0, float)
+        self.job_idle = _number(raw, "jobIdleSeconds", 300.0, float)
+        self.split_jobs = bool(raw.get("splitJobs", True))
+        self.stream_jobs = bool(raw.get("streamJobs", True))
+        self.analyze_jobs = bool(raw.get("analyzeJobs", True))
+        self.spool_threshold = _number(raw, "spoolThresholdBytes", 8 * 1024 * 1024) or 0
+        self.spool_wait = _number(raw, "spoolWaitSeconds", 60.0, float)
+        self.queue_admit = _number(raw, "queueAdmitSeconds", 60.0, float)
+        self.notify_url = f"http://127.0.0.1:{_port(raw, 'agentNotifyPort', 57981)}/notify"
+        self.notify_token = str(raw.get("agentNotifyToken") or "")
+        self.proxy_token = str(raw.get("localProxyToken") or "")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        v = self.raw.get(key)
+        return default if v is None else v
+
+    @property
+    def ports(self) -> Sequence[int]:
+        """Ports to listen on; 9100 when no listeners are configured."""
+        return sorted(self.listeners) or [9100]
+
+    def listener(self, port: int) -> ListenerPlan:
+        """The listener on `port`; an unconfigured port forwards to defaultTargetIP."""
+        return self.listeners.get(port) or self._default_listener
+
+    def target(self, device_ip: str) -> TargetPlan:
+        return self.targets.get(device_ip, self.default_target)
+
+
+def _target_plan(profile: Mapping[str, Any], injectors: Mapping[str, Callable],
+                 framers: Mapping[str, Callable], where: str) -> TargetPlan:
+    if not isinstance(profile, Mapping):
+        raise ConfigError(f"{where}: expected an object")
+    if not isinstance(profile.get("pjlExtra", ()), (list, tuple)):
+        raise ConfigError(f"{where}.pjlExtra: expected a list of PJL lines")
+    name = str(profile.get("injector") or "none")
+    if name not in injectors:
+        print(f"{where}: unknown injector {name!r}, using none")
+        # Unknown names inject nothing but still stream
+        return TargetPlan(profile, name, injectors["none"], framers["none"])
+    return TargetPlan(profile, name, injectors[name], framers.get(name))
+
+
+def _listener_plan(port: int, spec: Mapping[str, Any], raw: Mapping[str, Any], strategies: Sequence[str],
+                   where: str) -> ListenerPlan:
+    if not isinstance(spec, Mapping):
+        raise ConfigError(f"{where}: expected an object")
+    default_port = _port(raw, "defaultTargetPort", 9100)
+    target_port = _port(spec, "targetPort", default_port, where + ".")
+    targets = spec.get("targets") or []
+    if not isinstance(targets, (list, tuple)):
+        raise ConfigError(f"{where}.targets: expected a list")
+    members = []
+    for i, t in enumerate(targets):
+        try:
+            m = PoolMember.from_config(t, target_port)
+        except (TypeError, ValueError):
+            raise ConfigError(f"{where}.targets[{i}]: expected \"ip\", \"ip:port\" or an object, got {t!r}") from None
+        if not m.ip:
+            raise ConfigError(f"{where}.targets[{i}]: no ip")
+        members.append((m.ip, m.port, m.name))
+    balance = str(spec.get("balance") or raw.get("poolStrategy") or "least-bytes").lower()
+    if members and balance not in strategies:
+        print(f"{where}: unknown balance {balance!r}, using least-bytes")
+        balance = "least-bytes"
+    limit = _number(spec, "maxConnections", 0, int, where + ".") or _number(raw, "maxConnectionsPerListener", 128) or 128
+    return ListenerPlan(port, spec, str(spec.get("deviceName") or ""),
+                        str(spec.get("targetIP") or raw.get("defaultTargetIP") or ""), target_port,
+                        tuple(members), balance, limit)
+
+
+def compile_config(raw: Dict[str, Any], injectors: Mapping[str, Callable], framers: Mapping[str, Callable],
+                   strategies: Sequence[str]) -> ProxyConfig:
+    """Check `raw` and build its lookup tables; raises ConfigError."""
+    if not isinstance(raw, dict):
+        raise ConfigError("expected a JSON object")
+    frozen = freeze(raw)
+    listeners = {}
+    for key, spec in _object(frozen, "listeners").items():
+        try:
+            port = int(key)
+        except ValueError:
+            raise ConfigError(f"listeners.{key}: not a port number") from None
+        if not 0 < port < 65536:
+            raise ConfigError(f"listeners.{key}: not a TCP port")
+        listeners[port] = _listener_plan(port, spec, frozen, strategies, f"listeners.{key}")
+    profiles = _object(frozen, "printerProfiles")
+    targets = {ip: _target_plan(profile, injectors, framers, f"printerProfiles.{ip}")
+               for ip, profile in profiles.items() if ip != "default"}
+    default_target = _target_plan(profiles.get("default") or MappingProxyType({}), injectors, framers,
+                                  "printerProfiles.default")
+    default_listener = _listener_plan(0, MappingProxyType({}), frozen, strategies, "defaultTargetIP")
+    return ProxyConfig(raw, MappingProxyType(listeners), MappingProxyType(targets), default_target, default_listener)
@@ -0,0 +1,110 @@
+"""
+Worker processes for the print proxy ("workers": N).
+
+One Python process moves job bytes and runs injectors on a single core. With
+workers > 1 the proxy process becomes a supervisor. It keeps the credential
+HTTP server and the overlay store. N spawned workers each bind every RAW
+listener with SO_REUSEPORT, and the kernel spreads new connections across
+them.
+
+Each worker gets the index, the end of a pipe the supervisor uses to pull
+its metrics, and the caller's arguments. A worker that exits is started again.
+A worker exits once that pipe closes, so workers never outlive a supervisor
+that was killed.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from metrics import REGISTRY
+
+# spawn, not fork: the supervisor already runs threads when a worker is restarted
+_CTX = multiprocessing.get_context("spawn")
+
+
+def shared_lock() -> Any:
+    """A lock the workers can share; pass it in WorkerSet's args."""
+    return _CTX.Lock()
+
+
+class WorkerSet:
+    def __init__(self, count: int, target: Callable[..., None], args: Sequence[Any] = (),
+                 restart_delay: float = 1.0):
+        self.count = max(1, int(count))
+        self.target = target
+        self.args = tuple(args)
+        self.restart_delay = restart_delay
+        self._procs: List[Optional[Any]] = [None] * self.count
+        self._conns: List[Optional[Any]] = [None] * self.count
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self) -> "WorkerSet":
+        for index in range(self.count):
+            self._spawn(index)
+        return self
+
+    def _spawn(self, index: int) -> None:
+        parent, child = _CTX.Pipe()
+        proc = _CTX.Process(target=self.target, args=(index, child) + self.args,
+                            name=f"print-proxy-worker-{index}", daemon=True)
+        proc.start()
+        child.close()
+        with self._lock:
+            old = self._conns[index]
+            self._procs[index], self._conns[index] = proc, parent
+        if old is not None:
+            old.close()
+
+    def watch(self) -> None:
+        """Restart workers that exit, until stop()."""
+        while not self._stop.wait(self.restart_delay):
+            for index, proc in enumerate(self._procs):
+                if proc is not None and not proc.is_alive() and not self._stop.is_set():
+                    print(f"worker {index} exited with {proc.exitcode}, restarting")
+                    self._spawn(index)
+
+    def metrics(self, timeout: float = 2.0) -> List[List[Tuple[str, List[str]]]]:
+        """families() of every worker that answers within `timeout`."""
+        out = []
+        with self._lock:
+            for conn in self._conns:
+                if conn is None:
+                    continue
+                try:
+                    conn.send(None)
+                    if conn.poll(timeout):
+                        out.append(conn.recv())
+                except (OSError, EOFError):
+                    pass
+        return out
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        for proc in self._procs:
+            if proc is not None and proc.is_alive():
+                proc.terminate()
+        deadline = time.monotonic() + timeout
+        for proc in self._procs:
+            if proc is not None:
+                proc.join(max(0.0, deadline - time.monotonic()))
+
+
+def answer_supervisor(conn: Any, index: int) -> threading.Thread:
+    """In a worker: send this process's metric families for every request on `conn`; exit when it closes."""
+    label = f'worker="{index}"'
+
+    def run() -> None:
+        while True:
+            try:
+                conn.recv()
+                conn.send(REGISTRY.families(label))
+            except (OSError, EOFError):
+                os._exit(0)
+
+    t = threading.Thread(target=run, name="metrics-pipe", daemon=True)
+    t.start()
+    return t
@@ -0,0 +1,168 @@
+"""
+Long-lived shell workers for the agent's PowerShell lookups.
+
+Starting powershell.exe costs far more than the commands the agent runs, so
+ShellPool keeps a few interpreters open and talks to them over stdin/stdout.
+
+Protocol (one line each way, UTF-8):
+  request:  "<id> <base64 command>\\n"
+  response: "<id> <base64 output>\\n"
+
+Any program that runs the matching loop can act as a worker; POWERSHELL_ARGV
+is the Windows worker and BASH_ARGV a stand-in used on Linux.
+"""
+
+import base64
+import itertools
+import queue
+import subprocess
+import threading
+from typing import List, Optional
+
+
+_PS_LOOP = (
+    "$ErrorActionPreference='SilentlyContinue';"
+    "$u=New-Object System.Text.UTF8Encoding $false;"
+    "[Console]::OutputEncoding=$u;"
+    "while($true){"
+    "$l=[Console]::In.ReadLine();"
+    "if($l -eq $null){break};"
+    "$p=$l.Split(' ',2);"
+    "$o='';"
+    "try{$o=(Invoke-Expression ($u.GetString([Convert]::FromBase64String($p[1]))) 2>&1 | Out-String)}catch{$o=''};"
+    "[Console]::Out.WriteLine($p[0]+' '+[Convert]::ToBase64String($u.GetBytes($o)));"
+    "[Console]::Out.Flush()"
+    "}"
+)
+
+POWERSHELL_ARGV: List[str] = [
+    "powershell", "-NoProfile", "-NonInteractive",
+    "-EncodedCommand", base64.b64encode(_PS_LOOP.encode("utf-16-le")).decode("ascii"),
+]
+
+BASH_ARGV: List[str] = [
+    "bash", "-c",
+    'while IFS=" " read -r id b64; do '
+    'out=$(printf %s "$b64" | base64 -d | bash 2>&1); '
+    'printf "%s %s\\n" "$id" "$(printf %s "$out" | base64 -w0)"; '
+    'done',
+]
+
+
+class ShellWorker:
+    """One interpreter process speaking the line protocol above.
+
+    call() returns the command output, or None on timeout or when the process
+    cannot be (re)started. A worker that times out is killed and restarted on
+    the next call, since it may still be busy with the old command.
+    """
+
+    def __init__(self, argv: List[str]):
+        self.argv = argv
+        self._proc: Optional[subprocess.Popen] = None
+        self._responses: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._ids = itertools.count(1)
+        self.restarts = 0
+
+    def _reader(self, proc: subprocess.Popen, responses: "queue.Queue[Optional[str]]") -> None:
+        assert proc.stdout is not None
+        for raw in proc.stdout:
+            responses.put(raw.decode("ascii", errors="ignore").rstrip("\r\n"))
+        responses.put(None)  # EOF: the process exited
+
+    def _ensure(self) -> subprocess.Popen:
+        if self._proc is not None and self._proc.poll() is None:
+            return self._proc
+        if self._proc is not None:
+            self.restarts += 1
+        self._responses = queue.Queue()
+        self._proc = subprocess.Popen(
+            self.argv,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+        )
+        threading.Thread(target=self._reader, args=(self._proc, self._responses), daemon=True).start()
+        return self._proc
+
+    def call(self, cmd: str, timeout: float = 10.0) -> Optional[str]:
+        for attempt in range(2):
+            try:
+                proc = self._ensure()
+            except OSError:
+                return None
+            req_id = str(next(self._ids))
+            line = f"{req_id} {base64.b64encode(cmd.encode('utf-8')).decode('ascii')}\n"
+            try:
+                assert proc.stdin is not None
+                proc.stdin.write(line.encode("ascii"))
+                proc.stdin.flush()
+            except (BrokenPipeError, OSError, ValueError):
+                self.kill()
+                continue  # died between commands: restart once and retry
+            while True:
+                try:
+                    resp = self._responses.get(timeout=timeout)
+                except queue.Empty:
+                    self.kill()
+                    return None
+                if resp is None:
+                    self.kill()
+                    break  # died mid-command: restart and retry
+                rid, _, payload = resp.partition(" ")
+                if rid != req_id:
+                    continue  # late answer to an earlier, timed-out request
+                try:
+                    return base64.b64decode(payload).decode("utf-8", errors="ignore")
+                except Exception:
+                    return ""
+        return None
+
+    def kill(self) -> None:
+        proc = self._proc
+        if proc is None:
+            return
+        try:
+            proc.kill()
+            proc.wait(timeout=5)
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        proc = self._proc
+        if proc is None:
+            return
+        try:
+            if proc.stdin:
+                proc.stdin.close()
+            proc.wait(timeout=2)
+        except Exception:
+            self.kill()
+        self._proc = None
+
+
+class ShellPool:
+    """Small pool of ShellWorkers so concurrent lookups do not serialize."""
+
+    def __init__(self, argv: List[str], size: int = 2, timeout: float = 10.0):
+        self.timeout = timeout
+        self._workers = [ShellWorker(argv) for _ in range(max(1, size))]
+        self._idle: "queue.Queue[ShellWorker]" = queue.Queue()
+        for w in self._workers:
+            self._idle.put(w)
+
+    def run(self, cmd: str, timeout: Optional[float] = None) -> Optional[str]:
+        worker = self._idle.get()
+        try:
+            return worker.call(cmd, self.timeout if timeout is None else timeout)
+        finally:
+            self._idle.put(worker)
+
+    @property
+    def restarts(self) -> int:
+        return sum(w.restarts for w in self._workers)
+
+    def close(self) -> None:
+        for w in self._workers:
+            w.close()
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+Pre-aggregated totals of the dashboard's snapshot files.
+
+public/snapshots/{printJobs,laminationJobs,income}-all.json hold one
+{"lastUpdated", "items": [...]} object each. /api/snapshots/rebuild writes
+them newest first and /api/snapshots/update appends to them, and the
+dashboard downloads and sums them whole. This tool reads them as a stream
+and keeps jobs, quantity and cost per (user, device, type, day) cell:
+
+    python snapshot_stats.py ../public/snapshots            # update the stats of all three
+    python snapshot_stats.py ../public/snapshots --full     # recompute from every item
+
+- The file is read in chunks of about `chunk_chars` characters, each cut
+  after a whole item, and decoded one chunk at a time. Memory stays a few
+  chunks deep however large the snapshot grows.
+- <collection>-all.stats.json keeps the totals, as columns: each cell's
+  dimension codes, jobs, quantity and cost. The sums per user, device, type
+  and day come with them, and a watermark: the newest item timestamp counted.
+- The next run counts only items newer than the watermark. A chunk whose
+  timestamps are all older is skipped without being decoded. The items it
+  added also go to <collection>-all.delta.json, the same columns for those
+  items only, so a client holding the previous stats can apply just those.
+
+Items are assumed not to change once written. An edited or deleted job,
+or one added with a timestamp older than the watermark, needs --full.
+Days are dates in --timezone, by default Europe/Athens like the dashboard,
+which shows dates in the browser's local time: a job at local midnight is
+stored as 21:00Z or 22:00Z the day before. Stats made with another
+timezone are recomputed.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from array import array
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from event_xml import event_time
+
+
+def _base_dir() -> str:
+    if getattr(sys, "frozen", False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.dirname(_base_dir()), "public", "snapshots")
+
+DEFAULT_TIMEZONE = "Europe/Athens"
+DIMENSIONS = ("user", "device", "type", "day")
+MEASURES = ("jobs", "quantity", "cost")
+
+_Cell = Tuple[str, str, str, str]  # (user, device, type, day)
+
+
+class Spec(NamedTuple):
+    """Item fields of one collection; an empty key leaves that dimension blank."""
+    id_key: str
+    device_key: str
+    type_key: str
+    quantity_key: str  # empty: every item counts 1
+    cost_key: str
+
+
+SPECS = {
+    "printJobs": Spec("jobId", "deviceName", "type", "quantity", "totalCost"),
+    "laminationJobs": Spec("jobId", "", "type", "quantity", "totalCost"),
+    "income": Spec("incomeId", "", "", "", "amount"),
+}
+
+
+class Cube:
+    """Jobs, quantity and cost per (user, device, type, day) cell, one array per measure."""
+
+    def __init__(self):
+        self.index: Dict[_Cell, int] = {}
+        self.jobs = array("q")
+        self.quantity = array("q")
+        self.cost = array("d")
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _cell(self, key: _Cell) -> int:
+        i = self.index.get(key)
+        if i is None:
+            i = self.index[key] = len(self.jobs)
+            self.jobs.append(0)
+            self.quantity.append(0)
+            self.cost.append(0.0)
+        return i
+
+    def add(self, key: _Cell, jobs: int, quantity: int, cost: float) -> None:
+        i = self._cell(key)
+        self.jobs[i] += jobs
+        self.quantity[i] += quantity
+        self.cost[i] += cost
+
+    def merge(self, other: "Cube") -> None:
+        for key, j in other.index.items():
+            self.add(key, other.jobs[j], other.quantity[j], other.cost[j])
+
+    def to_json(self) -> Dict[str, Any]:
+        """Dimension values, then the cells and per-dimension totals as parallel columns."""
+        keys = sorted(self.index)
+        order = [self.index[k] for k in keys]
+        values = [sorted({k[d] for k in keys}) for d in range(len(DIMENSIONS))]
+        codes = [{v: c for c, v in enumerate(vs)} for vs in values]
+        cells: Dict[str, List[Any]] = {name: [codes[d][k[d]] for k in keys] for d, name in enumerate(DIMENSIONS)}
+        cells["jobs"] = [self.jobs[i] for i in order]
+        cells["quantity"] = [self.quantity[i] for i in order]
+        cells["cost"] = [round(self.cost[i], 2) for i in order]
+        totals = {}
+        for d, name in enumerate(DIMENSIONS):
+            sums = [array("q", bytes(8 * len(values[d]))), array("q", bytes(8 * len(values[d]))),
+                    array("d", bytes(8 * len(values[d])))]
+            for code, i in zip(cells[name], order):
+                sums[0][code] += self.jobs[i]
+                sums[1][code] += self.quantity[i]
+                sums[2][code] += self.cost[i]
+            totals[name] = {"jobs": sums[0].tolist(), "quantity": sums[1].tolist(),
+                            "cost": [round(c, 2) for c in sums[2]]}
+        return {"dimensions": dict(zip(DIMENSIONS, values)), "cells": cells, "totals": totals}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Cube":
+        cube = cls()
+        values = [data["dimensions"][name] for name in DIMENSIONS]
+        cells = data["cells"]
+        columns = [cells[name] for name in DIMENSIONS]
+        for n, (jobs, quantity, cost) in enumerate(zip(cells["jobs"], cells["quantity"], cells["cost"])):
+            cube.add(tuple(values[d][columns[d][n]] for d in range(len(DIMENSIONS))), jobs, quantity, cost)
+        return cube
+
+
+def parse_timezone(name: str) -> tzinfo:
+    """"UTC", a fixed offset such as "+02:00", or an IANA name; raises ValueError."""
+    if name.upper() in ("UTC", "Z"):
+        return timezone.utc
+    m = re.fullmatch(r"([+-])(\d\d):?(\d\d)", name)
+    if m:
+        offset = timedelta(hours=int(m.group(2)), minutes=int(m.group(3)))
+        return timezone(-offset if m.group(1) == "-" else offset)
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(name)
+    except (ImportError, ValueError, KeyError):  # ZoneInfoNotFoundError is a KeyError
+        raise ValueError(f"unknown timezone {name!r}; give an offset such as +02:00 "
+                         f"where the zone database is missing (Windows without tzdata)") from None
+
+
+_Hour = Union[str, Tuple[int, str, str]]
+
+
+class Calendar:
+    """The local date of an ISO UTC timestamp, cached per UTC hour.
+
+    `hours` maps "YYYY-MM-DDTHH" to the date, or for an hour in which local
+    midnight falls (offsets that are not whole hours) to (minute, before,
+    after).
+    """
+
+    def __init__(self, tz: tzinfo):
+        self.tz = tz
+        self.hours: Dict[str, _Hour] = {}
+
+    def day(self, timestamp: str) -> str:
+        hour = timestamp[:13]
+        entry = self.hours.get(hour)
+        if entry is None:
+            entry = self.hours[hour] = self._hour(hour)
+        if isinstance(entry, str):
+            return entry
+        split, before, after = entry
+        minute = timestamp[14:16]
+        return before if not minute.isdigit() or int(minute) < split else after
+
+    def _hour(self, hour: str) -> _Hour:
+        try:
+            start = datetime.fromisoformat(hour + ":00").replace(tzinfo=timezone.utc)
+        except ValueError:
+            return hour[:10]  # not an ISO time; as before, its first ten characters
+        local = start.astimezone(self.tz)
+        before = local.date().isoformat()
+        split = 24 * 60 - (local.hour * 60 + local.minute)
+        if split >= 60:
+            return before
+        return split, before, (start + timedelta(minutes=split)).astimezone(self.tz).date().isoformat()
+
+
+class Watermark:
+    """The newest item timestamp counted, and the ids counted at exactly that time."""
+
+    def __init__(self, timestamp: str = "", ids: Sequence[str] = ()):
+        self.timestamp = timestamp
+        self.ids = set(ids)
+
+    def is_new(self, timestamp: str, item_id: str) -> bool:
+        if not timestamp:
+            return False  # counted by the full run that saw it, with no way to tell it apart since
+        return timestamp > self.timestamp or (timestamp == self.timestamp and item_id not in self.ids)
+
+    def advance(self, timestamp: str, item_id: str) -> None:
+        if timestamp > self.timestamp:
+            self.timestamp = timestamp
+            self.ids = {item_id}
+        elif timestamp == self.timestamp:
+            self.ids.add(item_id)
+
+
+_ITEMS_RE = re.compile(r'"items"\s*:\s*\[')
+_LAST_UPDATED_RE = re.compile(r'"lastUpdated"\s*:\s*(\d+)')
+_TIMESTAMP_RE = re.compile(r'"timestamp":"([^"]*)"')
+# Between two items of JSON.stringify output. Inside a string a quote is escaped, so this only matches
+# there after a string ending in "},{"; that cut leaves an unterminated string, which fails to decode
+# and falls back to raw_decode
+_CUT = '},{"'
+
+
+class SnapshotReader:
+    """The items of a snapshot file, chunk by chunk."""
+
+    def __init__(self, path: str, chunk_chars: int = 4 << 20):
+        self.path = path
+        self.chunk_chars = chunk_chars
+        self.last_updated: Optional[int] = None
+        self.chunks = 0
+        self.skipped = 0
+
+    def read(self, wanted: Optional[Callable[[str], bool]] = None) -> Iterator[List[Dict[str, Any]]]:
+        """Lists of decoded items; chunks for which wanted(text) is false are not decoded."""
+        with open(self.path, "r", encoding="utf-8-sig") as f:
+            text = self._header(f)
+            if text is None:
+                return
+            eof = False
+            while not eof:
+                piece = f.read(self.chunk_chars)
+                eof = not piece
+                text += piece
+                if eof:
+                    block, text = self._tail(text), ""
+                else:
+                    cut = text.rfind(_CUT)
+                    if cut < 0:
+                        if len(text) < 2 * self.chunk_chars:
+                            continue  # one item longer than a chunk
+                        yield from self._exact(f, text)  # not JSON.stringify output, e.g. indented
+                        return
+                    block, text = text[:cut + 1], text[cut + 2:]
+                if not block:
+                    continue
+                self.chunks += 1
+                if wanted is not None and not wanted(block):
+                    self.skipped += 1
+                    continue
+                try:
+                    items = json.loads("[" + block + "]")
+                except ValueError:
+                    # Not JSON.stringify output (whitespace, a cut inside a string): decode item by item
+                    yield from self._exact(f, block + ("," + text if text else ""))
+                    return
+                yield items
+
+    def _header(self, f) -> Optional[str]:
+        """Read up to the items array; returns the text after its "[", None if there is none."""
+        head = ""
+        while True:
+            piece = f.read(1 << 16)
+            head += piece
+            match = _ITEMS_RE.search(head)
+            if match:
+                found = _LAST_UPDATED_RE.search(head, 0, match.start())
+                if found:
+                    self.last_updated = int(found.group(1))
+                return head[match.end():].lstrip()
+            if not piece:
+                return None
+
+    @staticmethod
+    def _tail(text: str) -> str:
+        """The last items, without the "]}" that closes the array and the object."""
+        text = text.rstrip()
+        if text.endswith("}"):
+            text = text[:-1].rstrip()
+        if text.endswith("]"):
+            text = text[:-1].rstrip()
+        return text
+
+    def _exact(self, f, text: str) -> Iterator[List[Dict[str, Any]]]:
+        decoder = json.JSONDecoder()
+        pos = 0
+        while True:
+            items = []
+            while True:
+                while pos < len(text) and text[pos] in " \t\r\n,":
+                    pos += 1
+                if pos >= len(text) or text[pos] == "]":
+                    break
+                try:
+                    item, end = decoder.raw_decode(text, pos)
+                except ValueError:
+                    break  # incomplete: read more
+                items.append(item)
+                pos = end
+            if items:
+                self.chunks += 1
+                yield items
+            if pos < len(text) and text[pos] == "]":
+                return
+            piece = f.read(self.chunk_chars)
+            if not piece:
+                if pos < len(text) and text[pos:].strip():
+                    raise ValueError(f"{self.path}: truncated item at the end of the file")
+                return
+            text = text[pos:] + piece
+            pos = 0
+
+
+def _count(items: List[Dict[str, Any]], spec: Spec, cube: Cube, watermark: Optional[Watermark],
+           newest: Watermark, calendar: Calendar) -> int:
+    """Add the items newer than `watermark` (all when None) to `cube`; returns how many were added."""
+    id_key, device_key, type_key, quantity_key, cost_key = spec
+    hours = calendar.hours
+    index = cube.index
+    jobs, quantity, cost = cube.jobs, cube.quantity, cube.cost
+    added = 0
+    for item in items:
+        ts = item.get("timestamp")
+        ts = ts if isinstance(ts, str) else ""
+        item_id = str(item.get(id_key) or "")
+        if watermark is not None and not watermark.is_new(ts, item_id):
+            continue
+        if ts and ts >= newest.timestamp:
+            newest.advance(ts, item_id)
+        day = hours.get(ts[:13])
+        if day.__class__ is not str:
+            day = calendar.day(ts)
+        key = (str(item.get("uid") or ""), str(item.get(device_key) or "") if device_key else "",
+               str(item.get(type_key) or "") if type_key else "", day)
+        i = index.get(key)
+        if i is None:
+            i = index[key] = len(jobs)
+            jobs.append(0)
+            quantity.append(0)
+            cost.append(0.0)
+        jobs[i] += 1
+        try:
+            quantity[i] += int(item.get(quantity_key) or 0) if quantity_key else 1
+            cost[i] += float(item.get(cost_key) or 0)
+        except (TypeError, ValueError):
+            pass  # counted as a job, without a quantity or cost
+        added += 1
+    return added
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def _millis(timestamp: str) -> Optional[int]:
+    t = event_time(timestamp)
+    return None if t is None else int(round(t * 1000))
+
+
+def build(collection: str, snapshot_dir: str, out_dir: Optional[str] = None, full: bool = False,
+          chunk_chars: int = 4 << 20, tz: str = DEFAULT_TIMEZONE) -> Dict[str, Any]:
+    """Update <collection>-all.stats.json and write <collection>-all.delta.json; returns a summary."""
+    spec = SPECS[collection]
+    calendar = Calendar(parse_timezone(tz))
+    out_dir = out_dir or snapshot_dir
+    path = os.path.join(snapshot_dir, f"{collection}-all.json")
+    stats_path = os.path.join(out_dir, f"{collection}-all.stats.json")
+    delta_path = os.path.join(out_dir, f"{collection}-all.delta.json")
+    started = time.perf_counter()
+
+    previous: Optional[Dict[str, Any]] = None
+    if not full and os.path.exists(stats_path):
+        try:
+            with open(stats_path, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"{stats_path}: {e}; recomputing from every item")
+    if previous is not None and previous.get("timezone", "UTC") != tz:
+        print(f"{stats_path}: days are in {previous.get('timezone', 'UTC')}, not {tz}; recomputing from every item")
+        previous = None
+    watermark = None
+    if previous is not None:
+        watermark = Watermark(previous.get("watermark") or "", previous.get("watermarkIds") or ())
+    newest = Watermark(watermark.timestamp, watermark.ids) if watermark is not None else Watermark()
+
+    wanted = None
+    if watermark is not None and watermark.timestamp:
+        # A chunk whose newest timestamp is older than the watermark holds nothing new
+        since = watermark.timestamp
+        wanted = lambda block: max(_TIMESTAMP_RE.findall(block), default="") >= since  # noqa: E731
+
+    reader = SnapshotReader(path, chunk_chars)
+    delta = Cube()
+    read = added = 0
+    for items in reader.read(wanted):
+        read += len(items)
+        added += _count(items, spec, delta, watermark, newest, calendar)
+
+    cube = Cube.from_json(previous) if previous is not None else Cube()
+    cube.merge(delta)
+    items_total = (previous.get("items", 0) if previous is not None else 0) + added
+    stats = {
+        "collection": collection,
+        "lastUpdated": _millis(newest.timestamp) or reader.last_updated,
+        "watermark": newest.timestamp,
+        "watermarkIds": sorted(newest.ids),
+        "timezone": tz,
+        "items": items_total,
+    }
+    stats.update(cube.to_json())
+    _write_json(stats_path, stats)
+    delta_doc = {
+        "collection": collection,
+        "since": previous.get("lastUpdated") if previous is not None else None,
+        "sinceWatermark": watermark.timestamp if watermark is not None else "",
+        "lastUpdated": stats["lastUpdated"],
+        "watermark": stats["watermark"],
+        "timezone": tz,
+        "items": added,
+    }
+    delta_doc.update(delta.to_json())
+    _write_json(delta_path, delta_doc)
+    return {
+        "collection": collection,
+        "mode": "full" if previous is None else "incremental",
+        "chunks": reader.chunks,
+        "chunks_skipped": reader.skipped,
+        "items_decoded": read,
+        "items_added": added,
+        "items": items_total,
+        "cells": len(cube),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="snapshot_stats.py", description="Pre-aggregate the dashboard snapshot files")
+    ap.add_argument("snapshot_dir", nargs="?", default=DEFAULT_SNAPSHOT_DIR)
+    ap.add_argument("--out", help="directory for the .stats.json and .delta.json files (default: snapshot_dir)")
+    ap.add_argument("--collection", choices=sorted(SPECS), action="append",
+                    help="repeatable; default: every collection with a snapshot file")
+    ap.add_argument("--full", action="store_true", help="ignore the previous stats and count every item")
+    ap.add_argument("--chunk-mb", type=float, default=4.0, help="characters decoded at a time, in millions")
+    ap.add_argument("--timezone", default=DEFAULT_TIMEZONE,
+                    help=f"timezone of the day dimension: an IANA name, UTC or +HH:MM (default: {DEFAULT_TIMEZONE})")
+    args = ap.parse_args(argv)
+    collections = args.collection or [c for c in SPECS
+                                      if os.path.exists(os.path.join(args.snapshot_dir, f"{c}-all.json"))]
+    status = 0
+    for collection in collections:
+        try:
+            summary = build(collection, args.snapshot_dir, args.out, args.full, int(args.chunk_mb * (1 << 20)),
+                            args.timezone)
+        except (OSError, ValueError) as e:
+            print(f"{collection}: {e}")
+            status = 1
+            continue
+        summary["peak_rss_mb"] = _peak_rss_mb()
+        print(json.dumps(summary))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())